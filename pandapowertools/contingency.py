@@ -0,0 +1,214 @@
+import numpy as np
+import pandas as pd
+from scipy.sparse.linalg import splu
+from pandapower.pypower.idx_brch import F_BUS, T_BUS, BR_STATUS
+from pandapower.pypower.idx_bus import BUS_TYPE, REF, NONE
+from pandapower.pypower.makeBdc import makeBdc
+
+
+from pandapowertools.convergence import run_pf
+from pandapowertools.zbus import ZMatrix, ikss, _admittances
+
+
+OUTAGE_ELEMENTS = {'line': ('line',), 'trafo': ('trafo',), 'all': ('line', 'trafo', 'trafo3w')}
+MONITORED = ('line', 'trafo')
+ISLANDING_TOL = 1e-6
+
+
+def _outages(net, elements: str) -> list:
+    '''
+    Включённые элементы для отключения
+    :return: список (element, index)
+    '''
+    if elements not in OUTAGE_ELEMENTS:
+        raise ValueError(f'elements must be one of {tuple(OUTAGE_ELEMENTS)}')
+    return [(element, index) for element in OUTAGE_ELEMENTS[elements]
+            for index in net.net[element].index[net.net[element]['in_service'].astype(bool)]]
+
+
+def _index(elements: list) -> pd.MultiIndex:
+    return pd.MultiIndex.from_arrays([[element for element, _ in elements], [index for _, index in elements]],
+                                     names=['element', 'index'])
+
+
+def _branch_rows(lookup: dict, table: pd.DataFrame, element: str, index) -> list:
+    '''
+    Строки ветвей ppc элемента (три ветви для trafo3w)
+    '''
+    start, end = lookup[element]
+    position = start + table.index.get_loc(index)
+    if element == 'trafo3w':
+        n = (end - start) // 3
+        return [position, position + n, position + 2 * n]
+    return [position]
+
+
+def _with_outage(net, element: str, index, calc):
+    '''
+    Полный расчёт calc() с отключенным элементом
+    '''
+    with net.mode():
+        net._set(element, 'in_service', index, False)
+        return calc()
+
+
+def _sc_outage(z: ZMatrix, rows: np.ndarray, position: np.ndarray) -> np.ndarray | None:
+    '''
+    Собственные сопротивления шин после отключения ветвей rows по формуле Вудбери, столбцы и строки матрицы
+    узловых сопротивлений рассчитываются только для концов ветвей
+    :return: None если отключение приводит к выделению части сети без связи с источниками
+    '''
+    n = z.n
+    rows = rows[(rows[:, F_BUS].real < n) & (rows[:, T_BUS].real < n) & (rows[:, BR_STATUS].real != 0)]
+    diag = np.full(len(position), np.nan, dtype=complex)
+    valid = position >= 0
+    p = position[valid]
+    if not len(rows):
+        diag[valid] = z.diag()[p]
+        return diag
+    ends = rows[:, [F_BUS, T_BUS]].real.astype(np.int64)
+    u, local = np.unique(ends, return_inverse=True)
+    local = local.reshape(ends.shape)
+    dy = np.zeros((len(u), len(u)), dtype=complex)
+    for row, (f, t) in zip(rows, local):
+        dy[np.ix_([f, t], [f, t])] -= _admittances(row)
+    columns = z.columns(u)
+    a = np.eye(len(u)) + dy @ columns[u]
+    if np.linalg.cond(a) > 1 / ISLANDING_TOL ** 2:
+        return None
+    correction = np.einsum('iu,ui->i', columns[p], np.linalg.solve(a, dy @ z.rows(u)[:, p]))
+    diag[valid] = z.diag()[p] - correction
+    return diag
+
+
+def n_minus_1_sc(net, elements: str = 'line', fault: str = '3ph', case: str = 'max',
+                 lv_tol_percent: int = 10) -> pd.DataFrame:
+    '''
+    Токи КЗ на шинах при поочерёдном отключении элементов. Матрицы узловых сопротивлений ZBus строятся один раз,
+    отключение ветвей учитывается формулой Вудбери для блока концов ветвей. Полный расчёт выполняется при
+    выделении части сети без источников, для трансформаторов при 1ph (схема нулевой последовательности
+    трансформатора задаётся проводимостями шин), для trafo3w и для сетей с блоками электростанций
+    :param net: pandapowertools Net
+    :return: DataFrame с индексом (element, index) отключаемых элементов и столбцами - шинами, ikss_ka.
+    В attrs['full_solve'] список отключений, рассчитанных полностью, в attrs['approximate'] - False
+    '''
+    zero_sequence = fault == '1ph'
+    outages = _outages(net, elements)
+    zbus, (table, _, cu, _, _) = net._calc_thevenin(case, lv_tol_percent, zero_sequence)
+    buses = table.index
+    z_base = table['vn_kv'].to_numpy() ** 2 / zbus.base_mva if zbus is not None else None
+    position = np.array([zbus.position.get(bus, -1) for bus in buses]) if zbus is not None else None
+    res = np.empty((len(outages), len(buses)))
+    full = []
+    for i, (element, index) in enumerate(outages):
+        z = None
+        if zbus is not None and element != 'trafo3w' and not (zero_sequence and element == 'trafo'):
+            rows = _branch_rows(zbus.branch_lookup, net.net[element], element, index)
+            z = []
+            for z_k, branch in zip(zbus.z, zbus.branch):
+                diag = _sc_outage(z_k, branch[rows], position)
+                if diag is None:
+                    z = None
+                    break
+                z.append(diag * z_base)
+        if z is None:
+            full.append((element, index))
+            _, (_, _, cu_full, z1, z0) = _with_outage(
+                net, element, index, lambda: net._calc_thevenin(case, lv_tol_percent, zero_sequence))
+            res[i] = ikss(fault, cu_full, z1, z0)
+        else:
+            res[i] = ikss(fault, cu, z[0], z[1] if zero_sequence else np.nan)
+    result = pd.DataFrame(res, index=_index(outages),
+                          columns=buses)
+    result.attrs['full_solve'] = full
+    result.attrs['approximate'] = False
+    return result
+
+
+def _branch_results(net) -> tuple:
+    '''
+    Результаты потокораспределения ветвей MONITORED
+    :return: p_mw, q_mvar в начале ветвей, loading_percent, допустимая мощность ветвей
+    '''
+    line, trafo = net.net.line, net.net.trafo
+    res_line, res_trafo = net.net.res_line, net.net.res_trafo
+    u = net.net.res_bus.loc[line['from_bus'], 'vm_pu'].to_numpy() * \
+        net.net.bus.loc[line['from_bus'], 'vn_kv'].to_numpy()
+    rated = np.concatenate([np.sqrt(3) * u * line['max_i_ka'].to_numpy() * line['df'].to_numpy() *
+                            line['parallel'].to_numpy(), trafo['sn_mva'].to_numpy() * trafo['parallel'].to_numpy()])
+    return (np.concatenate([res_line['p_from_mw'].to_numpy(), res_trafo['p_hv_mw'].to_numpy()]),
+            np.concatenate([res_line['q_from_mvar'].to_numpy(), res_trafo['q_hv_mvar'].to_numpy()]),
+            np.concatenate([res_line['loading_percent'].to_numpy(), res_trafo['loading_percent'].to_numpy()]), rated)
+
+
+def _loading(base: tuple, p_mw: np.ndarray) -> np.ndarray:
+    '''
+    Загрузка ветвей, %, при активных мощностях p_mw. Загрузка исходного режима пересчитывается пропорционально
+    полной мощности при неизменных реактивных мощностях и напряжениях, для ветвей без нагрузки в исходном режиме
+    рассчитывается по допустимой мощности
+    '''
+    p, q, loading, rated = base
+    s = np.hypot(p, q)
+    s_new = np.hypot(p_mw, q)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(s > 1e-9, loading * s_new / s, s_new / rated * 100)
+
+
+def n_minus_1_pf(net, elements: str = 'line') -> pd.DataFrame:
+    '''
+    Загрузка линий и трансформаторов при поочерёдном отключении элементов. После расчёта потокораспределения
+    исходного режима матрица B постоянного тока раскладывается один раз, перераспределение активной мощности
+    отключаемой ветви находится по коэффициентам распределения отключений (LODF). Полный расчёт run_pf (без warm
+    start, так как init='results' не учитывает изменение схемы) выполняется при выделении части сети и для trafo3w.
+    Результаты потокораспределения исходного режима сохраняются.
+    Загрузки по LODF приближённые: реактивная мощность и изменение напряжений после отключения не учитываются,
+    отклонение от расчёта потокораспределения может достигать нескольких процентов загрузки
+    :param net: pandapowertools Net
+    :return: DataFrame с индексом (element, index) отключаемых элементов и столбцами (element, index) линий
+    и трансформаторов, loading_percent. В attrs['full_solve'] список отключений, рассчитанных полностью,
+    в attrs['approximate'] - True (остальные отключения рассчитаны по LODF)
+    '''
+    outages = _outages(net, elements)
+    if not run_pf(net).converged:
+        raise UserWarning('PowerFlow not calculated for base case')
+    saved = {key: net.net[key] for key in net.net.keys() if key.startswith('res_') and not key.endswith('_sc')}
+    base = _branch_results(net)
+    ppc = net.net._ppc
+    lookup = net.net._pd2ppc_lookups['branch']
+    bus, branch = ppc['bus'].real, ppc['branch'].real
+    b_bus, b_f, _, _, _ = makeBdc(bus, branch, return_csr=False)
+    keep = np.flatnonzero((bus[:, BUS_TYPE] != NONE) & (bus[:, BUS_TYPE] != REF))
+    lu = splu(b_bus[keep][:, keep].tocsc())
+    monitored = [np.arange(*lookup[element]) for element in MONITORED if element in lookup]
+    monitored = np.concatenate(monitored) if monitored else np.zeros(0, dtype=np.int64)
+    position = np.full(len(branch), -1)
+    position[monitored] = np.arange(len(monitored))
+    res = np.empty((len(outages), len(monitored)))
+    full = []
+    try:
+        for i, (element, index) in enumerate(outages):
+            ptdf = None
+            if element != 'trafo3w':
+                row = _branch_rows(lookup, net.net[element], element, index)[0]
+                injection = np.zeros(len(bus))
+                injection[branch[row, [F_BUS, T_BUS]].astype(np.int64)] = 1, -1
+                theta = np.zeros(len(bus))
+                theta[keep] = lu.solve(injection[keep])
+                ptdf = b_f @ theta
+            if ptdf is None or abs(1 - ptdf[row]) < ISLANDING_TOL:
+                full.append((element, index))
+                res[i] = _with_outage(net, element, index, lambda: _branch_results(net)[2]
+                                      if run_pf(net, init='flat').converged else np.full(len(monitored), np.nan))
+            else:
+                p = base[0] + ptdf[monitored] / (1 - ptdf[row]) * base[0][position[row]]
+                res[i] = _loading(base, p)
+                res[i, position[row]] = 0
+    finally:
+        for key, table in saved.items():
+            net.net[key] = table
+    columns = [(element, index) for element in MONITORED for index in net.net[element].index]
+    result = pd.DataFrame(res, index=_index(outages),
+                          columns=_index(columns))
+    result.attrs['full_solve'] = full
+    result.attrs['approximate'] = True
+    return result
@@ -0,0 +1,271 @@
+import time
+from importlib.util import find_spec
+
+
+import numpy as np
+import pandas as pd
+import pandapower as pp
+from pandapower.powerflow import LoadflowNotConverged
+from pandapower.pf.run_bfswpf import LoadflowNotConverged as BFSWNotConverged
+
+
+ALGORITHMS = ('nr', 'iwamoto_nr', 'bfsw', 'gs')
+PGM_ALGORITHMS = ('nr', 'bfsw')
+LOAD_STEPS = (0.25, 0.5, 0.75, 1.)
+NOT_CONVERGED = (LoadflowNotConverged, BFSWNotConverged)
+# вырожденная матрица Якоби и ошибки backend: lightsim2grid (C++) и power-grid-model (PowerGridError) - RuntimeError
+SOLVER_ERRORS = (np.linalg.LinAlgError, RuntimeError)
+BACKENDS = ('pandapower', 'pgm', 'lightsim2grid')
+BACKEND_MODULES = {'pandapower': 'pandapower', 'pgm': 'power_grid_model_io', 'lightsim2grid': 'lightsim2grid'}
+PGM_UNSUPPORTED = ('gen', 'storage', 'impedance', 'xward', 'dcline')
+LIGHTSIM2GRID_UNSUPPORTED = ('tcsc', 'svc', 'ssc')
+
+
+class PFReport:
+    '''
+    Result of power flow calculated with convergence strategies
+    :param converged: power flow converged
+    :param strategy: successful strategy: 'cold start', 'warm start', 'algorithm fallback', 'load stepping',
+    'more iterations' or 'loose tolerance'
+    :param algorithm: algorithm of successful run
+    :param tolerance: tolerance of successful run
+    :param iterations: number of iterations of successful run (of last step for load stepping), None for pgm
+    :param attempts: list of (strategy, algorithm, tolerance, converged, backend) of all runs, runs failed with
+    SOLVER_ERRORS are not converged, backend is the one that actually ran the attempt
+    :param error: last exception of SOLVER_ERRORS, raised again if all strategies failed
+    :param requested: requested solver backend: 'pandapower', 'pgm' or 'lightsim2grid'
+    :param backend: backend of successful run (pandapower for fallback algorithms with lightsim2grid requested),
+    requested backend until converged
+    '''
+    def __init__(self, backend: str = 'pandapower'):
+        self.requested = backend
+        self.backend = backend
+        self.converged = False
+        self.strategy = None
+        self.algorithm = None
+        self.tolerance = None
+        self.iterations = None
+        self.attempts = []
+        self.error = None
+
+    def __repr__(self):
+        if not self.converged:
+            return f'PowerFlow not calculated after {len(self.attempts)} attempts'
+        return (f'PowerFlow calculated by {self.strategy} with algorithm {self.algorithm}, tolerance {self.tolerance}, '
+                f'iterations {self.iterations}, attempts {len(self.attempts)}, backend {self.backend}')
+
+    def exhausted(self) -> 'PFReport':
+        '''
+        All strategies are tried: raises last error of solver or backend if any run failed with it
+        '''
+        if not self.converged and self.error is not None:
+            raise self.error
+        return self
+
+    def done(self, strategy: str, algorithm: str, tolerance: float, iterations: int | None, backend: str):
+        self.converged = True
+        self.backend = backend
+        self.strategy = strategy
+        self.algorithm = algorithm
+        self.tolerance = tolerance
+        self.iterations = iterations
+
+
+def _has_results(net) -> bool:
+    return bool(net.net.get('converged', False)) and net.net.res_bus.index.equals(net.net.bus.index)
+
+
+def _runpp(net, report: PFReport, strategy: str, algorithm: str, tolerance: float, init: str,
+           max_iteration) -> bool:
+    # без lightsim2grid pandapower считает алгоритмы кроме 'nr', а также 'nr' при отсутствии модуля lightsim2grid
+    lightsim2grid = report.requested == 'lightsim2grid' and algorithm == 'nr' and find_spec('lightsim2grid') is not None
+    backend = 'lightsim2grid' if lightsim2grid else 'pandapower'
+    try:
+        pp.runpp(net.net, tolerance_mva=tolerance, algorithm=algorithm, calculate_voltage_angles=False,
+                 max_iteration=max_iteration, init=init, check_connectivity=True, distributed_slack=False,
+                 lightsim2grid=lightsim2grid)
+        converged = True
+    except NOT_CONVERGED:
+        converged = False
+    except SOLVER_ERRORS as error:
+        report.error = error
+        converged = False
+    report.attempts.append((strategy, algorithm, tolerance, converged, backend))
+    if converged:
+        report.done(strategy, algorithm, tolerance, net.net._ppc.get('iterations'), backend)
+    return converged
+
+
+def _load_stepping(net, report: PFReport, algorithm: str, tolerance: float, max_iteration) -> bool:
+    '''
+    Calculates power flow for scaled loads and sgens increasing scaling up to initial by LOAD_STEPS,
+    every step starts from results of previous step
+    '''
+    with net.mode():
+        scaling = {element: net.net[element]['scaling'].copy() for element in ('load', 'sgen')
+                   if not net.net[element].empty}
+        if not scaling:
+            return False
+        init = 'auto'
+        for step in LOAD_STEPS:
+            for element, values in scaling.items():
+                net._set(element, 'scaling', None, values * step)
+            if not _runpp(net, report, 'load stepping', algorithm, tolerance, init, max_iteration):
+                report.converged = False
+                return False
+            init = 'results'
+    return True
+
+
+def run_pf(net, algorithm: str = 'nr', max_iteration='auto', init: str = 'auto', tolerance: float = 1e-8,
+           tries: int = 15, backend: str = 'pandapower') -> PFReport:
+    '''
+    Расчёт потокораспределения pandapower с перебором стратегий до сходимости:
+    1. warm start от предыдущего решения (init='results'), если init='auto' и есть результаты сошедшегося расчёта;
+    2. cold start с init;
+    3. другие алгоритмы из ALGORITHMS;
+    4. пошаговое увеличение нагрузки (LOAD_STEPS) с warm start каждого шага;
+    5. увеличение tolerance в 10 раз, всего tries значений tolerance (как раньше).
+    Ошибки решателя и backend (SOLVER_ERRORS) считаются несошедшейся попыткой, последняя из них вызывается снова,
+    если не сошлась ни одна стратегия.
+    :param net: pandapowertools Net
+    :param backend: 'pandapower' или 'lightsim2grid' (только для алгоритма 'nr', остальные алгоритмы pandapower)
+    :return: PFReport
+    '''
+    report = PFReport(backend)
+    if init == 'auto' and _has_results(net):
+        if _runpp(net, report, 'warm start', algorithm, tolerance, 'results', max_iteration):
+            return report
+    if _runpp(net, report, 'cold start', algorithm, tolerance, init, max_iteration):
+        return report
+    for fallback in ALGORITHMS:
+        if fallback != algorithm and _runpp(net, report, 'algorithm fallback', fallback, tolerance, 'auto',
+                                            max_iteration):
+            return report
+    if _load_stepping(net, report, algorithm, tolerance, max_iteration):
+        return report
+    for i in range(1, tries):
+        if _runpp(net, report, 'loose tolerance', algorithm, tolerance * 10 ** i, init, max_iteration):
+            return report
+    return report.exhausted()
+
+
+def _runpp_pgm(net, report: PFReport, strategy: str, algorithm: str, tolerance: float, max_iteration: int) -> bool:
+    try:
+        pp.runpp_pgm(net.net, error_tolerance_vm_pu=tolerance, algorithm=algorithm, max_iterations=max_iteration)
+        converged = bool(net.net['converged'])
+    except SOLVER_ERRORS as error:
+        report.error = error
+        converged = False
+    report.attempts.append((strategy, algorithm, tolerance, converged, 'pgm'))
+    if converged:
+        report.done(strategy, algorithm, tolerance, None, 'pgm')
+    return converged
+
+
+def run_pf_pgm(net, algorithm: str = 'nr', max_iteration: int = 20, tolerance: float = 1e-8,
+               tries: int = 15) -> PFReport:
+    '''
+    Расчёт потокораспределения power-grid-model с перебором стратегий до сходимости: алгоритм algorithm,
+    другие алгоритмы из PGM_ALGORITHMS, увеличенное в 10 раз число итераций, увеличение tolerance в 10 раз
+    (всего tries значений tolerance). power-grid-model не поддерживает начальное приближение, поэтому warm start
+    и пошаговое увеличение нагрузки не выполняются
+    :param net: pandapowertools Net
+    :return: PFReport
+    '''
+    report = PFReport('pgm')
+    attempts = [('cold start', algorithm, tolerance, max_iteration)]
+    attempts += [('algorithm fallback', fallback, tolerance, max_iteration) for fallback in PGM_ALGORITHMS
+                 if fallback != algorithm]
+    attempts.append(('more iterations', algorithm, tolerance, max_iteration * 10))
+    attempts += [('loose tolerance', algorithm, tolerance * 10 ** i, max_iteration) for i in range(1, tries)]
+    for strategy, algorithm, tolerance, max_iteration in attempts:
+        if _runpp_pgm(net, report, strategy, algorithm, tolerance, max_iteration):
+            return report
+    return report.exhausted()
+
+
+def unsupported(net, backend: str) -> str | None:
+    '''
+    Причина, по которой backend не может рассчитать сеть: не установлен или не поддерживает элементы сети
+    :return: None если backend поддерживает сеть
+    '''
+    if backend not in BACKENDS:
+        raise ValueError(f'backend must be one of {BACKENDS}')
+    if find_spec(BACKEND_MODULES[backend]) is None:
+        return f'{BACKEND_MODULES[backend]} is not installed'
+    if backend == 'pgm':
+        elements = [element for element in PGM_UNSUPPORTED if element in net.net and not net.net[element].empty]
+        if elements:
+            return f'elements {elements} are not supported'
+    if backend == 'lightsim2grid':
+        elements = [element for element in LIGHTSIM2GRID_UNSUPPORTED if element in net.net and
+                    not net.net[element].empty]
+        if elements:
+            return f'elements {elements} are not supported'
+        slacks = net.net.ext_grid['in_service'].sum() + (net.net.gen['slack'] & net.net.gen['in_service']).sum()
+        if slacks > 1:
+            return 'more than one slack is not supported'
+    return None
+
+
+def select_backend(net, backend: str = 'auto') -> str:
+    '''
+    :param backend: 'auto' - lightsim2grid, если он поддерживает сеть, иначе pandapower
+    :return: backend, поддерживающий сеть
+    '''
+    if backend == 'auto':
+        return 'lightsim2grid' if unsupported(net, 'lightsim2grid') is None else 'pandapower'
+    reason = unsupported(net, backend)
+    if reason is not None:
+        raise UserWarning(f'Backend {backend} can not be used: {reason}')
+    return backend
+
+
+def benchmark_pf(net, backends=BACKENDS, repeat: int = 3) -> pd.DataFrame:
+    '''
+    Расчёт потокораспределения одной сети всеми доступными backend без warm start. Результаты сравниваются
+    с результатами pandapower, после сравнения в сети остаются результаты pandapower
+    :param repeat: число расчётов каждым backend, время - минимальное
+    :return: DataFrame с индексом backend и столбцами converged, time_s, dvm_pu, dva_degree, dloading_percent
+    (максимальные отклонения от pandapower), reason (причина, по которой backend не используется, в том числе
+    сходимость только резервным алгоритмом, рассчитанным другим backend)
+    '''
+    backends = ['pandapower'] + [backend for backend in backends if backend != 'pandapower']
+    rows = {}
+    reference = None
+    for backend in backends:
+        reason = unsupported(net, backend)
+        row = {'converged': False, 'time_s': np.nan, 'dvm_pu': np.nan, 'dva_degree': np.nan,
+               'dloading_percent': np.nan, 'reason': reason}
+        rows[backend] = row
+        if reason is not None:
+            continue
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            if backend == 'pgm':
+                report = run_pf_pgm(net)
+            else:
+                report = run_pf(net, init='flat', backend=backend)
+            times.append(time.perf_counter() - start)
+        if report.converged and report.backend != backend:
+            row['reason'] = f'converged only by {report.backend} with algorithm {report.algorithm}'
+            continue
+        row['converged'] = report.converged
+        row['time_s'] = min(times)
+        if not report.converged:
+            continue
+        res = {key: net.net[key].copy() for key in net.net.keys() if key.startswith('res_') and
+               not key.endswith('_sc')}
+        if reference is None:
+            reference = res
+        row['dvm_pu'] = (res['res_bus']['vm_pu'] - reference['res_bus']['vm_pu']).abs().max()
+        row['dva_degree'] = (res['res_bus']['va_degree'] - reference['res_bus']['va_degree']).abs().max()
+        loading = pd.concat([res[key]['loading_percent'] - reference[key]['loading_percent']
+                             for key in ('res_line', 'res_trafo')])
+        row['dloading_percent'] = loading.abs().max()
+    if reference is not None:
+        for key, table in reference.items():
+            net.net[key] = table
+    return pd.DataFrame.from_dict(rows, orient='index').rename_axis('backend')
@@ -1,6 +1,7 @@
 import math
 
 from pandapowertools.symbols import *
+from pandapowertools.drawlist import DrawList
 
 
 class Symbol:
@@ -196,9 +197,14 @@ class Ext_grid_sym(Symbol):
 
 class Diagram:
     def __init__(self, te: TextEngine):
-        self.te = te
+        '''
+        Symbols are drawn to draw list te, which is flushed to TextEngine engine by draw()
+        '''
+        self.engine = te
+        self.te = DrawList()
         self.buses = {}
         self.switches = {}
+        self._switch_index = {}
         self.lines = {}
         self.gens = {}
         self.ext_grids = {}
@@ -245,18 +251,19 @@ class Diagram:
                                           element_index=element_index,
                                           closed=closed,
                                           diagram=self)
+        self._switch_index.setdefault((bus_index, et, element_index), self.switches[index])
 
     def add_ext_grid(self, index: int, bus_index):
         self.ext_grids[index] = Ext_grid_sym(bus_index=bus_index, diagram=self)
 
     def get_switch(self, bus_index: int, et: str, element_index: int):
-        for switch in self.switches.values():
-            if (switch.bus_index == bus_index and
-                switch.element_index == element_index and
-                switch.et==et):
-                return switch
+        '''
+        Switch by (bus_index, et, element_index) from hash index of switches
+        '''
+        return self._switch_index.get((bus_index, et, element_index))
 
     def draw(self):
+        self.te = DrawList()
         for bus in self.buses.values():
             bus.draw()
         for switch in self.switches.values():
@@ -267,4 +274,5 @@ class Diagram:
             gen.draw()
         for ext_grid in self.ext_grids.values():
             ext_grid.draw()
-        self.te.save()
+        self.te.flush(self.engine)
+        self.engine.save()
@@ -0,0 +1,218 @@
+import math
+
+
+import numpy as np
+
+
+class DrawList:
+    '''
+    Buffer of draw commands with the same interface as TextEngine (lines, circle, label). Commands are stored
+    as NumPy arrays: vertices of polylines with offsets, circles and label anchors. Transforms are applied to all
+    vertices at once and the buffer can be flushed to any TextEngine (DXF, PNG, SVG) several times.
+    Repeated glyphs are stored once as templates (block) and placed by reference (insert). Engines with methods
+    block(name, draw_list) and insert(name, x, y, angle) get them as blocks (DXF INSERT), for other engines
+    instances of every template are transformed at once on flush.
+    '''
+    def __init__(self):
+        self.vertices = np.zeros((0, 4))
+        self.offsets = np.zeros(1, dtype=np.int64)
+        self.cycle = np.zeros(0, dtype=bool)
+        self.circles = np.zeros((0, 5))
+        self.black = np.zeros(0, dtype=np.int8)
+        self.labels = np.zeros((0, 4))
+        self.texts = []
+        self.places = []
+        self.templates = {}
+        self.inserts = np.zeros((0, 4))
+        self.insert_names = []
+        self._pending = ([], [], [], [], [], [], [], [])
+
+    def __len__(self):
+        self._compact()
+        return len(self.cycle) + len(self.circles) + len(self.labels) + len(self.inserts)
+
+    def lines(self, *points, cycle: bool = False):
+        '''
+        Polyline through points (x, y) or (x, y, start_width, end_width)
+        '''
+        vertices, lengths, cycles = self._pending[:3]
+        vertices.extend(tuple(p) + (np.nan,) * (4 - len(p)) for p in points)
+        lengths.append(len(points))
+        cycles.append(cycle)
+
+    def circle(self, x, y, r, black: bool | None = None, st_angle: float | None = None,
+               en_angle: float | None = None):
+        '''
+        Circle or arc from st_angle to en_angle, degrees
+        :param black: filled circle, None - default of TextEngine
+        '''
+        self._pending[3].append((x, y, r, np.nan if st_angle is None else st_angle,
+                                 np.nan if en_angle is None else en_angle))
+        self._pending[4].append(-1 if black is None else int(black))
+
+    def label(self, x, y, text: str, place: str = 'c', s: float | None = None, angle: float = 0.):
+        '''
+        :param s: text height, None - default of TextEngine
+        :param angle: degrees
+        '''
+        self._pending[5].append((x, y, np.nan if s is None else s, angle))
+        self._pending[6].append((text, place))
+
+    def block(self, name: str, template: 'DrawList'):
+        '''
+        Defines template of glyph drawn around (0, 0), if it is not defined yet
+        '''
+        self.templates.setdefault(name, template)
+
+    def insert(self, name: str, x, y, angle: float = 0., scale: float = 1.):
+        '''
+        Places template name at (x, y)
+        :param angle: degrees
+        '''
+        self._pending[7].append((x, y, angle, scale, name))
+
+    def _compact(self):
+        vertices, lengths, cycles, circles, black, labels, texts, inserts = self._pending
+        if vertices or lengths:
+            self.vertices = np.concatenate([self.vertices, np.array(vertices, dtype=float).reshape(-1, 4)])
+            self.offsets = np.concatenate([self.offsets, self.offsets[-1] + np.cumsum(lengths, dtype=np.int64)])
+            self.cycle = np.concatenate([self.cycle, np.array(cycles, dtype=bool)])
+        if circles:
+            self.circles = np.concatenate([self.circles, np.array(circles, dtype=float)])
+            self.black = np.concatenate([self.black, np.array(black, dtype=np.int8)])
+        if labels:
+            self.labels = np.concatenate([self.labels, np.array(labels, dtype=float)])
+            self.texts.extend(text for text, _ in texts)
+            self.places.extend(place for _, place in texts)
+        if inserts:
+            self.inserts = np.concatenate([self.inserts, np.array([i[:4] for i in inserts], dtype=float)])
+            self.insert_names.extend(i[4] for i in inserts)
+        self._pending = ([], [], [], [], [], [], [], [])
+
+    def extend(self, other: 'DrawList') -> 'DrawList':
+        '''
+        Appends commands of other draw list
+        '''
+        self._compact()
+        other._compact()
+        self.vertices = np.concatenate([self.vertices, other.vertices])
+        self.offsets = np.concatenate([self.offsets, self.offsets[-1] + other.offsets[1:]])
+        self.cycle = np.concatenate([self.cycle, other.cycle])
+        self.circles = np.concatenate([self.circles, other.circles])
+        self.black = np.concatenate([self.black, other.black])
+        self.labels = np.concatenate([self.labels, other.labels])
+        self.texts.extend(other.texts)
+        self.places.extend(other.places)
+        for name, template in other.templates.items():
+            self.block(name, template)
+        self.inserts = np.concatenate([self.inserts, other.inserts])
+        self.insert_names.extend(other.insert_names)
+        return self
+
+    def copy(self) -> 'DrawList':
+        return DrawList().extend(self)
+
+    def transform(self, angle: float = 0., dx: float = 0., dy: float = 0., x: float = 0., y: float = 0.,
+                  scale: float = 1.) -> 'DrawList':
+        '''
+        Rotates all commands around (x, y) by angle, scales and then shifts them by (dx, dy)
+        :param angle: radians
+        '''
+        self._compact()
+        cos, sin = math.cos(angle) * scale, math.sin(angle) * scale
+        matrix = np.array([[cos, sin], [-sin, cos]])
+        center = np.array([x, y])
+        shift = center + np.array([dx, dy])
+        for points in (self.vertices, self.circles, self.labels):
+            points[:, :2] = (points[:, :2] - center) @ matrix + shift
+        self.vertices[:, 2:] *= scale
+        self.circles[:, 2] *= scale
+        self.circles[:, 3:] += math.degrees(angle)
+        self.labels[:, 2] *= scale
+        self.labels[:, 3] += math.degrees(angle)
+        self.inserts[:, :2] = (self.inserts[:, :2] - center) @ matrix + shift
+        self.inserts[:, 2] += math.degrees(angle)
+        self.inserts[:, 3] *= scale
+        return self
+
+    def instances(self, xy: np.ndarray, angle: np.ndarray, scale: np.ndarray | None = None) -> 'DrawList':
+        '''
+        Copies of template rotated around (0, 0), scaled and shifted to points xy, transformed at once
+        :param xy: array k x 2
+        :param angle: array of k angles, degrees
+        :return: DrawList with k copies
+        '''
+        self._compact()
+        xy = np.asarray(xy, dtype=float).reshape(-1, 2)
+        k = len(xy)
+        scale = np.ones(k) if scale is None else np.asarray(scale, dtype=float)
+        radians = np.radians(angle)
+        cos, sin = np.cos(radians) * scale, np.sin(radians) * scale
+
+        def move(points):
+            x, y = points[:, 0], points[:, 1]
+            return np.stack([cos[:, None] * x - sin[:, None] * y + xy[:, :1],
+                             sin[:, None] * x + cos[:, None] * y + xy[:, 1:]], axis=-1).reshape(-1, 2)
+
+        res = DrawList()
+        res.vertices = np.tile(self.vertices, (k, 1))
+        res.vertices[:, :2] = move(self.vertices)
+        res.vertices[:, 2:] *= np.repeat(scale, len(self.vertices))[:, None]
+        res.offsets = np.concatenate([[0], (self.offsets[1:] + len(self.vertices) * np.arange(k)[:, None]).ravel()])
+        res.cycle = np.tile(self.cycle, k)
+        res.circles = np.tile(self.circles, (k, 1))
+        res.circles[:, :2] = move(self.circles)
+        res.circles[:, 2] *= np.repeat(scale, len(self.circles))
+        res.circles[:, 3:] += np.repeat(angle, len(self.circles))[:, None]
+        res.black = np.tile(self.black, k)
+        res.labels = np.tile(self.labels, (k, 1))
+        res.labels[:, :2] = move(self.labels)
+        res.labels[:, 2] *= np.repeat(scale, len(self.labels))
+        res.labels[:, 3] += np.repeat(angle, len(self.labels))
+        res.texts = self.texts * k
+        res.places = self.places * k
+        return res
+
+    def expand(self) -> 'DrawList':
+        '''
+        Draw list with inserts of templates replaced by their transformed copies
+        '''
+        self._compact()
+        res = DrawList()
+        res.vertices, res.offsets, res.cycle = self.vertices.copy(), self.offsets.copy(), self.cycle.copy()
+        res.circles, res.black, res.labels = self.circles.copy(), self.black.copy(), self.labels.copy()
+        res.texts, res.places = list(self.texts), list(self.places)
+        names = np.array(self.insert_names, dtype=object)
+        for name in dict.fromkeys(self.insert_names):
+            inserts = self.inserts[names == name]
+            res.extend(self.templates[name].instances(inserts[:, :2], inserts[:, 2], inserts[:, 3]))
+        return res
+
+    def flush(self, te):
+        '''
+        Draws all commands on TextEngine te
+        '''
+        self._compact()
+        if self.inserts.size and not (hasattr(te, 'block') and hasattr(te, 'insert')):
+            self.expand().flush(te)
+            return
+        vertices = self.vertices.tolist()
+        widths = ~np.isnan(self.vertices[:, 2:]).any(axis=1)
+        for start, end, cycle in zip(self.offsets[:-1].tolist(), self.offsets[1:].tolist(), self.cycle.tolist()):
+            te.lines(*(tuple(v if widths[k] else v[:2]) for k, v in enumerate(vertices[start:end], start)),
+                     cycle=cycle)
+        for (x, y, r, st_angle, en_angle), black in zip(self.circles.tolist(), self.black.tolist()):
+            kwargs = {} if black < 0 else {'black': bool(black)}
+            if not math.isnan(st_angle):
+                kwargs.update(st_angle=st_angle, en_angle=en_angle)
+            te.circle(x, y, r=r, **kwargs)
+        for (x, y, s, angle), text, place in zip(self.labels.tolist(), self.texts, self.places):
+            kwargs = {} if math.isnan(s) else {'s': s}
+            te.label(x, y, text=text, place=place, angle=angle, **kwargs)
+        for name in dict.fromkeys(self.insert_names):
+            te.block(name, self.templates[name])
+        for (x, y, angle, scale), name in zip(self.inserts.tolist(), self.insert_names):
+            if scale == 1:
+                te.insert(name, x, y, angle)
+            else:
+                te.insert(name, x, y, angle, scale=scale)
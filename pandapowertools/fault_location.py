@@ -0,0 +1,144 @@
+import math
+
+
+import numpy as np
+import pandas as pd
+from scipy.sparse.linalg import splu
+from pandapower import pandapowerNet
+from pandapower.auxiliary import _clean_up, _add_ppc_options, _add_sc_options
+from pandapower.pd2ppc_zero import _pd2ppc_zero
+from pandapower.pypower.idx_brch import F_BUS, T_BUS, BR_R, BR_X, BR_B
+from pandapower.pypower.idx_brch_sc import K_ST
+from pandapower.pypower.makeYbus import branch_vectors
+from pandapower.shortcircuit.impedance import _calc_ybus
+from pandapower.shortcircuit.ppc_conversion import _init_ppc, _create_k_updated_ppci, _get_is_ppci_bus
+
+
+from pandapowertools.functions import define_c
+
+
+FAULTS = ('3ph', '2ph', '1ph')
+DISTANCE_TOLERANCE_KM = 1e-3
+
+
+def _sequence_networks(net: pandapowerNet, case: str, lv_tol_percent: int, zero_sequence: bool) -> tuple:
+    '''
+    Схемы прямой и нулевой последовательностей pandapower как в calc_sc (с коэффициентами коррекции K)
+    :return: baseMVA, [(Ybus, branch)] для прямой и, если zero_sequence, нулевой последовательности
+    '''
+    net['_options'] = {}
+    _add_ppc_options(net, calculate_voltage_angles=False, trafo_model='pi', check_connectivity=True, mode='sc',
+                     switch_rx_ratio=2, init_vm_pu='flat', init_va_degree='flat', enforce_q_lims=False, recycle=None)
+    _add_sc_options(net, fault='1ph' if zero_sequence else '3ph', case=case, lv_tol_percent=lv_tol_percent, tk_s=1.,
+                    topology='auto', r_fault_ohm=0., x_fault_ohm=0., kappa=False, ip=False, ith=False,
+                    branch_results=False, kappa_method='C', return_all_currents=False, inverse_y=False,
+                    use_pre_fault_voltage=False)
+    try:
+        ppc, ppci = _init_ppc(net)
+        _, ppci, _ = _create_k_updated_ppci(net, ppci, ppci_bus=_get_is_ppci_bus(net, net.bus.index.values))
+        _calc_ybus(ppci)
+        networks = [(ppci['internal']['Ybus'], ppc['branch'])]
+        if zero_sequence:
+            ppc_0, ppci_0 = _pd2ppc_zero(net, ppc['branch'][:, K_ST])
+            _calc_ybus(ppci_0)
+            networks.append((ppci_0['internal']['Ybus'], ppc_0['branch']))
+    finally:
+        _clean_up(net)
+    return ppci['baseMVA'], networks
+
+
+def _segments(row: np.ndarray, fraction: np.ndarray) -> tuple:
+    '''
+    П-схемы участков линии от начала до места КЗ и от места КЗ до конца
+    :return: (yff, yft, ytf, ytt) участка 1 и участка 2, массивы по fraction
+    '''
+    rows = np.repeat(row[None], 2 * len(fraction), axis=0)
+    k = np.concatenate([fraction, 1 - fraction])
+    rows[:, BR_R] *= k
+    rows[:, BR_X] *= k
+    rows[:, BR_B] *= k
+    ytt, yff, yft, ytf = branch_vectors(rows, len(rows))
+    n = len(fraction)
+    return (yff[:n], yft[:n], ytf[:n], ytt[:n]), (yff[n:], yft[n:], ytf[n:], ytt[n:])
+
+
+def _fault_point(y_bus, row: np.ndarray, fraction: np.ndarray) -> tuple:
+    '''
+    Собственные сопротивления точки КЗ на линии и взаимные сопротивления с концами линии по одному разложению
+    матрицы узловых проводимостей. Линия заменяется двумя участками: разница проводимостей на концах линии
+    учитывается формулой Вудбери через блок 2x2 матрицы узловых сопротивлений концов линии
+    :param row: строка ветви линии в ppc
+    :param fraction: расстояния до места КЗ в долях длины линии
+    :return: z_ff, z_af, z_bf, участки 1 и 2 (см. _segments)
+    '''
+    ab = row[[F_BUS, T_BUS]].real.astype(np.int64)
+    rhs = np.zeros((y_bus.shape[0], 2), dtype=complex)
+    rhs[ab, [0, 1]] = 1
+    z2 = splu(y_bus.tocsc()).solve(rhs)[ab]
+    line_ytt, line_yff, line_yft, line_ytf = branch_vectors(row[None], 1)
+    segment1, segment2 = _segments(row, fraction)
+    n = len(fraction)
+    dy = np.zeros((n, 2, 2), dtype=complex)
+    dy[:, 0, 0] = segment1[0] - line_yff[0]
+    dy[:, 1, 1] = segment2[3] - line_ytt[0]
+    dy[:, 0, 1] = -line_yft[0]
+    dy[:, 1, 0] = -line_ytf[0]
+    zp = z2 @ np.linalg.inv(np.eye(2) + dy @ z2)
+    c = np.stack([segment1[1], segment2[2]], axis=1)
+    y_ff = segment1[3] + segment2[0]
+    zc = np.einsum('nij,nj->ni', zp, c)
+    r = np.stack([segment1[2], segment2[1]], axis=1)
+    z_ff = 1 / (y_ff - np.einsum('ni,ni->n', r, zc))
+    z_pf = -zc * z_ff[:, None]
+    return z_ff, z_pf[:, 0], z_pf[:, 1], segment1, segment2
+
+
+def fault_location_table(net: pandapowerNet, line: int, step_km: float, faults=('3ph', '1ph'), case: str = 'max',
+                         rf: float = 0, lv_tol_percent: int = 10) -> pd.DataFrame:
+    '''
+    Токи КЗ в точках линии через step_km и токи, протекающие по концам линии, для определения места повреждения.
+    Схемы последовательностей строятся и раскладываются один раз, зависимость сопротивлений места КЗ от расстояния
+    учитывается аналитически. Токи подпитки от sgen не учитываются
+    :param line: индекс линии
+    :param step_km: шаг по длине линии, км - точки КЗ на расстояниях, кратных step_km, и в конце линии (точки ближе
+    DISTANCE_TOLERANCE_KM к концу линии не рассчитываются)
+    :param faults: виды КЗ '3ph', '2ph', '1ph'
+    :param case: 'max' или 'min'
+    :param rf: сопротивление в месте КЗ, Ом (как r_fault_ohm в pandapower)
+    :param lv_tol_percent: допуск напряжения сети 0.4кВ 6% или 10%
+    :return: DataFrame с индексом (fault, distance_km) - расстояние от from_bus, и столбцами ikss_ka,
+    i_from_ka, i_to_ka (фазные токи по концам линии), i0_from_ka, i0_to_ka (3I0 по концам линии)
+    '''
+    if not set(faults) <= set(FAULTS):
+        raise ValueError(f'faults must be from {FAULTS}')
+    length = net.line.at[line, 'length_km']
+    distance = np.arange(0, length, step_km)
+    distance = np.append(distance[distance < length - DISTANCE_TOLERANCE_KM], length)
+    fraction = np.clip(distance / length, 1e-9, 1 - 1e-9)
+    base_mva, networks = _sequence_networks(net, case, lv_tol_percent, '1ph' in faults)
+    start = net._pd2ppc_lookups['branch']['line'][0]
+    position = net.line.index.get_loc(line)
+    points = []
+    for y_bus, branch in networks:
+        z_ff, z_af, z_bf, segment1, segment2 = _fault_point(y_bus, branch[start + position], fraction)
+        points.append((z_ff, segment1[0] * z_af + segment1[1] * z_ff, segment2[2] * z_ff + segment2[3] * z_bf))
+    vn_kv = net.bus.at[net.line.at[line, 'from_bus'], 'vn_kv']
+    c = define_c(vn_kv, case, lv_tol_percent)
+    i_base = base_mva / math.sqrt(3) / vn_kv
+    zf = rf / (vn_kv ** 2 / base_mva)
+    z1, i1_from, i1_to = points[0]
+    frames = {}
+    for fault in faults:
+        if fault == '1ph':
+            z0, i0_from, i0_to = points[1]
+            i = c / (2 * z1 + z0 + 3 * zf)
+            res = {'ikss_ka': 3 * np.abs(i), 'i_from_ka': np.abs(i * (2 * i1_from + i0_from)),
+                   'i_to_ka': np.abs(i * (2 * i1_to + i0_to)), 'i0_from_ka': 3 * np.abs(i * i0_from),
+                   'i0_to_ka': 3 * np.abs(i * i0_to)}
+        else:
+            i = c / (z1 + zf) if fault == '3ph' else c / 2 / (z1 + zf)
+            k = 1 if fault == '3ph' else math.sqrt(3)
+            res = {'ikss_ka': np.abs(i) * k, 'i_from_ka': np.abs(i * i1_from) * k, 'i_to_ka': np.abs(i * i1_to) * k,
+                   'i0_from_ka': np.zeros(len(distance)), 'i0_to_ka': np.zeros(len(distance))}
+        frames[fault] = pd.DataFrame(res, index=pd.Index(distance, name='distance_km')) * i_base
+    return pd.concat(frames, names=['fault'])
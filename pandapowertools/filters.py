@@ -0,0 +1,132 @@
+import math
+
+
+import numpy as np
+import pandas as pd
+from pandapowertools.net import Net
+from pandapowertools.harmonics import i2lc, HarmonicSweep
+
+
+def filter_candidates(net: Net, buses, orders, q_mvar) -> pd.DataFrame:
+    '''
+    Сетка вариантов фильтров высших гармоник: все сочетания шин, номеров фильтруемых гармоник и мощностей.
+    Ёмкость и индуктивность рассчитываются i2lc по току фильтра на основной гармонике при номинальном напряжении шины
+    :param buses: шины подключения фильтра
+    :param orders: номера фильтруемых гармоник
+    :param q_mvar: реактивные мощности фильтров на основной гармонике, Мвар
+    :return: DataFrame со столбцами bus, order, q_mvar, c_f, l_h, kvar (мощность конденсаторов фильтра, квар)
+    '''
+    bus, order, q = (a.ravel() for a in np.meshgrid(np.atleast_1d(buses), np.atleast_1d(orders),
+                                                   np.atleast_1d(q_mvar), indexing='ij'))
+    u = net.net.bus['vn_kv'].loc[bus].to_numpy() * 1e3
+    i = q * 1e6 / u / math.sqrt(3)
+    c, l, qc, _, _ = i2lc(i, u, order)
+    return pd.DataFrame({'bus': bus, 'order': order, 'q_mvar': q, 'c_f': c, 'l_h': l, 'kvar': qc / 1e3})
+
+
+def pareto(cost: np.ndarray, value: np.ndarray) -> np.ndarray:
+    '''
+    Варианты, для которых нет другого варианта не хуже по обоим критериям и лучше хотя бы по одному
+    :return: массив bool
+    '''
+    order = np.lexsort((value, cost))
+    best = np.minimum.accumulate(value[order])
+    front = np.ones(len(order), dtype=bool)
+    front[1:] = value[order][1:] < best[:-1]
+    result = np.empty(len(order), dtype=bool)
+    result[order] = front
+    return result
+
+
+class FilterDesign:
+    '''
+    Выбор фильтров высших гармоник. Для каждой гармоники спектра матрица узловых проводимостей сети раскладывается
+    один раз, столбцы матрицы узловых сопротивлений рассчитываются для шин вариантов, после чего влияние фильтра
+    каждого варианта на напряжения контролируемых шин находится по формуле Шермана-Моррисона для всех вариантов сразу.
+    Источники гармоник - ext_grid, как в HarmonicSweep.
+    '''
+    def __init__(self, net: Net, spectrum: dict, buses=None, mode_name: str = '', skin_effect: bool = True,
+                 quality: float = 50):
+        '''
+        :param net: pandapowertools Net
+        :param spectrum: словарь {номер гармоники: напряжение ext_grid в о.е.}
+        :param buses: контролируемые шины, если None то все шины
+        :param mode_name: режим из net['modes']
+        :param skin_effect: учитывать увеличение активных сопротивлений с частотой
+        :param quality: добротность реакторов фильтров на частоте настройки
+        '''
+        self.net = net
+        self.spectrum = spectrum
+        self.quality = quality
+        self.sweep = sweep = HarmonicSweep(net, mode_name, skin_effect)
+        self.buses = sweep.bus_index if buses is None else pd.Index(np.atleast_1d(buses))
+        self._position = np.full(len(sweep.model.base_kv), -1)
+        self._position[sweep._n] = np.arange(len(sweep._n))
+        self._monitor = sweep._bus[sweep.bus_index.get_indexer(self.buses)]
+        self._solutions = {}
+
+    def _solution(self, h: float, bus: np.ndarray) -> tuple:
+        '''
+        :return: напряжения шин без фильтров, собственные сопротивления шин bus, взаимные сопротивления
+        контролируемых шин и шин bus, напряжения шин bus в о.е.
+        '''
+        sweep = self.sweep
+        if h not in self._solutions:
+            v, _, lu = sweep._solve(h)
+            self._solutions[h] = v * self.spectrum[h], lu
+        v, lu = self._solutions[h]
+        k = self._position[bus]
+        rhs = np.zeros((len(sweep._n), len(bus)), dtype=complex)
+        rhs[k, np.arange(len(bus))] = 1
+        z = np.zeros((len(sweep.model.base_kv), len(bus)), dtype=complex)
+        z[sweep._n] = lu.solve(rhs)
+        return v, z[bus, np.arange(len(bus))], z[self._monitor], v[bus]
+
+    def evaluate(self, candidates: pd.DataFrame) -> pd.DataFrame:
+        '''
+        Расчёт коэффициента гармонических составляющих напряжения для вариантов фильтров
+        :param candidates: DataFrame со столбцами bus, order, c_f, l_h, kvar (см. filter_candidates)
+        :return: candidates со столбцами thd_percent (максимальный на контролируемых шинах), bus_max (шина максимума)
+        и pareto (оптимальные по Парето варианты по kvar и thd_percent)
+        '''
+        sweep = self.sweep
+        bus = sweep._bus[sweep.bus_index.get_indexer(candidates['bus'].to_numpy())]
+        if (self._position[bus] < 0).any():
+            raise ValueError('Filter candidates must not be connected to buses of ext_grid')
+        unique, inverse = np.unique(bus, return_inverse=True)
+        c = candidates['c_f'].to_numpy()
+        l = candidates['l_h'].to_numpy()
+        w = 100 * math.pi
+        r = candidates['order'].to_numpy() * w * l / self.quality
+        z_base = sweep.model.base_kv[bus] ** 2 / sweep.model.base_mva
+        v2 = np.zeros((len(self._monitor), len(candidates)))
+        for h in self.spectrum:
+            v, z_kk, z_mk, v_k = self._solution(h, unique)
+            y = z_base / (r + 1j * (h * w * l - 1 / (h * w * c)))
+            k = y * v_k[inverse] / (1 + y * z_kk[inverse])
+            v2 += np.abs(v[self._monitor][:, None] - z_mk[:, inverse] * k) ** 2
+        thd = np.sqrt(np.nan_to_num(v2)) * 100
+        res = candidates.copy()
+        res['thd_percent'] = thd.max(axis=0)
+        res['bus_max'] = self.buses[thd.argmax(axis=0)]
+        res['pareto'] = pareto(res['kvar'].to_numpy(), res['thd_percent'].to_numpy())
+        return res
+
+    def thd(self) -> pd.Series:
+        '''
+        Коэффициент гармонических составляющих напряжения контролируемых шин без фильтров, %
+        '''
+        v2 = sum(np.abs(self._solution(h, np.zeros(0, dtype=np.int64))[0][self._monitor]) ** 2 for h in self.spectrum)
+        return pd.Series(np.sqrt(np.nan_to_num(v2)) * 100, index=self.buses)
+
+
+def design_filters(net: Net, spectrum: dict, buses, orders, q_mvar, monitor=None, mode_name: str = '',
+                   quality: float = 50) -> pd.DataFrame:
+    '''
+    Перебор вариантов фильтров filter_candidates и их оценка FilterDesign.evaluate
+    :param monitor: контролируемые шины, если None то все шины
+    :return: варианты на фронте Парето, отсортированные по kvar
+    '''
+    design = FilterDesign(net, spectrum, monitor, mode_name, quality=quality)
+    res = design.evaluate(filter_candidates(net, buses, orders, q_mvar))
+    return res[res['pareto']].sort_values('kvar', ignore_index=True)
@@ -2,9 +2,11 @@ import tomllib
 import re
 import unicodedata
 import os
+from functools import lru_cache
 
 
 import pandapower as pp
+import pandas as pd
 
 
 def define_c(u: float, case: str, lv_tol_percent: int) -> float:
@@ -33,27 +35,24 @@ def define_c(u: float, case: str, lv_tol_percent: int) -> float:
 
 
 
+ATTRIBUTE_NAME_TABLE = str.maketrans({char: '_' for char in '-/.() №=*,+'})
+
+
 def russian_to_attribute_name(text: str):
-    text = text.replace('-', '_')
-    text = text.replace('/', '_')
-    text = text.replace('.', '_')
-    text = text.replace('(', '_')
-    text = text.replace(')', '_')
-    text = text.replace(' ', '_')
-    text = text.replace('№', '_')
-    text = text.replace('=', '_')
-    text = text.replace('*', '_')
-    text = text.replace(',', '_')
-    text = text.replace('+', '_')
-    return text
+    return text.translate(ATTRIBUTE_NAME_TABLE)
 
-def split_str(text: str, num: int) -> list:
+def russian_to_attribute_names(texts: pd.Series) -> pd.Series:
     '''
-    Split string into elements with num characters
-    :param text:
-    :param num:
-    :return:
+    Vectorized russian_to_attribute_name for Series of strings
     '''
+    return texts.str.translate(ATTRIBUTE_NAME_TABLE)
+
+
+TEXT_CACHE_SIZE = 4096
+
+
+@lru_cache(maxsize=TEXT_CACHE_SIZE)
+def _split_str(text: str, num: int) -> tuple:
     res = []
     sep = ' ,.-_'
     while len(text) > num:
@@ -69,4 +68,22 @@ def split_str(text: str, num: int) -> list:
             res.append(text[:n+1])
             text = text[n+1:]
     res.append(text)
-    return res
\ No newline at end of file
+    return tuple(res)
+
+def split_str(text: str, num: int) -> list:
+    '''
+    Split string into elements with num characters. Results are cached by (text, num)
+    :param text:
+    :param num:
+    :return:
+    '''
+    return list(_split_str(text, num))
+
+@lru_cache(maxsize=TEXT_CACHE_SIZE)
+def text_layout(text: str, length: int) -> tuple:
+    '''
+    Rows of label text not longer than length (split_str for long text), cached by (text, length)
+    :return: rows from top to bottom, width of text in chars, number of rows
+    '''
+    rows = _split_str(text, length) if len(text) > length else (text,)
+    return rows, max(map(len, rows)), len(rows)
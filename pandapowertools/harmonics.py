@@ -1,7 +1,13 @@
 import math
 
 
+import numpy as np
+from scipy import sparse
+from scipy.sparse.linalg import splu
 from pandapower import pandapowerNet
+from pandapower.converter import to_ppc
+from pandapower.pypower.idx_brch import F_BUS, T_BUS, BR_R, BR_X, BR_B, TAP, SHIFT, BR_STATUS
+from pandapower.pypower.idx_bus import BUS_TYPE, NONE, BASE_KV
 from pandapowertools.net import Net
 import pandas as pd
 import matplotlib.pyplot as plt
@@ -9,19 +15,19 @@ import matplotlib.pyplot as plt
 
 def i2lc(i, u, nf):
     '''
-    Расчёт ёмкости и индуктивности фильтра высших гармоник по току на основной гармонике и номеру фильтруемой гармоники
-    :param i:
-    :param nf:
-    :return:
+    Расчёт ёмкости и индуктивности фильтра высших гармоник по току на основной гармонике и номеру фильтруемой гармоники.
+    Аргументы могут быть массивами numpy
+    :param i: ток фильтра на основной гармонике, А
+    :param u: линейное напряжение, В
+    :param nf: номер фильтруемой гармоники
+    :return: c F, l H, qc VA, ql Ом, w
     '''
     z = u / i / math.sqrt(3)
-    print(f'z = {z}')
     w= 100 * math.pi
     c = (nf ** 2 - 1) / w / z / nf / nf
     l = 1 / nf / nf / w / w / c
     qc = u ** 2 * w * c
     ql = w * l
-    print('c F, l H, qc VA, ql VA, w')
     return c, l, qc, ql, w
 
 def recalc_imp_harm(net: pandapowerNet, nf: int):
@@ -32,7 +38,7 @@ def recalc_imp_harm(net: pandapowerNet, nf: int):
     :return:
     '''
     if any([not net[item].empty for item in ('trafo', 'trafo3w', 'gen', 'sgen')]):
-        raise NotImplementedError('Recalc for trafo, trafo3w, gen, sgen not implemented')
+        raise NotImplementedError('Recalc for trafo, trafo3w, gen, sgen not implemented, use HarmonicModel or HarmonicSweep')
     net.line.x_ohm_per_km *= nf
     index_capacitor = net.shunt[net.shunt['q_mvar'] < 0].index
     net.shunt.loc[index_capacitor, 'q_mvar'] *= nf
@@ -48,17 +54,7 @@ def get_i_by_u(net: Net, bus: int, v_pu: float):
     :param v_pu: напряжение на шине bus в относительных единицах для которого нужно найти ток
     :return: # ток в кА
     '''
-    temp = net.net.ext_grid.loc[0, 'vm_pu']
-    net.net.ext_grid.loc[0, 'vm_pu'] = 1
-    net.calc_pf_pgm()
-    v = net.net.res_bus.loc[bus, 'vm_pu']
-    vn_kv = net.net.bus.loc[net.net.ext_grid.bus[0], 'vn_kv']
-    s = math.sqrt(net.net.res_ext_grid.loc[0, 'p_mw'] ** 2 + net.net.res_ext_grid.loc[0, 'q_mvar'] ** 2)
-    i = s / net.net.ext_grid.loc[0, 'vm_pu'] / vn_kv / math.sqrt(3)
-    k = v / v_pu
-    i /= k
-    net.net.ext_grid.loc[0, 'vm_pu'] = temp
-    return i
+    return TransferImpedance(net).i_by_u(bus, v_pu)
 
 def get_u_by_i(net: Net, bus: int, i: float):
     '''
@@ -68,14 +64,366 @@ def get_u_by_i(net: Net, bus: int, i: float):
     :param i: kA
     :return: напряжение в относительных единицах
     '''
-    temp = net.net.ext_grid.loc[0, 'vm_pu']
-    net.net.ext_grid.loc[0, 'vm_pu'] = 1
-    net.calc_pf_pgm()
-    v = net.net.res_bus.loc[bus, 'vm_pu']
-    vn_kv = net.net.bus.loc[bus, 'vn_kv']
-    s = math.sqrt(net.net.res_ext_grid.loc[0, 'p_mw'] ** 2 + net.net.res_ext_grid.loc[0, 'q_mvar'] ** 2)
-    i_v1pu = s / net.net.ext_grid.loc[0, 'vm_pu'] / vn_kv / math.sqrt(3)
-    k = i_v1pu / i
-    v /= k
-    net.net.ext_grid.loc[0, 'vm_pu'] = temp
-    return v
+    return TransferImpedance(net).u_by_i(bus, i)
+
+
+def find_resonances(z: pd.DataFrame) -> pd.DataFrame:
+    '''
+    Поиск резонансов по частотным характеристикам сопротивлений: максимум |z| - резонанс токов (parallel),
+    минимум |z| - резонанс напряжений (series)
+    :param z: сопротивления, индекс - номера гармоник, столбцы - шины или другие элементы
+    :return: DataFrame со столбцами element, h, z_ohm, kind
+    '''
+    a = np.abs(z.to_numpy())
+    d = np.sign(np.diff(a, axis=0))
+    parallel = (d[:-1] > 0) & (d[1:] < 0)
+    series = (d[:-1] < 0) & (d[1:] > 0)
+    i, j = np.nonzero(parallel | series)
+    res = pd.DataFrame({'element': z.columns[j], 'h': z.index[i + 1], 'z_ohm': a[i + 1, j],
+                        'kind': np.where(parallel[i, j], 'parallel', 'series')})
+    return res.sort_values(['element', 'h'], ignore_index=True)
+
+
+def skin_effect_line(h):
+    '''
+    Коэффициент увеличения активного сопротивления линий на гармонике h из-за поверхностного эффекта
+    '''
+    h = np.asarray(h, dtype=float)
+    return 1 + 0.646 * h ** 2 / (192 + 0.518 * h ** 2)
+
+
+def skin_effect_sqrt(h):
+    '''
+    Коэффициент увеличения активного сопротивления трансформаторов и генераторов на гармонике h
+    '''
+    return np.sqrt(h)
+
+
+class HarmonicModel:
+    '''
+    Сопротивления элементов сети на высших гармониках без изменения таблиц сети. Параметры основной гармоники
+    в о.е. (ветви линий, трансформаторов, трёхобмоточных трансформаторов с учётом выключателей и параллельных цепей,
+    шунты, нагрузки, генераторы и sgen) рассчитываются один раз, для каждой гармоники выполняется только умножение
+    массивов:
+    - индуктивные сопротивления увеличиваются в h раз (в том числе отрицательные сопротивления лучей схемы
+    замещения trafo3w), ёмкостные уменьшаются в h раз - продольная компенсация задаётся линиями или impedance
+    с отрицательным x;
+    - активные сопротивления линий умножаются на skin_effect_line(h), трансформаторов и генераторов
+    на skin_effect_sqrt(h), если skin_effect;
+    - нагрузки и шунты - постоянные проводимости;
+    - генераторы - сопротивления rdss_ohm + j*xdss_pu (при отсутствии sn_mva мощность p_mw / cos_phi), sgen - сопротивления по k и rx, если они заданы;
+    - ext_grid - идеальные источники напряжения гармоник vm_pu.
+    '''
+    def __init__(self, net: Net, mode_name: str = '', skin_effect: bool = True):
+        '''
+        :param net: pandapowertools Net
+        :param mode_name: режим из net['modes']
+        :param skin_effect: учитывать увеличение активных сопротивлений с частотой
+        '''
+        self.net = net
+        self.skin_effect = skin_effect
+        with net.mode(mode_name):
+            ppc = to_ppc(net.net, init='flat', trafo_model='pi')
+            self._init_branches(net.net, ppc)
+            self._init_buses(net.net, ppc)
+
+    def _init_branches(self, net: pandapowerNet, ppc: dict):
+        lookups = net._pd2ppc_lookups
+        self.base_mva = ppc['baseMVA']
+        self.base_kv = ppc['bus'][:, BASE_KV].real
+        self.active = ppc['bus'][:, BUS_TYPE].real != NONE
+        branch = ppc['branch']
+        self.f = branch[:, F_BUS].real.astype(np.int64)
+        self.t = branch[:, T_BUS].real.astype(np.int64)
+        self.on = (branch[:, BR_STATUS].real == 1) & self.active[self.f] & self.active[self.t]
+        self.r = branch[:, BR_R].real
+        self.x = branch[:, BR_X].real
+        self.b = branch[:, BR_B].real
+        tap = branch[:, TAP].real.copy()
+        tap[tap == 0] = 1
+        self.ratio = tap * np.exp(1j * np.deg2rad(branch[:, SHIFT].real))
+        self.skin = np.zeros(len(branch), dtype=np.int8)
+        for element, skin in (('line', 1), ('trafo', 2), ('trafo3w', 2)):
+            start, end = lookups['branch'].get(element, (0, 0))
+            self.skin[start:end] = skin
+        self.capacitive = np.zeros(len(branch), dtype=bool)
+        for element in ('line', 'impedance'):
+            start, end = lookups['branch'].get(element, (0, 0))
+            self.capacitive[start:end] = self.x[start:end] < 0
+        start, end = lookups['branch'].get('line', (0, 0))
+        self.line_index = net.line.index
+        self.line_branch = np.arange(start, end)
+
+    def _init_buses(self, net: pandapowerNet, ppc: dict):
+        bus_lookup = net._pd2ppc_lookups['bus']
+        nb = len(self.base_kv)
+        shunt = net.shunt[net.shunt['in_service'].astype(bool)]
+        load = net.load[net.load['in_service'].astype(bool)]
+        buses = bus_lookup[np.concatenate([shunt['bus'].values, load['bus'].values]).astype(np.int64)]
+        v_ratio = (self.base_kv[bus_lookup[shunt['bus'].values]] / shunt['vn_kv'].values) ** 2
+        p = np.concatenate([shunt['p_mw'].values * shunt['step'].values * v_ratio,
+                            load['p_mw'].values * load['scaling'].values]) / self.base_mva
+        q = np.concatenate([shunt['q_mvar'].values * shunt['step'].values * v_ratio,
+                            load['q_mvar'].values * load['scaling'].values]) / self.base_mva
+        self.g_bus = np.zeros(nb)
+        self.b_c_bus = np.zeros(nb)
+        self.b_l_bus = np.zeros(nb)
+        np.add.at(self.g_bus, buses, p)
+        np.add.at(self.b_c_bus, buses, np.where(q < 0, -q, 0))
+        np.add.at(self.b_l_bus, buses, np.where(q > 0, -q, 0))
+
+        self.machine_bus, self.r_machine, self.x_machine = self._machines(net, bus_lookup)
+
+        ext_grid = net.ext_grid[net.ext_grid['in_service'].astype(bool)]
+        self.ext_grid_index = ext_grid.index
+        self.source = bus_lookup[ext_grid['bus'].values]
+        self.v_source = ext_grid['vm_pu'].values * np.exp(1j * np.deg2rad(ext_grid['va_degree'].values))
+        self.bus_index = net.bus.index
+        self.bus = bus_lookup[net.bus.index.values]
+
+    def _machines(self, net: pandapowerNet, bus_lookup: np.ndarray) -> tuple:
+        '''
+        :return: шины, активные и индуктивные сопротивления генераторов и sgen с заданным k в о.е.
+        '''
+        buses, r, x = [], [], []
+        gen = net.gen[net.gen['in_service'].astype(bool)]
+        if len(gen):
+            z_base = self.base_kv[bus_lookup[gen['bus'].values]] ** 2 / self.base_mva
+            cos_phi = gen['cos_phi'].fillna(1) if 'cos_phi' in gen else 1
+            sn_mva = gen['sn_mva'].fillna(gen['p_mw'] / cos_phi)
+            r_ohm = gen['rdss_ohm'].fillna(0).values if 'rdss_ohm' in gen else 0
+            buses.append(gen['bus'].values)
+            r.append(r_ohm / z_base)
+            x.append(gen['xdss_pu'].values * gen['vn_kv'].values ** 2 / sn_mva.values / z_base)
+        sgen = net.sgen[net.sgen['in_service'].astype(bool)]
+        if len(sgen) and 'k' in sgen:
+            sgen = sgen[sgen['k'].notna()]
+            rx = sgen['rx'].fillna(0).values if 'rx' in sgen else 0
+            x_sgen = self.base_mva / sgen['sn_mva'].values / sgen['k'].values / np.sqrt(1 + rx ** 2)
+            buses.append(sgen['bus'].values)
+            r.append(rx * x_sgen)
+            x.append(x_sgen)
+        if not buses:
+            return np.zeros(0, dtype=np.int64), np.zeros(0), np.zeros(0)
+        return bus_lookup[np.concatenate(buses).astype(np.int64)], np.concatenate(r), np.concatenate(x)
+
+    def _skin(self, h: float, skin: np.ndarray) -> np.ndarray:
+        if not self.skin_effect:
+            return np.ones(len(skin))
+        return np.choose(skin, [1., skin_effect_line(h), skin_effect_sqrt(h)])
+
+    def branch_impedances(self, h: float) -> tuple:
+        '''
+        Сопротивления ветвей П-схемы в о.е. для гармоники h
+        :return: последовательные сопротивления z и проводимости шунтов на каждом конце y_sh
+        '''
+        x = np.where(self.capacitive, self.x / h, self.x * h)
+        z = self.r * self._skin(h, self.skin) + 1j * x
+        y_sh = 1j * np.where(self.b >= 0, self.b * h, self.b / h) / 2
+        return z, y_sh
+
+    def branch_admittances(self, h: float) -> tuple:
+        '''
+        Проводимости ветвей П-схемы в о.е. для гармоники h: yff, yft, ytf, ytt
+        '''
+        z, y_sh = self.branch_impedances(h)
+        on = self.on
+        ys = np.zeros(len(on), dtype=complex)
+        ys[on] = 1 / z[on]
+        ytt = ys + y_sh * on
+        return ytt / (self.ratio * self.ratio.conj()), -ys / self.ratio.conj(), -ys / self.ratio, ytt
+
+    def bus_admittances(self, h: float) -> np.ndarray:
+        '''
+        Проводимости шунтов, нагрузок, генераторов и sgen на шинах в о.е. для гармоники h
+        '''
+        y = self.g_bus + 1j * (h * self.b_c_bus + self.b_l_bus / h)
+        skin = np.full(len(self.r_machine), 2 if self.skin_effect else 0, dtype=np.int8)
+        y_machine = 1 / (self.r_machine * self._skin(h, skin) + 1j * h * self.x_machine)
+        np.add.at(y, self.machine_bus, y_machine)
+        return y
+
+
+class HarmonicSweep:
+    '''
+    Частотные характеристики сети на высших гармониках без расчётов потокораспределения. Сеть на высших гармониках
+    линейна, поэтому матрица узловых проводимостей Y(h) собирается из сопротивлений HarmonicModel по заранее
+    подготовленной структуре ветвей и для каждой гармоники выполняется одно разложение разреженной матрицы.
+    Источники гармоник - ext_grid (идеальные источники напряжения vm_pu), как в get_i_by_u и get_u_by_i.
+    '''
+    def __init__(self, net: Net, mode_name: str = '', skin_effect: bool = True):
+        '''
+        :param net: pandapowertools Net
+        :param mode_name: режим из net['modes'] для которого рассчитываются характеристики
+        :param skin_effect: учитывать увеличение активных сопротивлений с частотой
+        '''
+        self.net = net
+        self.model = model = HarmonicModel(net, mode_name, skin_effect)
+        nb = len(model.base_kv)
+        diag = np.arange(nb)
+        self._rows = np.concatenate([model.f, model.f, model.t, model.t, diag])
+        self._cols = np.concatenate([model.f, model.t, model.f, model.t, diag])
+        self._s = model.source
+        self._v_s = model.v_source
+        n = model.active.copy()
+        n[self._s] = False
+        self._n = np.flatnonzero(n)
+        self._bus = model.bus
+        self._bus_active = model.active[model.bus]
+        self.bus_index = model.bus_index
+        self.line_index = model.line_index
+        self.ext_grid_index = model.ext_grid_index
+
+    def admittance(self, h: float) -> sparse.csc_matrix:
+        '''
+        Матрица узловых проводимостей в о.е. для гармоники h
+        '''
+        y_bus = self.model.bus_admittances(h)
+        data = np.concatenate([*self.model.branch_admittances(h), y_bus])
+        nb = len(y_bus)
+        return sparse.csc_matrix((data, (self._rows, self._cols)), shape=(nb, nb))
+
+    def _solve(self, h: float):
+        '''
+        :return: напряжения шин в о.е., эквивалентная проводимость сети со стороны источников, разложение Y_nn
+        '''
+        y = self.admittance(h)
+        y_n = y[self._n]
+        lu = splu(y_n[:, self._n].tocsc())
+        x = lu.solve(y_n[:, self._s].toarray())
+        y_eq = y[self._s][:, self._s].toarray() - y[self._s][:, self._n] @ x
+        v = np.full(y.shape[0], np.nan, dtype=complex)
+        v[self._s] = self._v_s
+        v[self._n] = -x @ self._v_s
+        return v, y_eq, lu
+
+    def run(self, orders=range(2, 41)) -> dict:
+        '''
+        Расчёт для всех гармоник orders
+        :param orders: номера гармоник (могут быть дробными для поиска резонансов)
+        :return: словарь DataFrame с индексом - номерами гармоник: vm_pu (столбцы - шины), va_degree, i_ka (линии),
+        i_ext_grid_ka (ext_grid), z_ext_grid_ohm (ext_grid, комплексные сопротивления сети со стороны источников)
+        '''
+        orders = np.asarray(orders, dtype=float)
+        v_bus = np.empty((len(orders), len(self._bus)), dtype=complex)
+        line_branch = self.model.line_branch
+        i_line = np.empty((len(orders), len(line_branch)))
+        i_source = np.empty((len(orders), len(self._s)))
+        z_source = np.empty((len(orders), len(self._s)), dtype=complex)
+        f = self.model.f[line_branch]
+        t = self.model.t[line_branch]
+        i_base = self.model.base_mva / math.sqrt(3) / self.model.base_kv
+        for k, h in enumerate(orders):
+            v, y_eq, lu = self._solve(h)
+            v_bus[k] = np.where(self._bus_active, v[self._bus], np.nan)
+            yff, yft, ytf, ytt = (y[line_branch] for y in self.model.branch_admittances(h))
+            i_f = np.abs(yff * v[f] + yft * v[t]) * i_base[f]
+            i_t = np.abs(ytf * v[f] + ytt * v[t]) * i_base[t]
+            i_line[k] = np.where(self.model.on[line_branch], np.maximum(i_f, i_t), 0)
+            i_source[k] = np.abs(y_eq @ self._v_s) * i_base[self._s]
+            z_source[k] = np.diag(np.linalg.inv(y_eq)) * self.model.base_kv[self._s] ** 2 / self.model.base_mva
+        index = pd.Index(orders, name='h')
+        return {'vm_pu': pd.DataFrame(np.abs(v_bus), index=index, columns=self.bus_index),
+                'va_degree': pd.DataFrame(np.angle(v_bus, deg=True), index=index, columns=self.bus_index),
+                'i_ka': pd.DataFrame(i_line, index=index, columns=self.line_index),
+                'i_ext_grid_ka': pd.DataFrame(i_source, index=index, columns=self.ext_grid_index),
+                'z_ext_grid_ohm': pd.DataFrame(z_source, index=index, columns=self.ext_grid_index)}
+
+    def impedance(self, orders=range(2, 41), buses=None) -> pd.DataFrame:
+        '''
+        Собственные сопротивления шин (источники гармоник закорочены) в Ом для гармоник orders
+        :param buses: шины, если None то все шины
+        :return: DataFrame комплексных сопротивлений, индекс - номера гармоник, столбцы - шины
+        '''
+        orders = np.asarray(orders, dtype=float)
+        buses = self.bus_index if buses is None else pd.Index(np.atleast_1d(buses))
+        bus = self._bus[self.bus_index.get_indexer(buses)]
+        position = np.full(len(self.model.base_kv), -1)
+        position[self._n] = np.arange(len(self._n))
+        k = position[bus]
+        columns = np.flatnonzero(k >= 0)
+        rhs = np.zeros((len(self._n), len(columns)))
+        rhs[k[columns], np.arange(len(columns))] = 1
+        z_base = self.model.base_kv[bus] ** 2 / self.model.base_mva
+        z = np.zeros((len(orders), len(buses)), dtype=complex)
+        z[:, ~np.isin(bus, self._s)] = np.nan
+        for i, h in enumerate(orders):
+            lu = self._solve(h)[2]
+            z[i, columns] = lu.solve(rhs)[k[columns], np.arange(len(columns))] * z_base[columns]
+        return pd.DataFrame(z, index=pd.Index(orders, name='h'), columns=buses)
+
+    def resonances(self, orders=np.arange(2, 40.05, 0.1), buses=None) -> pd.DataFrame:
+        '''
+        Резонансы на шинах buses (все шины если None), см. find_resonances
+        '''
+        return find_resonances(self.impedance(orders, buses).abs())
+
+
+def _scalar(values: np.ndarray, *args):
+    '''
+    float если все аргументы запроса скалярные
+    '''
+    if all(np.ndim(arg) == 0 for arg in args):
+        return float(values[0]) if np.ndim(values) else float(values)
+    return values
+
+
+class TransferImpedance:
+    '''
+    Передаточные коэффициенты сети от источника гармоник ext_grid к шинам без расчётов потокораспределения.
+    Матрица узловых проводимостей раскладывается один раз, напряжения всех шин при напряжении источника 1 о.е.
+    и мощность источника запоминаются, поэтому каждый запрос i_by_u и u_by_i выполняется за O(1) и принимает
+    массивы шин и значений. Нагрузки учитываются постоянными проводимостями (при напряжении 1 о.е.).
+    '''
+    def __init__(self, net: Net, ext_grid: int = 0, h: float = 1, mode_name: str = '', skin_effect: bool = False):
+        '''
+        :param net: pandapowertools Net
+        :param ext_grid: индекс ext_grid - источника гармоник, напряжения остальных ext_grid не изменяются
+        :param h: номер гармоники, 1 - сопротивления сети как в таблицах (например после recalc_imp_harm)
+        :param mode_name: режим из net['modes']
+        :param skin_effect: учитывать увеличение активных сопротивлений с частотой
+        '''
+        sweep = HarmonicSweep(net, mode_name, skin_effect)
+        source = sweep.ext_grid_index.get_loc(ext_grid)
+        sweep._v_s = sweep._v_s.copy()
+        sweep._v_s[source] = 1
+        v, y_eq, self.lu = sweep._solve(h)
+        self.bus_index = sweep.bus_index
+        self.v_pu = v[sweep._bus]
+        self.s_mva = abs((y_eq @ sweep._v_s)[source]) * sweep.model.base_mva
+        self.vn_kv = net.net.bus['vn_kv'].reindex(self.bus_index).to_numpy(dtype=float)
+        self.vn_kv_ext_grid = net.net.bus.at[net.net.ext_grid.at[ext_grid, 'bus'], 'vn_kv']
+
+    def _position(self, bus) -> np.ndarray:
+        position = self.bus_index.get_indexer(np.atleast_1d(bus))
+        if (position < 0).any():
+            raise KeyError(f'Buses {np.atleast_1d(bus)[position < 0]} not found')
+        return position
+
+    def ratio(self, bus):
+        '''
+        Модуль напряжения шины bus в о.е. при напряжении источника 1 о.е.
+        :param bus: шина или массив шин
+        '''
+        return _scalar(np.abs(self.v_pu[self._position(bus)]), bus)
+
+    def i_by_u(self, bus, v_pu):
+        '''
+        Ток ext_grid в кА (для номинального напряжения шины ext_grid), при котором напряжение на шине bus будет v_pu
+        :param bus: шина или массив шин
+        :param v_pu: напряжение или массив напряжений в о.е.
+        '''
+        k = np.abs(self.v_pu[self._position(bus)])
+        i = self.s_mva / self.vn_kv_ext_grid / math.sqrt(3) * np.asarray(v_pu) / k
+        return _scalar(i, bus, v_pu)
+
+    def u_by_i(self, bus, i):
+        '''
+        Напряжение на шине bus в о.е., при котором ток ext_grid (для номинального напряжения шины bus) будет i
+        :param bus: шина или массив шин
+        :param i: ток или массив токов в кА
+        '''
+        position = self._position(bus)
+        v = np.abs(self.v_pu[position]) * np.asarray(i) * math.sqrt(3) * self.vn_kv[position] / self.s_mva
+        return _scalar(v, bus, i)
+
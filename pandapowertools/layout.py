@@ -0,0 +1,179 @@
+import math
+
+
+import numpy as np
+import pandas as pd
+import pandapower as pp
+
+
+LABEL_OFFSET = 0.2
+
+
+def _bus_xy(net: pp.pandapowerNet, buses) -> tuple:
+    '''
+    Координаты шин по bus_geodata
+    :return: x, y (nan для шин без координат), маска шин с координатами
+    '''
+    geodata = net.bus_geodata
+    position = geodata.index.get_indexer(np.asarray(buses))
+    valid = position >= 0
+    if not {'x', 'y'} <= set(geodata.columns):
+        nan = np.full(len(position), np.nan)
+        return nan, nan.copy(), np.zeros(len(position), dtype=bool)
+    x = np.where(valid, geodata['x'].to_numpy(dtype=float)[position], np.nan)
+    y = np.where(valid, geodata['y'].to_numpy(dtype=float)[position], np.nan)
+    return x, y, valid
+
+
+def _busbars(net: pp.pandapowerNet, buses) -> np.ndarray:
+    '''
+    Концы шин, изображаемых отрезком (coords в bus_geodata)
+    :return: массив len(buses) x 2 x 2 ((x1, y1), (x2, y2)), nan для шин без отрезка
+    '''
+    geodata = net.bus_geodata
+    res = np.full((len(buses), 2, 2), np.nan)
+    if 'coords' not in geodata.columns:
+        return res
+    coords = geodata['coords'].reindex(np.asarray(buses)).to_numpy()
+    has = np.array([isinstance(c, (list, tuple)) and len(c) > 0 for c in coords], dtype=bool)
+    if has.any():
+        res[has] = np.array([[c[0], c[-1]] for c in coords[has]], dtype=float)
+    return res
+
+
+def label_anchor(x1, y1, x2, y2, offset: float = LABEL_OFFSET) -> tuple:
+    '''
+    Положение и угол подписи отрезков (как в Line_sym): середина отрезка, смещённая на offset
+    перпендикулярно отрезку, угол в радианах в пределах (-pi/2, pi/2]
+    '''
+    angle = np.arctan2(x1 - x2, y2 - y1) + math.pi / 2
+    angle = np.where(angle > math.pi / 2, angle - math.pi, angle)
+    return (x1 + x2) / 2 - offset * np.sin(angle), (y1 + y2) / 2 + offset * np.cos(angle), angle
+
+
+def layout_bus(net: pp.pandapowerNet) -> pd.DataFrame:
+    '''
+    :return: DataFrame с индексом шин из bus_geodata и столбцами x, y, xt, yt (положение подписи),
+    busbar (шина изображается отрезком), bx1, by1, bx2, by2 (концы отрезка)
+    '''
+    geodata = net.bus_geodata
+    buses = geodata.index
+    x, y, _ = _bus_xy(net, buses)
+    busbar = _busbars(net, buses)
+    res = pd.DataFrame({'x': x, 'y': y,
+                        'xt': geodata['xt'].to_numpy(dtype=float) if 'xt' in geodata else x,
+                        'yt': geodata['yt'].to_numpy(dtype=float) if 'yt' in geodata else y,
+                        'busbar': ~np.isnan(busbar[:, 0, 0]),
+                        'bx1': busbar[:, 0, 0], 'by1': busbar[:, 0, 1], 'bx2': busbar[:, 1, 0],
+                        'by2': busbar[:, 1, 1]}, index=buses)
+    return res
+
+
+def layout_line(net: pp.pandapowerNet, snap: bool = True) -> pd.DataFrame:
+    '''
+    Концы включённых линий, обе шины которых имеют координаты
+    :param snap: присоединять линии к отрезкам шин: вертикально к отрезку, а между двумя отрезками -
+    по середине их общей части по x
+    :return: DataFrame с индексом линий и столбцами x1, y1, x2, y2, xt, yt, angle (положение и угол подписи,
+    см. label_anchor)
+    '''
+    line = net.line[net.line['in_service'].astype(bool)]
+    x1, y1, valid1 = _bus_xy(net, line['from_bus'])
+    x2, y2, valid2 = _bus_xy(net, line['to_bus'])
+    valid = valid1 & valid2
+    line = line[valid]
+    x1, y1, x2, y2 = x1[valid], y1[valid], x2[valid], y2[valid]
+    if snap:
+        bar1 = _busbars(net, line['from_bus'])
+        bar2 = _busbars(net, line['to_bus'])
+        has1 = ~np.isnan(bar1[:, 0, 0])
+        has2 = ~np.isnan(bar2[:, 0, 0])
+        xs = np.sort(np.stack([bar1[:, 0, 0], bar2[:, 0, 0], bar1[:, 1, 0], bar2[:, 1, 0]], axis=1), axis=1)
+        middle = (xs[:, 1] + xs[:, 2]) / 2
+        x1, x2 = (np.select([has1 & has2, has1], [middle, x2], x1),
+                  np.select([has1 & has2, has2], [middle, x1], x2))
+        y1 = np.where(has1, bar1[:, 0, 1], y1)
+        y2 = np.where(has2, bar2[:, 0, 1], y2)
+    xt, yt, angle = label_anchor(x1, y1, x2, y2)
+    return pd.DataFrame({'x1': x1, 'y1': y1, 'x2': x2, 'y2': y2, 'xt': xt, 'yt': yt, 'angle': angle},
+                        index=line.index)
+
+
+def _layout_elements(net: pp.pandapowerNet, element: str, columns: tuple, in_service: bool = False) -> pd.DataFrame:
+    '''
+    Координаты шин элементов, все шины которых имеют координаты
+    :param columns: столбцы шин элемента
+    :return: DataFrame с индексом элементов и столбцами x1, y1, x2, y2 ... по columns
+    '''
+    table = net[element]
+    if in_service:
+        table = table[table['in_service'].astype(bool)]
+    xy = [_bus_xy(net, table[column]) for column in columns]
+    valid = np.logical_and.reduce([v for _, _, v in xy]) if xy else np.zeros(0, dtype=bool)
+    res = {}
+    for k, (x, y, _) in enumerate(xy, 1):
+        res[f'x{k}'] = x[valid]
+        res[f'y{k}'] = y[valid]
+    return pd.DataFrame(res, index=table.index[valid])
+
+
+def _nearest(points1: np.ndarray, points2: np.ndarray) -> tuple:
+    '''
+    Ближайшие точки двух наборов для каждой строки
+    :param points1: массив n x k x 2, nan для отсутствующих точек
+    :return: массивы n x 2 ближайших точек из points1 и points2
+    '''
+    distance = np.hypot(*(points1[:, :, None, :] - points2[:, None, :, :]).transpose(3, 0, 1, 2))
+    distance = np.where(np.isnan(distance), np.inf, distance).reshape(len(points1), -1)
+    best = distance.argmin(axis=1)
+    rows = np.arange(len(points1))
+    k = points2.shape[1]
+    return points1[rows, best // k], points2[rows, best % k]
+
+
+def layout_switch(net: pp.pandapowerNet) -> pd.DataFrame:
+    '''
+    Концы выключателей между шинами (et='b') и линиями (et='l'). Выключатель между шинами соединяет ближайшие
+    точки шин (узел или концы отрезка шины), выключатель линии направлен от шины к другому концу линии
+    :return: DataFrame с индексом выключателей и столбцами et, closed, x1, y1, x2, y2
+    '''
+    switch = net.switch
+    x1, y1, valid = _bus_xy(net, switch['bus'])
+    et = switch['et'].to_numpy()
+    element = switch['element'].to_numpy()
+    other = np.full(len(switch), -1, dtype=np.int64)
+    is_bus = et == 'b'
+    other[is_bus] = element[is_bus]
+    is_line = (et == 'l') & np.isin(element, net.line.index)
+    line = net.line.loc[element[is_line]]
+    other[is_line] = np.where(switch['bus'].to_numpy()[is_line] == line['to_bus'].to_numpy(),
+                              line['from_bus'].to_numpy(), line['to_bus'].to_numpy())
+    x2, y2, valid2 = _bus_xy(net, other)
+    valid &= valid2 & (is_bus | is_line)
+    bus = is_bus & valid
+    if bus.any():
+        points1 = np.concatenate([np.stack([x1[bus], y1[bus]], axis=1)[:, None], _busbars(net, switch['bus'][bus])],
+                                 axis=1)
+        points2 = np.concatenate([np.stack([x2[bus], y2[bus]], axis=1)[:, None], _busbars(net, other[bus])], axis=1)
+        (x1[bus], y1[bus]), (x2[bus], y2[bus]) = (p.T for p in _nearest(points1, points2))
+    return pd.DataFrame({'et': et[valid], 'closed': switch['closed'].to_numpy(dtype=bool)[valid],
+                         'x1': x1[valid], 'y1': y1[valid], 'x2': x2[valid], 'y2': y2[valid]},
+                        index=switch.index[valid])
+
+
+def layout(net: pp.pandapowerNet, impedance: bool = False) -> dict:
+    '''
+    Координаты всех элементов схемы для plot, рассчитанные массивами NumPy без обращения к строкам таблиц
+    :param impedance: схема замещения - линии без присоединения к отрезкам шин
+    :return: словарь {element: DataFrame} (см. layout_bus, layout_line, layout_switch), для остальных элементов
+    столбцы x1, y1 ... - координаты шин элемента
+    '''
+    return {'bus': layout_bus(net),
+            'line': layout_line(net, snap=not impedance),
+            'ext_grid': _layout_elements(net, 'ext_grid', ('bus',), in_service=True),
+            'trafo': _layout_elements(net, 'trafo', ('hv_bus', 'lv_bus')),
+            'trafo3w': _layout_elements(net, 'trafo3w', ('hv_bus', 'mv_bus', 'lv_bus')),
+            'gen': _layout_elements(net, 'gen', ('bus',)),
+            'impedance': _layout_elements(net, 'impedance', ('from_bus', 'to_bus')),
+            'switch': layout_switch(net),
+            'shunt': _layout_elements(net, 'shunt', ('bus',), in_service=True)}
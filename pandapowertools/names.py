@@ -0,0 +1,127 @@
+import pandas as pd
+
+
+# таблицы, от имён которых зависят имена элементов
+NAME_SOURCES = {'line': ('bus',), 'switch': ('bus', 'trafo'), 'trafo': ('trafo',), 'trafo3w': ('trafo3w',)}
+
+
+def _str(values: pd.Series) -> pd.Series:
+    return values.fillna('').astype(str)
+
+
+class NameIndex:
+    '''
+    Names of lines ("from bus - to bus"), switches ("bus - element"), trafos and trafo3w with reverse lookup from name
+    to index. Names of every element are built by columns on first access and then updated incrementally
+    by Net when elements are added, replaced or removed. Columns name of buses and elements are included
+    in cache key by hash, so renaming directly in tables (net.net.bus.at[i, 'name'] = ...) is detected too.
+    '''
+    def __init__(self, net):
+        '''
+        :param net: pandapowertools Net
+        '''
+        self._net = net
+        self._names = {}
+        self._indexes = {}
+        self._keys = {}
+        self.version = 0
+
+    def _names_hash(self, elements) -> tuple:
+        return tuple(hash(tuple(self._net.net[element]['name'].to_numpy())) for element in elements)
+
+    def names_key(self) -> tuple:
+        '''
+        Hash of columns name of buses, trafos and trafo3w, changes after renaming in tables
+        '''
+        return self._names_hash(('bus', 'trafo', 'trafo3w'))
+
+    def _table_key(self, element: str):
+        table = self._net.net[element]
+        return id(self._net.net), id(table), len(table), self._names_hash(NAME_SOURCES[element])
+
+    def _build(self, element: str, index=None) -> pd.Series:
+        net = self._net.net
+        table = net[element] if index is None else net[element].loc[index]
+        names_bus = net.bus['name']
+        if element == 'line':
+            return _str(table['from_bus'].map(names_bus)) + ' - ' + _str(table['to_bus'].map(names_bus))
+        if element == 'switch':
+            name2 = pd.Series(None, index=table.index, dtype=object)
+            for et, names in (('t', net.trafo['name']), ('l', self.names('line')), ('b', names_bus)):
+                mask = table['et'] == et
+                name2[mask] = table.loc[mask, 'element'].map(names)
+            return _str(table['bus'].map(names_bus)) + ' - ' + _str(name2)
+        return table['name'].astype(str)
+
+    def names(self, element: str) -> dict:
+        '''
+        :param element: 'line', 'switch', 'trafo' or 'trafo3w'
+        :return: dict {index: name}, must not be changed
+        '''
+        if self._keys.get(element) != self._table_key(element):
+            names = self._build(element)
+            self._names[element] = dict(zip(names.index, names))
+            self._indexes[element] = dict(zip(names, names.index))
+            self._keys[element] = self._table_key(element)
+            self.version += 1
+        return self._names[element]
+
+    def name(self, element: str, index: int) -> str:
+        return self.names(element)[index]
+
+    def index(self, element: str, name: str) -> int:
+        '''
+        Index of element by name. If several elements have the same name then index of the last one
+        '''
+        self.names(element)
+        return self._indexes[element][name]
+
+    def series(self, element: str, index=None) -> pd.Series:
+        '''
+        Names of elements with index (all elements if None) as Series, '' for missing elements
+        '''
+        if index is None:
+            index = self._net.net[element].index
+        names = self.names(element)
+        return pd.Series([names.get(i, '') for i in index], index=index, dtype=object)
+
+    def update(self, element: str, index):
+        '''
+        Updates names of elements with index after they are added, changed or removed and names of switches
+        connected to them
+        :param index: index or list of indexes
+        '''
+        if element not in self._keys:
+            if element in ('line', 'trafo'):
+                self._keys.pop('switch', None)
+            return
+        if self._keys[element][-1] != self._names_hash(NAME_SOURCES[element]):
+            # имена изменены прямо в таблицах: все имена перестраиваются при следующем обращении
+            del self._keys[element]
+            self._keys.pop('switch', None)
+            return
+        index = pd.Index([index] if pd.api.types.is_scalar(index) else index)
+        table = self._net.net[element]
+        names = self._names[element]
+        indexes = self._indexes[element]
+        for i in index:
+            name = names.pop(i, None)
+            if name is not None and indexes.get(name) == i:
+                del indexes[name]
+        new = self._build(element, index[index.isin(table.index)])
+        names.update(zip(new.index, new))
+        indexes.update(zip(new, new.index))
+        if len(names) == len(table):
+            self._keys[element] = self._table_key(element)
+        else:
+            del self._keys[element]
+            self._keys.pop('switch', None)
+        self.version += 1
+        if element in ('line', 'trafo') and 'switch' in self._keys:
+            switch = self._net.net.switch
+            mask = (switch['et'] == element[0]) & switch['element'].isin(index)
+            if mask.any():
+                self.update('switch', switch.index[mask])
+
+    def invalidate(self):
+        self._keys.clear()
@@ -3,18 +3,114 @@ import json
 import tomllib
 import math
 from collections import Counter
+from contextlib import contextmanager
 
 
 import pandapower as pp
 import pandas as pd
+import numpy as np
 
 
-from pandapowertools.functions import russian_to_attribute_name, define_c
+from pandapowertools.functions import russian_to_attribute_name, russian_to_attribute_names, define_c
+from pandapowertools.names import NameIndex
+from pandapowertools.spatial import GridIndex
+from pandapowertools.convergence import run_pf, run_pf_pgm, select_backend, benchmark_pf, BACKENDS
+from pandapowertools.fault_location import fault_location_table
+from pandapowertools.contingency import n_minus_1_pf, n_minus_1_sc
+from pandapowertools.timeseries import run_timeseries, DEFAULT_OUTPUTS
+from pandapowertools.snapshot import to_npz, from_npz, to_parquet, from_parquet
+from pandapowertools.zbus import ZBus, ikss
+
+
+SC_ELEMENTS = ('bus', 'line', 'trafo', 'trafo3w', 'impedance', 'switch', 'ext_grid', 'gen', 'sgen', 'shunt', 'ward',
+               'xward')
+SCHEME_ELEMENTS = ('bus', 'ext_grid', 'gen', 'line', 'trafo', 'trafo3w', 'impedance', 'switch', 'load', 'shunt')
+FORMATS = {'json': (pp.to_json, pp.from_json), 'npz': (to_npz, from_npz), 'parquet': (to_parquet, from_parquet)}
+
+
+def _str(values) -> pd.Series:
+    '''
+    Column (or index) as Series of str
+    '''
+    if isinstance(values, pd.Index):
+        return pd.Series(values.astype(str), index=values, dtype=object)
+    return values.astype(str)
+
+
+def _fmt(spec: str, values: pd.Series) -> pd.Series:
+    '''
+    Formats column of numbers with printf-style spec, e.g. '%.4f'
+    '''
+    return pd.Series(np.char.mod(spec, values.to_numpy(dtype=float)), index=values.index, dtype=object)
+
+
+def _in_service(table: pd.DataFrame) -> pd.Series:
+    return pd.Series(np.where(table['in_service'].astype(bool), '', ' (not in_service)'), index=table.index,
+                     dtype=object)
+
+
+def _broadcast(*args) -> list:
+    '''
+    Arguments of bulk creation as arrays of common length, str and None are scalars
+    '''
+    arrays = [np.array(arg, dtype=object) if isinstance(arg, str) or arg is None else np.atleast_1d(arg)
+              for arg in args]
+    return [array.copy() for array in np.broadcast_arrays(*arrays)]
+
+
+def to_markdown(header: list, columns: list) -> str:
+    '''
+    Markdown table from columns of formatted strings
+    :param header: names of columns
+    :param columns: list of Series of str with equal index
+    '''
+    s = ' | '.join(header) + '\n' + '|'.join(['-'] * len(header)) + '\n'
+    if not len(columns[0]):
+        return s
+    rows = columns[0]
+    for column in columns[1:]:
+        rows = rows + ' | ' + column
+    return s + '\n'.join(rows) + '\n'
 
 
 class Attrs:
     ...
 
+class LazyAttrs:
+    '''
+    Namespace of attributes with indexes of elements. Attributes are built by function build on first access and
+    rebuilt when function key returns new value
+    '''
+    def __init__(self, build, key):
+        self._build = build
+        self._key = key
+        self._attrs = None
+        self._attrs_key = None
+
+    def _get_attrs(self) -> dict:
+        key = self._key()
+        if self._attrs is None or key != self._attrs_key:
+            self._attrs = self._build()
+            self._attrs_key = key
+        return self._attrs
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        try:
+            return self._get_attrs()[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def __dir__(self):
+        return list(self._get_attrs())
+
+    def __repr__(self):
+        return repr(self._get_attrs())
+
+    def invalidate(self):
+        self._attrs = None
+
 class Net:
 
     def __init__(self, name: str, path: str = ''):
@@ -22,12 +118,20 @@ class Net:
         self.path = path
         self.net = pp.create_empty_network(name)
         self.net['modes'] = {}
-        self.b = Attrs()
-        self.l = Attrs()
-        self.t = Attrs()
-        self.t3 = Attrs()
-        self.s = Attrs()
-        self._update_std()
+        self._journal = []
+        self._version = 0
+        self._values_version = 0
+        self._thevenin = {}
+        self.change_log = []
+        self.name_index = NameIndex(self)
+        self.spatial_index = GridIndex(self)
+        self.pf_report = None
+        self.b = LazyAttrs(self._bus_attrs, self._attrs_key)
+        self.l = LazyAttrs(self._line_attrs, self._attrs_key)
+        self.t = LazyAttrs(self._trafo_attrs, self._attrs_key)
+        self.t3 = LazyAttrs(self._trafo3w_attrs, self._attrs_key)
+        self.s = LazyAttrs(self._switch_attrs, self._attrs_key)
+        self.std = LazyAttrs(self._std_attrs, self._attrs_key)
         self.et = Attrs()
         self.et.line = 'l'
         self.et.trafo = 't'
@@ -49,46 +153,124 @@ class Net:
         with open(os.path.join(current_path, 'std_trafos3w.toml'), 'rb') as f:
             data = tomllib.load(f)
         pp.create_std_types(self.net, data, element='trafo3w', overwrite=True, check_required=True)
-        self._update_std()
+        self._changed()
 
+    def _changed(self, element: str | None = None, index=None):
+        '''
+        Marks that elements of net are changed. Attributes b, l, t, t3, s, std will be rebuilt on next access.
+        :param element: if specified then only names of elements with index are updated in name_index,
+        otherwise name_index is rebuilt on next access
+        :param index: index or list of indexes of added, changed or removed elements
+        '''
+        self._version += 1
+        if element is None:
+            self.name_index.invalidate()
+        else:
+            self.name_index.update(element, index)
+
+    def _attrs_key(self):
+        key = [self._version, id(self.net), id(self.net.std_types)]
+        for element in ('bus', 'line', 'trafo', 'trafo3w', 'switch'):
+            key.extend((id(self.net[element]), len(self.net[element])))
+        key.extend(len(value) for value in self.net.std_types.values())
+        key.extend(self.name_index.names_key())
+        return key
+
+    @staticmethod
+    def _attrs(prefix: str, names: pd.Series) -> dict:
+        return dict(zip(prefix + russian_to_attribute_names(names), names.index))
+
+    def _bus_attrs(self):
+        return self._attrs('b', self.net.bus['name'].fillna('').astype(str))
 
-    def _update_std(self):
+    def _line_attrs(self):
+        return self._attrs('l', self.name_index.series('line'))
+
+    def _trafo_attrs(self):
+        return self._attrs('t', self.name_index.series('trafo'))
+
+    def _trafo3w_attrs(self):
+        return self._attrs('t', self.name_index.series('trafo3w'))
+
+    def _switch_attrs(self):
+        return self._attrs('s', self.name_index.series('switch'))
+
+    def _std_attrs(self):
         attrs = {}
         for key, value in self.net.std_types.items():
+            if key == 'trafo3w':
+                prefix = 't3_'
+            else:
+                prefix = key[0] + '_'
             for name_std in value:
-                if key == 'trafo3w':
-                    prefix = 't3_'
-                else:
-                    prefix = key[0] + '_'
                 attrs[f'{prefix}{russian_to_attribute_name(name_std)}'] = name_std
-        self.std = Attrs()
-        self.std.__dict__.update(attrs)
-
-    def _line_to_attr(self, index):
-        return 'l' + russian_to_attribute_name(self.name_line(index))
+        return attrs
 
     def add_line(self, from_bus: int, to_bus: int, length: float, std_type: str, parallel: int = 1):
-        index = pp.create_line(self.net, from_bus, to_bus, length, std_type, parallel=parallel)
-        self.net.line["endtemp_degree"] = 20
-        self.l.__dict__.update({self._line_to_attr(index): index})
+        index = pp.create_line(self.net, from_bus, to_bus, length, std_type, parallel=parallel, endtemp_degree=20)
+        self._changed('line', index)
+        return index
+
+    def _std_params(self, element: str, std_type, n: int) -> pd.DataFrame:
+        '''
+        Parameters of standard types for n elements
+        :param std_type: name of standard type or list of names
+        '''
+        std_types = [std_type] * n if isinstance(std_type, str) else list(std_type)
+        unknown = set(std_types) - set(self.net.std_types[element])
+        if unknown:
+            raise UserWarning(f'Unknown standard {element} types {unknown}')
+        params = pd.DataFrame.from_dict(self.net.std_types[element], orient='index')
+        return params.loc[std_types].reset_index(drop=True)
+
+    def add_lines(self, from_bus, to_bus, length, std_type, parallel=1, name=None):
+        '''
+        Creates lines by one call of pandapower like add_line. Arguments are arrays or scalars common
+        for all elements. DataFrame with columns from_bus, to_bus, length, std_type can be passed as add_lines(**df)
+        :return: indexes of lines
+        '''
+        from_bus, to_bus, std_type, name = _broadcast(from_bus, to_bus, std_type, name)
+        std = self._std_params('line', std_type, len(from_bus))
+        kwargs = {'g_us_per_km': std['g_us_per_km'].fillna(0).values if 'g_us_per_km' in std else 0.}
+        if 'type' in std:
+            kwargs['type'] = std['type'].values
+        if 'r0_ohm_per_km' in std:
+            kwargs.update({param: std[param].values for param in ('r0_ohm_per_km', 'x0_ohm_per_km', 'c0_nf_per_km')})
+        index = pp.create_lines_from_parameters(self.net, from_bus, to_bus, length, std['r_ohm_per_km'].values,
+                                                std['x_ohm_per_km'].values, std['c_nf_per_km'].values,
+                                                std['max_i_ka'].values, name=name, parallel=parallel,
+                                                endtemp_degree=20, **kwargs)
+        self.net.line.loc[index, 'std_type'] = std_type.tolist()
+        self._changed('line', index)
         return index
 
     def line(self, n, in_service = True):
         self.net.line.at[n, 'in_service'] = in_service
+        self._values_version += 1
 
     def line_replace_std_type(self, index: int, std_type: str):
         '''
-        Replace standard type with new type for line with index
+        Replace standard type with new type for line with index. Index of line is kept
         :param index: line index
         :param std_type: standard type for new type
         :return:
         '''
-        from_bus = self.net.line.loc[index, "from_bus"]
-        to_bus = self.net.line.loc[index, "to_bus"]
-        length_km = self.net.line.loc[index, "length_km"]
-        parallel = self.net.line.loc[index, "parallel"]
-        self.net.line.drop(index, inplace=True)
-        self.add_line(from_bus=from_bus, to_bus=to_bus, length=length_km, std_type=std_type, parallel=parallel)
+        state = self._state_key()
+        std = self._std_params('line', std_type, 1).iloc[0]
+        params = ['r_ohm_per_km', 'x_ohm_per_km', 'c_nf_per_km', 'max_i_ka']
+        params += [param for param in ('r0_ohm_per_km', 'x0_ohm_per_km', 'c0_nf_per_km', 'type') if param in std]
+        for param in params:
+            self.net.line.at[index, param] = std[param]
+        if 'g_us_per_km' in std:
+            self.net.line.at[index, 'g_us_per_km'] = 0. if pd.isna(std['g_us_per_km']) else std['g_us_per_km']
+        self.net.line.at[index, 'std_type'] = std_type
+        self._changed('line', index)
+
+        def patch(zbus):
+            if not zbus.has_line(index):
+                return False
+            zbus.update_line(index, zbus.line_rows(self.net, index))
+        self._log_change('line_replace_std_type', state, patch, line=index, std_type=std_type)
 
     def line_impedance(self, index: int):
         l = self.net.line.at[index, 'length_km']
@@ -97,7 +279,71 @@ class Net:
         x = self.net.line.at[index, 'x_ohm_per_km'] * l / p
         return r, x
 
+    def _bus_connections(self, bus: int) -> int:
+        '''
+        Number of elements and switches connected to bus
+        '''
+        count = 0
+        for element in SC_ELEMENTS + ('load',):
+            table = self.net[element]
+            for column in ('bus', 'from_bus', 'to_bus', 'hv_bus', 'mv_bus', 'lv_bus'):
+                if element != 'bus' and column in table:
+                    count += int((table[column] == bus).sum())
+        switch = self.net.switch
+        return count + int(((switch['bus'] == bus) | (switch['et'] == 'b') & (switch['element'] == bus)).sum())
+
+    def split_line(self, index: int, distance_km: float, name: str | None = None):
+        '''
+        Разделение линии новой шиной на расстоянии distance_km от from_bus. Линия index становится участком
+        до новой шины, новая линия с теми же параметрами - участком от новой шины до to_bus, выключатели
+        линии у to_bus переносятся на новую линию. Координаты шины интерполируются по координатам концов линии
+        :param name: имя новой линии, по умолчанию имя линии index с индексом новой линии
+        :return: индексы новой шины и новой линии
+        '''
+        line = self.net.line.loc[index]
+        length = line['length_km']
+        if not 0 < distance_km < length:
+            raise ValueError(f'distance_km must be between 0 and {length}')
+        state = self._state_key()
+        from_bus, to_bus = line['from_bus'], line['to_bus']
+        bus = pp.create_bus(self.net, self.net.bus.at[from_bus, 'vn_kv'])
+        geodata = self.net.bus_geodata
+        if {'x', 'y'} <= set(geodata.columns) and {from_bus, to_bus} <= set(geodata.index):
+            k = distance_km / length
+            xy = geodata.loc[[from_bus, to_bus], ['x', 'y']].to_numpy(dtype=float)
+            geodata.loc[bus, ['x', 'y']] = xy[0] + (xy[1] - xy[0]) * k
+            self.spatial_index.update(bus)
+        new = self.net.line.index.max() + 1
+        row = self.net.line.loc[[index]].set_axis([new])
+        row['from_bus'] = bus
+        row['length_km'] = length - distance_km
+        if name is None and pd.notna(line['name']):
+            name = f'{line["name"]}_{new}'
+        row['name'] = name
+        self.net.line = pd.concat([self.net.line, row])
+        self.net.line.at[index, 'to_bus'] = bus
+        self.net.line.at[index, 'length_km'] = distance_km
+        switch = self.net.switch
+        switch.loc[(switch['et'] == 'l') & (switch['element'] == index) & (switch['bus'] == to_bus), 'element'] = new
+        self._changed('bus', bus)
+        self._changed('line', [index, new])
+
+        def patch(zbus):
+            if not zbus.has_line(index):
+                return False
+            zbus.split_line(index, distance_km / length, bus, new)
+        self._log_change('split_line', state, patch, line=index, distance_km=distance_km, bus=bus, new_line=new)
+        return bus, new
+
     def merge_serial_lines(self, index1, index2):
+        '''
+        Объединение последовательных линий в линию index1 с суммарными сопротивлениями прямой и нулевой
+        последовательностей (length_km=1, ёмкость не учитывается). Линия index2 удаляется, её выключатели переносятся
+        на линию index1, включённые выключатели линий у общей шины удаляются (записываются в change_log как
+        removed_switches). Общая шина остаётся
+        :raises ValueError: у общей шины есть отключённый выключатель линий
+        :return: index1
+        '''
         line1 = self.net.line.loc[index1]
         line2 = self.net.line.loc[index2]
         buses = [line1['from_bus'], line1['to_bus'], line2['from_bus'], line2['to_bus']]
@@ -105,45 +351,112 @@ class Net:
         buses_alone = [bus for bus, count in count_buses.items() if count == 1]
         if len(buses_alone) != 2:
             raise ValueError('Lines must have common bus')
+        common = next(bus for bus, count in count_buses.items() if count == 2)
+        switch = self.net.switch
+        at_common = switch.index[(switch['et'] == 'l') & switch['element'].isin([index1, index2]) &
+                                 (switch['bus'] == common)]
+        opened = at_common[~switch.loc[at_common, 'closed'].astype(bool)]
+        if len(opened):
+            raise ValueError(f'Open switches {list(opened)} at common bus {common}')
+        state = self._state_key()
+        alone = self._bus_connections(common) == 2
         r1, x1 = self.line_impedance(index1)
         r2, x2 = self.line_impedance(index2)
-        pp.create_line_from_parameters(net=self.net, from_bus=buses_alone[0], to_bus=buses_alone[1], length_km=1,
-                                       r_ohm_per_km=r1 + r2, x_ohm_per_km=x1 + x2, c_nf_per_km=0, max_i_ka=100)
-        self.net.line.drop(index=index1, inplace=True)
+        params = {'from_bus': buses_alone[0], 'to_bus': buses_alone[1], 'length_km': 1., 'r_ohm_per_km': r1 + r2,
+                  'x_ohm_per_km': x1 + x2, 'c_nf_per_km': 0., 'g_us_per_km': 0., 'max_i_ka': 100., 'parallel': 1,
+                  'std_type': None}
+        if 'r0_ohm_per_km' in self.net.line:
+            for param in ('r0_ohm_per_km', 'x0_ohm_per_km'):
+                params[param] = sum(line[param] * line['length_km'] / line['parallel'] for line in (line1, line2))
+            params['c0_nf_per_km'] = 0.
+        for param, value in params.items():
+            self.net.line.at[index1, param] = value
         self.net.line.drop(index=index2, inplace=True)
-
-    def _switch_to_attr(self, index):
-        return 's' + russian_to_attribute_name(self.name_switch(index))
+        self.net.switch.drop(at_common, inplace=True)
+        switch = self.net.switch
+        switch.loc[(switch['et'] == 'l') & (switch['element'] == index2), 'element'] = index1
+        self._changed('switch')
+        self._changed('line', [index1, index2])
+
+        def patch(zbus):
+            if not (alone and zbus.has_line(index1) and zbus.has_line(index2)):
+                return False
+            zbus.merge_lines(index1, index2, common, zbus.line_rows(self.net, index1))
+        self._log_change('merge_serial_lines', state, patch, line=index1, removed_line=index2, bus=common,
+                         removed_switches=list(at_common))
+        return index1
 
     def add_switch(self, bus, element, et, closed=True):
         index = pp.create_switch(self.net, bus, element, et, closed)
-        self.s.__dict__.update({self._switch_to_attr(index): index})
+        self._changed('switch', index)
+        return index
+
+    def add_switches(self, bus, element, et, closed=True):
+        '''
+        Creates switches by one call of pandapower like add_switch. Arguments are arrays or scalars common
+        for all elements. DataFrame with columns bus, element, et can be passed as add_switches(**df)
+        :return: indexes of switches
+        '''
+        index = pp.create_switches(self.net, bus, element, et, closed)
+        self._changed('switch', index)
         return index
 
     def switch(self, n, closed=True):
         self.net.switch.at[n, 'closed'] = closed
+        self._values_version += 1
 
     def add_bus(self, un: float, name: str = ''):
         index = pp.create_bus(self.net, un, name)
-        self.b.__dict__.update({'b' + russian_to_attribute_name(name): index})
+        self._changed('bus', index)
         return index
 
-    def _trafo_to_attr(self, index):
-        name = f'{self.net.trafo.at[index, "name"]}'
-        return 't' + russian_to_attribute_name(name)
+    def add_buses(self, un, name=''):
+        '''
+        Creates buses by one call of pandapower like add_bus. Arguments are arrays or scalars common
+        for all elements. DataFrame with columns un, name can be passed as add_buses(**df)
+        :return: indexes of buses
+        '''
+        un, name = _broadcast(un, name)
+        index = pp.create_buses(self.net, len(un), un, name=name)
+        self._changed('bus', index)
+        return index
 
     def add_trafo(self, hv_bus, lv_bus, std_type, name):
         index = pp.create_transformer(self.net, hv_bus, lv_bus, std_type, name)
-        self.t.__dict__.update({self._trafo_to_attr(index): index})
+        self._changed('trafo', index)
         return index
 
-    def _trafo3w_to_attr(self, index):
-        name = f'{self.net.trafo3w.at[index, "name"]}'
-        return 't' + russian_to_attribute_name(name)
+    def add_trafos(self, hv_bus, lv_bus, std_type, name):
+        '''
+        Creates trafos by one call of pandapower like add_trafo. Arguments are arrays or scalars common
+        for all elements. DataFrame with columns hv_bus, lv_bus, std_type, name can be passed as add_trafos(**df)
+        :return: indexes of trafos
+        '''
+        hv_bus, lv_bus, std_type, name = _broadcast(hv_bus, lv_bus, std_type, name)
+        std = self._std_params('trafo', std_type, len(hv_bus))
+        kwargs = {}
+        for param in ('tap_neutral', 'tap_max', 'tap_min', 'tap_side', 'tap_step_percent', 'tap_step_degree',
+                      'vk0_percent', 'vkr0_percent', 'mag0_percent', 'mag0_rx', 'si0_hv_partial'):
+            if param in std:
+                kwargs[param] = std[param].values
+        if 'tap_neutral' in std:
+            kwargs['tap_pos'] = std['tap_neutral'].values
+        shift_degree = std['shift_degree'].fillna(0).values if 'shift_degree' in std else 0
+        tap_phase_shifter = std['tap_phase_shifter'].fillna(False).astype(bool).values \
+            if 'tap_phase_shifter' in std else False
+        index = pp.create_transformers_from_parameters(self.net, hv_bus, lv_bus, std['sn_mva'].values,
+                                                       std['vn_hv_kv'].values, std['vn_lv_kv'].values,
+                                                       std['vkr_percent'].values, std['vk_percent'].values,
+                                                       std['pfe_kw'].values, std['i0_percent'].values,
+                                                       shift_degree=shift_degree, tap_phase_shifter=tap_phase_shifter,
+                                                       name=name, **kwargs)
+        self.net.trafo.loc[index, 'std_type'] = std_type.tolist()
+        self._changed('trafo', index)
+        return index
 
     def add_trafo3w(self, hv_bus, mv_bus, lv_bus, std_type, name):
         index = pp.create_transformer3w(self.net, hv_bus, mv_bus, lv_bus, std_type, name)
-        self.t3.__dict__.update({self._trafo3w_to_attr(index): index})
+        self._changed('trafo3w', index)
         return index
 
     def add_impedance(self, from_bus: int, to_bus: int, x: float, r: float = .0):
@@ -209,6 +522,7 @@ class Net:
 
     def ext_grid(self, n, in_service = True):
         self.net.ext_grid.at[n, 'in_service'] = in_service
+        self._values_version += 1
 
     def change_ext_grid(self, num, ikz_max: float, ikz_min: float | None = None, i1kz_max: float | None = None):
         bus = self.net.ext_grid.loc[num, 'bus']
@@ -218,6 +532,7 @@ class Net:
         self.net.ext_grid.loc[num, 's_sc_min_mva'] = item['s_sc_min_mva']
         if item.get('x0x_max'):
             self.net.ext_grid.loc[num, 'x0x_max'] = item['x0x_max']
+        self._values_version += 1
 
     def add_load(self, bus, s_mva: float | None = None, p_mw: float | None = None, cosf: float = 1):
         if s_mva is None and p_mw is not None:
@@ -249,7 +564,7 @@ class Net:
         v = self.net.bus.at[from_bus, 'vn_kv']
         x = vk_percent * v ** 2 / s_mva / 100
         return pp.create_line_from_parameters(net=self.net, from_bus=from_bus, to_bus=to_bus, length_km=1, r_ohm_per_km=0,
-                                              x_ohm_per_km=x, c_nf_per_km=0, max_i_ka=100, name=name)
+                                              x_ohm_per_km=x, c_nf_per_km=0, max_i_ka=100, name=name, endtemp_degree=20)
 
     def add_c(self, bus, c=1, nf=1):
         '''
@@ -273,167 +588,160 @@ class Net:
         '''
         x = 100 * math.pi * nf * l
         pp.create_line_from_parameters(net=self.net, from_bus=from_bus, to_bus=to_bus, length_km=1, r_ohm_per_km=0,
-                                       x_ohm_per_km=x, c_nf_per_km=0, max_i_ka=100)
+                                       x_ohm_per_km=x, c_nf_per_km=0, max_i_ka=100, endtemp_degree=20)
 
-    def save(self, name = ''):
+    def _file_path(self, name: str, format: str):
+        if format not in FORMATS:
+            raise ValueError(f'format must be one of {tuple(FORMATS)}')
+        file = f'{name}.{format}'
+        if self.path:
+            return os.path.join(self.path, file)
+        return file
+
+    def save(self, name = '', format: str = 'json'):
+        '''
+        Save net to file name.json (pp.to_json), name.npz (numpy arrays) or name.parquet (directory of parquet files)
+        :param name: name of file, if not specified then name of net
+        :param format: 'json', 'npz' or 'parquet'
+        '''
         if not name:
             name = self.name
-        file = f'{name}.json'
-        if self.path:
-            path = os.path.join(self.path, file)
-        else:
-            path = file
-        pp.to_json(self.net, path)
+        path = self._file_path(name, format)
+        save, _ = FORMATS[format]
+        save(self.net, path)
 
-    def load(self):
-        file = f'{self.name}.json'
-        if self.path:
-            path = os.path.join(self.path, file)
-        else:
-            path = file
-        self.net = pp.from_json(path)
-        attrs = {}
-        for i, b in self.net.bus.iterrows():
-            attrs['b' + russian_to_attribute_name(b['name'])] = i
-        self.b.__dict__.update(attrs)
-        attrs = {}
-        for i in self.net.line.index.to_list():
-            attrs[self._line_to_attr(i)] = i
-        self.l.__dict__.update(attrs)
-        attrs = {}
-        for i in self.net.trafo.index.to_list():
-            attrs[self._trafo_to_attr(i)] = i
-        self.t.__dict__.update(attrs)
-        attrs = {}
-        for i in self.net.trafo3w.index.to_list():
-            attrs[self._trafo3w_to_attr(i)] = i
-        self.t3.__dict__.update(attrs)
-        attrs = {}
-        for i in self.net.switch.index.to_list():
-            attrs[self._switch_to_attr(i)] = i
-        self.s.__dict__.update(attrs)
-        attrs = {}
-        for key, value in self.net.std_types.items():
-            for name_std in value:
-                if key == 'trafo3w':
-                    prefix = 't3_'
-                else:
-                    prefix = key[0] + '_'
-                attrs[f'{prefix}{russian_to_attribute_name(name_std)}'] = name_std
-        self.std.__dict__.update(attrs)
+    def load(self, format: str = 'json'):
+        '''
+        Load net from file saved by save
+        :param format: 'json', 'npz' or 'parquet'
+        '''
+        path = self._file_path(self.name, format)
+        _, load = FORMATS[format]
+        self.net = load(path)
+        self._changed()
         print('Net loaded.')
 
-    def scheme(self, find: str = ''):
-        print(self.get_scheme(find))
+    def scheme(self, find: str = '', file=None):
+        '''
+        Prints scheme of net section by section
+        :param find: print only rows containing find
+        :param file: file-like object, if None than sys.stdout
+        '''
+        for section in self.iter_scheme(find):
+            print(section, file=file)
 
     def get_scheme(self, find: str = ''):
-        res = [f'name={self.net.name}']
-        res.append('bus')
-        for i, row in self.net.bus.sort_index().iterrows():
-            name_bus = row['name'].ljust(20)
-            istr = str(i).rjust(4)
-            try:
-                x = self.net.bus_geodata.loc[i, 'x']
-                y = self.net.bus_geodata.loc[i, 'y']
-            except:
-                x = 'No'
-                y = 'No'
-            in_service = '' if row['in_service'] else ' (not in_service)'
-            res.append(f'{istr}) {name_bus} {str(row["vn_kv"]).ljust(7)} x={x} y={y}{in_service}')
         if find == 'bus':
-            print('\n'.join(res))
+            print('\n'.join(self.iter_scheme(elements=('bus',))))
             return
-        res.append('ext_grid')
-        for i, row in self.net.ext_grid.sort_index().iterrows():
-            name_bus = self.net.bus.loc[row['bus'], 'name'].ljust(28)
-            in_service = '' if row['in_service'] else ' (not in_service)'
-            name = row['name']
-            if name:
-                name = name.ljust(25)
-            else:
-                name = ' ' * 25
-            res.append(f'{i}) {name_bus} {name} s_sc_max_mva={row["s_sc_max_mva"]} s_sc_min_mva={row["s_sc_min_mva"]}'
-                       f'{in_service}')
-        res.append('gen')
-        for i, row in self.net.gen.sort_index().iterrows():
-            name_bus = self.net.bus.loc[row['bus'], 'name'].ljust(28)
-            in_service = '' if row['in_service'] else ' (not in_service)'
-            res.append(f'{i}) {row['name']} {name_bus} sn_mva={row["sn_mva"]} xdss_pu={row["xdss_pu"]} '
-                       f'rdss_ohm={row["rdss_ohm"]} cos_phi={row["cos_phi"]} vn_kv={row["vn_kv"]}{in_service}')
-        res.append('line')
-        for i, row in self.net.line.sort_index().iterrows():
-            name_from = self.net.bus.loc[row['from_bus'], 'name'].ljust(18)
-            name_to = self.net.bus.loc[row['to_bus'], 'name'].rjust(18)
-            l = row['length_km']
-            r = row['r_ohm_per_km'] * l
-            x = row['x_ohm_per_km'] * l
-            z = math.sqrt(r**2 + x**2)
-            if 'r0_ohm_per_km' in row:
-                r0 = row['r0_ohm_per_km'] * l
-                x0 = row['x0_ohm_per_km'] * l
-                z0 = math.sqrt(r0**2 + x0**2)
-            std_type = row['std_type']
-            if std_type:
-                std_type = std_type.ljust(18)
-            else:
-                std_type = ' ' * 18
-            istr = str(i).rjust(3)
-            l = str(l).rjust(7)
-            in_service = '' if row['in_service'] else ' (not in_service)'
-            s = f'{istr}) {name_from} {name_to} {row["parallel"]:.0f}*{std_type} {l} z={r:.4f}+j{x:.4f}={z:.4f}'
-            if 'r0_ohm_per_km' in row:
-                s += f' z0={r0:.4f}+j{x0:.4f}={z0:.4f}'
-            res.append(s + f' {in_service}')
-        res.append('trafo')
-        for i, row in self.net.trafo.sort_index().iterrows():
-            name_hv = self.net.bus.loc[row['hv_bus'], 'name'].ljust(28)
-            name_lv = self.net.bus.loc[row['lv_bus'], 'name'].rjust(28)
-            in_service = '' if row['in_service'] else ' (not in_service)'
-            res.append(f'{i}) {name_hv} {name_lv} {row["name"]} {row["std_type"]}{in_service}')
-        res.append('trafo3w')
-        for i, row in self.net.trafo3w.sort_index().iterrows():
-            name_hv = self.net.bus.loc[row['hv_bus'], 'name'].ljust(28)
-            name_mv = self.net.bus.loc[row['mv_bus'], 'name'].ljust(28)
-            name_lv = self.net.bus.loc[row['lv_bus'], 'name'].rjust(28)
-            in_service = '' if row['in_service'] else ' (not in_service)'
-            res.append(f'{i}) {name_hv} {name_mv} {name_lv} {row["name"]} {row["std_type"]} {row["vector_group"]} {in_service}')
-        res.append('impedance')
-        for i, row in self.net.impedance.sort_index().iterrows():
-            name_from = self.net.bus.loc[row['from_bus'], 'name'].ljust(28)
-            name_to = self.net.bus.loc[row['to_bus'], 'name'].rjust(28)
-            u2 = self.net.bus.loc[row['from_bus'], 'vn_kv'] ** 2
-            zb = u2 / row['sn_mva']
-            rpu = row['rtf_pu']
-            xpu = row['xtf_pu']
-            in_service = '' if row['in_service'] else ' (not in_service)'
-            res.append(f'{i}) {name_from} {name_to} rft_pu={rpu} xft_pu={xpu} r={rpu*zb} x={xpu*zb}{in_service}')
-        res.append('switch')
-        names = self.names_switch
-        for i, row in self.net.switch.iterrows():
-            res.append(f'{i}) {names[i]} {"closed" if row["closed"] else "opened"}')
-        res.append('load')
-        for i, row in self.net.load.sort_index().iterrows():
-            name_bus = self.net.bus.loc[row['bus'], 'name'].ljust(28)
-            in_service = '' if row['in_service'] else ' (not in_service)'
-            res.append(f'{i}) {name_bus} p_mw={row["p_mw"]:.5f} q_mvar={row["q_mvar"]:.5f}'
-                       f'{in_service}')
-        res.append('shunt')
-        for i, row in self.net.shunt.sort_index().iterrows():
-            name_bus = self.net.bus.loc[row['bus'], 'name'].ljust(28)
-            name = row['name']
-            if name:
-                name = name.ljust(25)
+        return '\n'.join(self.iter_scheme(find))
+
+    def iter_scheme(self, find: str = '', elements: tuple | list | None = None):
+        '''
+        Yields scheme of net lazily: name of net and then one section (name of element and rows) at once.
+        Every section is formatted by columns
+        :param find: yield only rows containing find, sections without such rows are skipped
+        :param elements: names of sections, if None than all sections
+        '''
+        header = f'name={self.net.name}'
+        if find in header:
+            yield header
+        for element in elements or SCHEME_ELEMENTS:
+            if self.net[element].empty:
+                rows = pd.Series(dtype=object)
             else:
-                name = ' ' * 25
-            in_service = '' if row['in_service'] else ' (not in_service)'
-            v = self.net.bus.at[row['bus'], 'vn_kv']
-            r = v ** 2 / row['p_mw']
-            x = v ** 2 / row['q_mvar']
-            res.append(f'{i}) name={name} bus={name_bus} p_mw={row["p_mw"]:.5f} q_mvar={row["q_mvar"]:.5f}'
-                       f' {r=} {x=} {in_service}')
-        if find:
-            res = [row for row in res if find in row]
-        return '\n'.join(res)
+                rows = getattr(self, f'_scheme_{element}')()
+            if find:
+                rows = rows[rows.str.contains(find, regex=False)]
+            rows = rows.to_list()
+            if find in element:
+                rows.insert(0, element)
+            if rows:
+                yield '\n'.join(rows)
+
+    def _scheme_bus(self):
+        bus = self.net.bus.sort_index()
+        geodata = self.net.bus_geodata
+        has_xy = bus.index.isin(geodata.index) if {'x', 'y'} <= set(geodata.columns) else np.zeros(len(bus), bool)
+        x = geodata['x'].reindex(bus.index).astype(str).where(has_xy, 'No') if has_xy.any() else 'No'
+        y = geodata['y'].reindex(bus.index).astype(str).where(has_xy, 'No') if has_xy.any() else 'No'
+        return (_str(bus.index).str.rjust(4) + ') ' + _str(bus['name']).str.ljust(20) + ' ' +
+                _str(bus['vn_kv']).str.ljust(7) + ' x=' + x + ' y=' + y + _in_service(bus))
+
+    def _bus_names(self, bus: pd.Series) -> pd.Series:
+        return _str(bus.map(self.net.bus['name']))
+
+    def _scheme_ext_grid(self):
+        ext_grid = self.net.ext_grid.sort_index()
+        return (_str(ext_grid.index) + ') ' + self._bus_names(ext_grid['bus']).str.ljust(28) + ' ' +
+                _str(ext_grid['name'].fillna('')).str.ljust(25) +
+                ' s_sc_max_mva=' + _str(ext_grid['s_sc_max_mva']) + ' s_sc_min_mva=' + _str(ext_grid['s_sc_min_mva']) +
+                _in_service(ext_grid))
+
+    def _scheme_gen(self):
+        gen = self.net.gen.sort_index()
+        return (_str(gen.index) + ') ' + _str(gen['name']) + ' ' + self._bus_names(gen['bus']).str.ljust(28) +
+                ' sn_mva=' + _str(gen['sn_mva']) + ' xdss_pu=' + _str(gen['xdss_pu']) +
+                ' rdss_ohm=' + _str(gen['rdss_ohm']) + ' cos_phi=' + _str(gen['cos_phi']) +
+                ' vn_kv=' + _str(gen['vn_kv']) + _in_service(gen))
+
+    def _scheme_line(self):
+        line = self.net.line.sort_index()
+        length = line['length_km']
+        r = line['r_ohm_per_km'] * length
+        x = line['x_ohm_per_km'] * length
+        rows = (_str(line.index).str.rjust(3) + ') ' + self._bus_names(line['from_bus']).str.ljust(18) + ' ' +
+                self._bus_names(line['to_bus']).str.rjust(18) + ' ' + _fmt('%.0f', line['parallel']) + '*' +
+                _str(line['std_type'].fillna('')).str.ljust(18) + ' ' + _str(length).str.rjust(7) +
+                ' z=' + _fmt('%.4f', r) + '+j' + _fmt('%.4f', x) + '=' + _fmt('%.4f', np.hypot(r, x)))
+        if 'r0_ohm_per_km' in line:
+            r0 = line['r0_ohm_per_km'] * length
+            x0 = line['x0_ohm_per_km'] * length
+            rows += ' z0=' + _fmt('%.4f', r0) + '+j' + _fmt('%.4f', x0) + '=' + _fmt('%.4f', np.hypot(r0, x0))
+        return rows + ' ' + _in_service(line)
+
+    def _scheme_trafo(self):
+        trafo = self.net.trafo.sort_index()
+        return (_str(trafo.index) + ') ' + self._bus_names(trafo['hv_bus']).str.ljust(28) + ' ' +
+                self._bus_names(trafo['lv_bus']).str.rjust(28) + ' ' + _str(trafo['name']) + ' ' +
+                _str(trafo['std_type']) + _in_service(trafo))
+
+    def _scheme_trafo3w(self):
+        trafo3w = self.net.trafo3w.sort_index()
+        return (_str(trafo3w.index) + ') ' + self._bus_names(trafo3w['hv_bus']).str.ljust(28) + ' ' +
+                self._bus_names(trafo3w['mv_bus']).str.ljust(28) + ' ' +
+                self._bus_names(trafo3w['lv_bus']).str.rjust(28) + ' ' + _str(trafo3w['name']) + ' ' +
+                _str(trafo3w['std_type']) + ' ' + _str(trafo3w['vector_group']) + ' ' + _in_service(trafo3w))
+
+    def _scheme_impedance(self):
+        impedance = self.net.impedance.sort_index()
+        zb = impedance['from_bus'].map(self.net.bus['vn_kv']) ** 2 / impedance['sn_mva']
+        rpu = impedance['rtf_pu']
+        xpu = impedance['xtf_pu']
+        return (_str(impedance.index) + ') ' + self._bus_names(impedance['from_bus']).str.ljust(28) + ' ' +
+                self._bus_names(impedance['to_bus']).str.rjust(28) + ' rft_pu=' + _str(rpu) + ' xft_pu=' + _str(xpu) +
+                ' r=' + _str(rpu * zb) + ' x=' + _str(xpu * zb) + _in_service(impedance))
+
+    def _scheme_switch(self):
+        switch = self.net.switch
+        return (_str(switch.index) + ') ' + self.name_index.series('switch') + ' ' +
+                pd.Series(np.where(switch['closed'].astype(bool), 'closed', 'opened'), index=switch.index))
+
+    def _scheme_load(self):
+        load = self.net.load.sort_index()
+        return (_str(load.index) + ') ' + self._bus_names(load['bus']).str.ljust(28) + ' p_mw=' +
+                _fmt('%.5f', load['p_mw']) + ' q_mvar=' + _fmt('%.5f', load['q_mvar']) + _in_service(load))
+
+    def _scheme_shunt(self):
+        shunt = self.net.shunt.sort_index()
+        u2 = shunt['bus'].map(self.net.bus['vn_kv']) ** 2
+        with np.errstate(divide='ignore'):
+            r = u2 / shunt['p_mw']
+            x = u2 / shunt['q_mvar']
+        return (_str(shunt.index) + ') name=' + _str(shunt['name'].fillna('')).str.ljust(25) + ' bus=' +
+                self._bus_names(shunt['bus']).str.ljust(28) + ' p_mw=' + _fmt('%.5f', shunt['p_mw']) +
+                ' q_mvar=' + _fmt('%.5f', shunt['q_mvar']) + ' r=' + _str(r) + ' x=' + _str(x) + ' ' +
+                _in_service(shunt))
 
 # modes
     def create_mode(self, name):
@@ -445,47 +753,90 @@ class Net:
     def make_mode(self, mode_name):
         if mode_name in self.net['modes']:
             for element, param, index, value in self.net['modes'][mode_name]:
-                if index is None:
-                    self.net[element][param] = value
-                else:
-                    self.net[element].loc[index, param] = value
+                self._set(element, param, index, value)
         else:
             print('Mode not specified')
+
+    @contextmanager
+    def mode(self, mode_name: str = ''):
+        '''
+        Применяет режим на время выполнения блока with и восстанавливает изменённые значения при выходе из блока,
+        в том числе при исключении. Все изменения через _set внутри блока (и make_mode) тоже восстанавливаются.
+        Режимы могут быть вложенными.
+        :param mode_name: имя режима из net['modes'], '' - без изменений (только восстановление значений)
+        '''
+        self._journal.append([])
+        try:
+            if mode_name:
+                for element, param, index, value in self.net['modes'][mode_name]:
+                    self._set(element, param, index, value)
+            yield self
+        finally:
+            self._restore_values(self._journal.pop())
+
+    def _set(self, element: str, param: str, index, value):
+        '''
+        Sets value of param for element with index (all elements if index is None). If mode is active then stores
+        previous value in journal of mode
+        '''
+        if self._journal:
+            if index is None:
+                old = self.net[element][param].copy()
+            else:
+                old = self.net[element].loc[index, param]
+                if isinstance(old, pd.Series):
+                    old = old.copy()
+            self._journal[-1].append((element, param, index, old))
+        self._values_version += 1
+        if index is None:
+            self.net[element][param] = value
+        else:
+            self.net[element].loc[index, param] = value
+
+    def _restore_values(self, journal: list):
+        self._values_version += 1
+        for element, param, index, value in reversed(journal):
+            if index is None:
+                self.net[element][param] = value
+            else:
+                self.net[element].loc[index, param] = value
 # calc
     def calc_pf_pgm(self, algorithm='nr', mode_name='', max_iteration=20, verbal=False):
-        tolerance = 1e-8
-        if mode_name:
-            self.make_mode(mode_name)
-        for i in range(15):
-            try:
-                pp.runpp_pgm(self.net, error_tolerance_vm_pu=tolerance, algorithm=algorithm,
-                         max_iterations=max_iteration)
-                if verbal:
-                    print(f'PowerFlow calculated witn tolerance {tolerance}')
-                break
-            except pp.powerflow.LoadflowNotConverged:
-                tolerance *= 10
-        else:
-            if verbal:
-                print(f'PowerFlow not calculated with tolerance {tolerance}')
-
-    def calc_pf(self, algorithm='nr', mode_name='', max_iteration='auto', verbal=False, init='auto'):
-        tolerance = 1e-8
-        if mode_name:
-            self.make_mode(mode_name)
-        for i in range(15):
-            try:
-                pp.runpp(self.net, tolerance_mva=tolerance, algorithm=algorithm,
-                         calculate_voltage_angles=False, max_iteration=max_iteration, init=init,
-                         check_connectivity=True, distributed_slack=False)
-                if verbal:
-                    print(f'PowerFlow calculated witn tolerance {tolerance}')
-                break
-            except pp.powerflow.LoadflowNotConverged:
-                tolerance *= 10
-        else:
-            if verbal:
-                print(f'PowerFlow not calculated with tolerance {tolerance}')
+        '''
+        Расчёт потокораспределения power-grid-model, стратегии при отсутствии сходимости см. run_pf_pgm
+        :return: PFReport, также сохраняется в self.pf_report
+        '''
+        with self.mode(mode_name):
+            self.pf_report = run_pf_pgm(self, algorithm, max_iteration)
+        if verbal:
+            print(self.pf_report)
+        return self.pf_report
+
+    def calc_pf(self, algorithm='nr', mode_name='', max_iteration='auto', verbal=False, init='auto',
+                backend='pandapower'):
+        '''
+        Расчёт потокораспределения, стратегии при отсутствии сходимости см. run_pf и run_pf_pgm. Результаты всех
+        backend записываются в таблицы res_* pandapower
+        :param backend: 'pandapower', 'pgm', 'lightsim2grid' или 'auto' (см. select_backend), выбирается для сети
+        в режиме mode_name
+        :return: PFReport, также сохраняется в self.pf_report
+        '''
+        with self.mode(mode_name):
+            backend = select_backend(self, backend)
+            if backend == 'pgm':
+                self.pf_report = run_pf_pgm(self, algorithm, 20 if max_iteration == 'auto' else max_iteration)
+            else:
+                self.pf_report = run_pf(self, algorithm, max_iteration, init, backend=backend)
+        if verbal:
+            print(self.pf_report)
+        return self.pf_report
+
+    def benchmark_pf(self, mode_name='', backends=BACKENDS, repeat: int = 3) -> pd.DataFrame:
+        '''
+        Сравнение времени расчёта и результатов потокораспределения разными backend, см. convergence.benchmark_pf
+        '''
+        with self.mode(mode_name):
+            return benchmark_pf(self, backends, repeat)
 
     # def res_line(self):
     #     names = self.names_line
@@ -508,21 +859,14 @@ class Net:
         :param bus: номер шины на которой однофазное замыкание на землю
         :return:
         '''
-        trafo = self.net.trafo.copy()
-        self.net.trafo.drop(self.net.trafo.index, inplace=True)
-        ext_grids = self.net.ext_grid.copy()
-        self.net.ext_grid.drop(self.net.ext_grid.index, inplace=True)
-        shunt = self.net.shunt.copy()
-        self.net.shunt.drop(self.net.shunt.index, inplace=True)
-        gen = self.net.gen.copy()
-        self.net.gen.drop(self.net.gen.index, inplace=True)
-        ext_grid = self.add_ext_grid(bus=bus, vm_pu=3)
-        self.calc_pf()
-        self.net.ext_grid.drop(ext_grid, inplace=True)
-        self.net.trafo = trafo
-        self.net.ext_grid = ext_grids
-        self.net.shunt = shunt
-        self.net.gen = gen
+        with self.mode():
+            for element in ('trafo', 'ext_grid', 'shunt', 'gen'):
+                self._set(element, 'in_service', None, False)
+            ext_grid = self.add_ext_grid(bus=bus, vm_pu=3)
+            try:
+                self.calc_pf()
+            finally:
+                self.net.ext_grid.drop(ext_grid, inplace=True)
 
 
     def create_mode_magnetizing_current_inrush(self, k: float=4):
@@ -532,104 +876,328 @@ class Net:
             index_magnetizing_current_inrush.append(pp.create_load(self.net, tr.hv_bus, p_mw=tr.sn_mva * k))
         for i, tr in self.net.trafo3w.iterrows():
             index_magnetizing_current_inrush.append(pp.create_load(self.net, tr.hv_bus, p_mw=tr.sn_hv_mva * k))
+        self._values_version += 1
         return index_magnetizing_current_inrush
 
     def delete_mode_magnetizing_current_inrush(self, index_magnetizing_current_inrush: list):
         pp.toolbox.drop_elements(self.net, element_type='load', element_index=index_magnetizing_current_inrush)
+        self._values_version += 1
         for i, l in self.net.load.iterrows():
             l.in_service = True
 
     def calc_sc_mode(self, mode_name: str, fault: str='3ph', case: str='max'):
-        self.make_mode(mode_name)
-        pp.shortcircuit.calc_sc(self.net, fault=fault, case=case, branch_results=True, return_all_currents=True)
+        with self.mode(mode_name):
+            pp.shortcircuit.calc_sc(self.net, fault=fault, case=case, branch_results=True, return_all_currents=True)
 
     def calc_sc(self, fault: str='3ph', case: str='max', branch_results=False, return_all_currents=False):
         pp.shortcircuit.calc_sc(self.net, fault=fault, case=case, branch_results=branch_results,
                                 return_all_currents=return_all_currents)
 
+    def calc_sc_sweep(self, modes: str | list | tuple | None = None, faults: tuple = ('3ph', '2ph', '1ph'),
+                      cases: tuple = ('max', 'min'), lv_tol_percent: int = 10) -> pd.DataFrame:
+        '''
+        Расчёт токов КЗ на всех шинах для всех сочетаний режимов, видов КЗ и режимов работы энергосистемы.
+        Для каждого режима и case выполняется один расчёт pandapower (1ph если он запрошен, иначе 3ph), токи
+        остальных видов КЗ получаются из сопротивлений прямой последовательности. Режимы с одинаковыми
+        изменениями рассчитываются один раз. После расчёта значения, изменённые режимами, восстанавливаются.
+        :param modes: имена режимов из net['modes'], '' - текущее состояние сети. Если не задано то все режимы
+        :param faults: виды КЗ '3ph', '2ph', '1ph'
+        :param cases: 'max', 'min'
+        :param lv_tol_percent: допуск напряжения сети 0.4кВ 6% или 10%
+        :return: DataFrame с индексом (mode, fault, case, bus) и столбцами ikss_ka, skss_mw, rk_ohm, xk_ohm,
+        rk0_ohm, xk0_ohm
+        '''
+        if modes is None:
+            modes = list(self.net['modes'])
+        elif isinstance(modes, str):
+            modes = [modes]
+        calculated = {}
+        keys = []
+        frames = []
+        for mode_name in modes:
+            key = repr(self.net['modes'][mode_name]) if mode_name else ''
+            if key not in calculated:
+                with self.mode(mode_name):
+                    calculated[key] = {case: self._calc_sc_faults(faults, case, lv_tol_percent) for case in cases}
+            for fault in faults:
+                for case in cases:
+                    keys.append((mode_name, fault, case))
+                    frames.append(calculated[key][case][fault])
+        return pd.concat(frames, keys=keys, names=['mode', 'fault', 'case', 'bus'])
+
+    def _calc_sc_faults(self, faults, case: str, lv_tol_percent: int) -> dict:
+        '''
+        Calculates short circuit for all faults with one pandapower run when it is possible.
+        Ikss for 3ph and 2ph are equal c*Un/(sqrt(3)*z1) and c*Un/(2*z1) if there are no current sources (sgen) and
+        power station units in net
+        :return: dict with fault as key and copy of res_bus_sc as value
+        '''
+        ps_gen = 'power_station_trafo' in self.net.gen and self.net.gen['power_station_trafo'].notna().any()
+        if self.net.sgen['in_service'].any() or ps_gen:
+            res = {}
+            for fault in faults:
+                pp.shortcircuit.calc_sc(self.net, fault=fault, case=case, lv_tol_percent=lv_tol_percent)
+                res[fault] = self.net.res_bus_sc.copy()
+            return res
+        fault_calc = '1ph' if '1ph' in faults else '3ph'
+        pp.shortcircuit.calc_sc(self.net, fault=fault_calc, case=case, lv_tol_percent=lv_tol_percent)
+        res_calc = self.net.res_bus_sc.copy()
+        res = {fault_calc: res_calc}
+        vn = self.net.bus.loc[res_calc.index, 'vn_kv']
+        c = vn.map({u: define_c(u, case, lv_tol_percent) for u in vn.unique()})
+        z = np.hypot(res_calc['rk_ohm'], res_calc['xk_ohm'])
+        ikss_3ph = c * vn / math.sqrt(3) / z
+        if '3ph' in faults and fault_calc != '3ph':
+            res['3ph'] = pd.DataFrame({'ikss_ka': ikss_3ph, 'skss_mw': math.sqrt(3) * ikss_3ph * vn,
+                                       'rk_ohm': res_calc['rk_ohm'], 'xk_ohm': res_calc['xk_ohm']})
+        if '2ph' in faults:
+            ikss_2ph = ikss_3ph * math.sqrt(3) / 2
+            res['2ph'] = pd.DataFrame({'ikss_ka': ikss_2ph, 'skss_mw': ikss_2ph * vn / math.sqrt(3),
+                                       'rk_ohm': res_calc['rk_ohm'], 'xk_ohm': res_calc['xk_ohm']})
+        return res
+
+    def _state_key(self) -> tuple:
+        '''
+        Key of state of net changed by add_*, _changed, modes and _set, replacement of tables or adding of elements.
+        Columns in_service and closed are included by hash, so direct switching in tables is detected too
+        '''
+        key = [self._version, self._values_version, id(self.net)]
+        for element in SC_ELEMENTS:
+            table = self.net[element]
+            key.extend((id(table), len(table)))
+            for column in ('in_service', 'closed'):
+                if column in table:
+                    key.append(hash(table[column].to_numpy(dtype=bool).tobytes()))
+        return tuple(key)
+
+    def thevenin(self, case: str = 'max', lv_tol_percent: int = 10, zero_sequence: bool = True,
+                 refresh: bool = False) -> pd.DataFrame:
+        '''
+        Сопротивления Тевенина прямой, обратной (равны прямой) и нулевой последовательностей для всех шин по
+        матрицам узловых сопротивлений ZBus схемы расчёта КЗ pandapower. Результат запоминается до изменения сети
+        через методы Net, режимы и _set, замены таблиц или добавления элементов. После line_replace_std_type,
+        split_line и merge_serial_lines результат не рассчитывается заново, а пересчитывается малоранговыми
+        поправками. После прямого изменения значений в таблицах net.net (кроме in_service и closed) нужно вызвать
+        thevenin(refresh=True), при этом сбрасываются все запомненные результаты. res_bus_sc и другие результаты КЗ
+        не изменяются
+        :return: DataFrame с индексом - шинами и столбцами vn_kv, c, r1_ohm, x1_ohm, r2_ohm, x2_ohm, r0_ohm, x0_ohm
+        '''
+        return self._thevenin_cache(case, lv_tol_percent, zero_sequence, refresh)[0]
+
+    def _thevenin_cache(self, case: str, lv_tol_percent: int, zero_sequence: bool, refresh: bool = False) -> tuple:
+        '''
+        :return: table of thevenin, {bus: position}, c * vn_kv, z1, z0
+        '''
+        key = (case, lv_tol_percent, zero_sequence)
+        state = self._state_key()
+        if refresh:
+            self._thevenin.clear()
+        cached = self._thevenin.get(key)
+        if cached is None or cached[0] != state:
+            self._thevenin[key] = cached = (state, *self._calc_thevenin(case, lv_tol_percent, zero_sequence))
+        return cached[2]
+
+    def _calc_thevenin(self, case: str, lv_tol_percent: int, zero_sequence: bool) -> tuple:
+        '''
+        Thevenin impedances by matrices of ZBus. Power station units are calculated by pandapower calc_sc only
+        :return: ZBus (None for calc_sc), result for _thevenin_cache
+        '''
+        ps_gen = 'power_station_trafo' in self.net.gen and self.net.gen['power_station_trafo'].notna().any()
+        if not ps_gen:
+            zbus = ZBus(self.net, case, lv_tol_percent, zero_sequence)
+            return zbus, self._thevenin_result(zbus, case, lv_tol_percent, zero_sequence)
+        saved = {key: self.net[key] for key in self.net.keys() if key.startswith('res_') and key.endswith('_sc')}
+        try:
+            pp.shortcircuit.calc_sc(self.net, fault='1ph' if zero_sequence else '3ph', case=case,
+                                    lv_tol_percent=lv_tol_percent)
+            res = self.net.res_bus_sc.sort_index()
+        finally:
+            for key, table in saved.items():
+                self.net[key] = table
+        z1 = np.empty(len(res), dtype=complex)
+        z1.real, z1.imag = res['rk_ohm'], res['xk_ohm']
+        z0 = np.full(len(res), np.nan, dtype=complex)
+        if zero_sequence:
+            z0.real, z0.imag = res['rk0_ohm'], res['xk0_ohm']
+        return None, self._thevenin_table(res.index, case, lv_tol_percent, z1, z0)
+
+    def _thevenin_result(self, zbus: ZBus, case: str, lv_tol_percent: int, zero_sequence: bool) -> tuple:
+        bus = self.net.bus.index.sort_values()
+        z_base = self.net.bus.loc[bus, 'vn_kv'].to_numpy() ** 2 / zbus.base_mva
+        z = zbus.diag(bus)
+        z0 = z[1] * z_base if zero_sequence else np.full(len(bus), np.nan, dtype=complex)
+        return self._thevenin_table(bus, case, lv_tol_percent, z[0] * z_base, z0)
+
+    def _thevenin_table(self, bus: pd.Index, case: str, lv_tol_percent: int, z1: np.ndarray, z0: np.ndarray) -> tuple:
+        vn = self.net.bus.loc[bus, 'vn_kv']
+        c = vn.map({u: define_c(u, case, lv_tol_percent) for u in vn.unique()})
+        table = pd.DataFrame({'vn_kv': vn, 'c': c, 'r1_ohm': z1.real, 'x1_ohm': z1.imag, 'r2_ohm': z1.real,
+                              'x2_ohm': z1.imag, 'r0_ohm': z0.real, 'x0_ohm': z0.imag}, index=bus)
+        return table, dict(zip(table.index, range(len(table)))), (c * vn).to_numpy(), z1, z0
+
+    def _log_change(self, operation: str, state: tuple, patch, **details):
+        '''
+        Records change of topology in change_log and patches cached thevenin impedances calculated for state
+        before change. Cache entries which can't be patched are removed and will be recalculated
+        :param patch: function of ZBus, returns False if change can't be applied by low-rank update
+        '''
+        self.change_log.append({'operation': operation, **details})
+        new_state = self._state_key()
+        for key, (cached_state, zbus, _) in list(self._thevenin.items()):
+            if cached_state != state or zbus is None or patch(zbus) is False:
+                del self._thevenin[key]
+            else:
+                self._thevenin[key] = (new_state, zbus, self._thevenin_result(zbus, *key))
+
+    def fault_current(self, bus, fault: str = '3ph', case: str = 'max', rf: float = 0, xf: float = 0,
+                      lv_tol_percent: int = 10):
+        '''
+        Начальный ток КЗ по сопротивлениям Тевенина (см. thevenin) с учётом сопротивления в месте КЗ без повторного
+        расчёта сети. Токи подпитки от sgen и блоков электростанций не учитываются. Для 3ph и 2ph используются
+        запомненные сопротивления с нулевой последовательностью, если они актуальны
+        :param bus: шина или массив шин
+        :param fault: '3ph', '2ph' или '1ph'
+        :param rf: активное сопротивление в месте КЗ, Ом (как r_fault_ohm в pandapower)
+        :param xf: реактивное сопротивление в месте КЗ, Ом (как x_fault_ohm в pandapower)
+        :return: ток в кА, массив для массива шин
+        '''
+        cached = self._thevenin.get((case, lv_tol_percent, True))
+        zero_sequence = fault == '1ph' or cached is not None and cached[0] == self._state_key()
+        table, position, cu, z1, z0 = self._thevenin_cache(case, lv_tol_percent, zero_sequence)
+        zf = complex(rf, xf)
+        scalar = np.ndim(bus) == 0
+        i = position[bus] if scalar else [position[b] for b in bus]
+        i = ikss(fault, cu[i], z1[i], z0[i], zf)
+        return float(i) if scalar else i
+
+    def run_timeseries(self, profiles: pd.DataFrame, outputs=DEFAULT_OUTPUTS, mode_name: str = '',
+                       backend: str = 'pandapower') -> pd.DataFrame:
+        '''
+        Расчёт потокораспределения по графикам нагрузки, см. timeseries.run_timeseries
+        :param backend: 'pandapower', 'lightsim2grid' или 'auto' (см. select_backend)
+        '''
+        if backend == 'pgm':
+            raise ValueError('Backend pgm is not supported for time series')
+        with self.mode(mode_name):
+            return run_timeseries(self, profiles, outputs, select_backend(self, backend))
+
+    def n_minus_1(self, elements: str = 'line', calc: str = 'pf', mode_name: str = '', fault: str = '3ph',
+                  case: str = 'max', lv_tol_percent: int = 10) -> pd.DataFrame:
+        '''
+        Расчёт всех отключений одного элемента (N-1) по одному разложению матриц исходной схемы,
+        см. contingency.n_minus_1_pf и contingency.n_minus_1_sc
+        :param elements: отключаемые элементы 'line', 'trafo' или 'all' (линии, трансформаторы и trafo3w)
+        :param calc: 'pf' - загрузка линий и трансформаторов, % (приближённо по LODF постоянного тока, отклонение от
+        расчёта потокораспределения до нескольких процентов загрузки) или 'sc' - токи КЗ fault, case на шинах, кА
+        :param lv_tol_percent: допуск напряжения сети 0.4кВ 6% или 10% для calc='sc'
+        :return: DataFrame отключения x элементы, attrs['approximate'] - результаты приближённые (calc='pf')
+        '''
+        with self.mode(mode_name):
+            if calc == 'pf':
+                return n_minus_1_pf(self, elements)
+            if calc == 'sc':
+                return n_minus_1_sc(self, elements, fault, case, lv_tol_percent)
+        raise ValueError("calc must be 'pf' or 'sc'")
+
+    def fault_location_table(self, line: int, step_km: float, faults=('3ph', '1ph'), case: str = 'max',
+                             rf: float = 0, mode_name: str = '', file: str | None = None,
+                             lv_tol_percent: int = 10) -> pd.DataFrame:
+        '''
+        Таблица токов КЗ по длине линии для определения места повреждения, см. fault_location.fault_location_table
+        :param file: если задан, таблица сохраняется в markdown (.md) или csv (остальные расширения)
+        :param lv_tol_percent: допуск напряжения сети 0.4кВ 6% или 10%
+        '''
+        with self.mode(mode_name):
+            table = fault_location_table(self.net, line, step_km, faults, case, rf, lv_tol_percent)
+        if file:
+            if file.endswith('.md'):
+                with open(file, 'w', encoding='utf-8') as f:
+                    f.write(self.fault_location_md(table, line))
+            else:
+                table.to_csv(file)
+        return table
+
+    def fault_location_md(self, table: pd.DataFrame, line: int) -> str:
+        '''
+        Markdown таблицы fault_location_table для линии line
+        '''
+        from_name, to_name = (self.net.bus.at[self.net.line.at[line, bus], 'name'] for bus in ('from_bus', 'to_bus'))
+        fault = pd.Series(table.index.get_level_values('fault'), index=table.index, dtype=object)
+        distance = pd.Series(table.index.get_level_values('distance_km'), index=table.index)
+        return to_markdown(['Вид КЗ', 'Расстояние от ' + str(from_name) + ', км', 'Ток КЗ, кА',
+                            'Ток ' + str(from_name) + ', кА', 'Ток ' + str(to_name) + ', кА',
+                            '3I0 ' + str(from_name) + ', кА', '3I0 ' + str(to_name) + ', кА'],
+                           [fault, _fmt('%.2f', distance)] + [_fmt('%.3f', table[column]) for column in
+                                                              ('ikss_ka', 'i_from_ka', 'i_to_ka', 'i0_from_ka',
+                                                               'i0_to_ka')])
+
     def calc_i_neitral_trafo(self, bus, trafo3w, case='max'):
         vector_group = self.net.trafo3w.loc[trafo3w, 'vector_group']
         if vector_group[1] not in ('N', 'n'):
             print('Trafo3w vector group must be YN or Yn')
             return
-        self.calc_sc(fault='1ph', case=case)
-        rk0_neitral = float(self.net.res_bus_sc.loc[bus, 'rk0_ohm'])
-        xk0_neitral = float(self.net.res_bus_sc.loc[bus, 'xk0_ohm'])
-        ik_neitral = float(self.net.res_bus_sc.loc[bus, 'ikss_ka'])
-        self.net.trafo3w.loc[trafo3w, 'vector_group'] = vector_group[0] + vector_group[2:]
-        self.calc_sc(fault='1ph', case=case)
-        rk0 = float(self.net.res_bus_sc.loc[bus, 'rk0_ohm'])
-        xk0 = float(self.net.res_bus_sc.loc[bus, 'xk0_ohm'])
-        ik = float(self.net.res_bus_sc.loc[bus, 'ikss_ka'])
-        self.net.trafo3w.loc[trafo3w, 'vector_group'] = vector_group
+        thevenin = self.thevenin(case)
+        rk0_neitral, xk0_neitral = thevenin.loc[bus, ['r0_ohm', 'x0_ohm']]
+        ik_neitral = self.fault_current(bus, '1ph', case)
+        with self.mode():
+            self._set('trafo3w', 'vector_group', trafo3w, vector_group[0] + vector_group[2:])
+            rk0, xk0 = self.thevenin(case).loc[bus, ['r0_ohm', 'x0_ohm']]
+            ik = self.fault_current(bus, '1ph', case)
         z_system = math.sqrt(rk0 ** 2 + xk0 ** 2)
         z_all = math.sqrt(rk0_neitral ** 2 + xk0_neitral ** 2)
         c = 1 - z_all / z_system
         print(f'i_neitral={ik_neitral * c:.5f}, ikz_with_neitral={ik_neitral}, ikz_without_neitral={ik}, '
               f'ikz_with_neitral - ikz_without_neitral={(ik_neitral - ik) * 3}')
 
+    def get_res_bus_sc(self) -> pd.DataFrame:
+        '''
+        Таблица результатов расчёта КЗ по шинам: имя шины, ток КЗ в А, r, x, z в Ом и, если есть, z0 в Ом
+        '''
+        res = self.net.res_bus_sc.sort_index()
+        df = pd.DataFrame({'name': self.net.bus['name'].reindex(res.index), 'i_a': res['ikss_ka'] * 1000,
+                           'r_ohm': res['rk_ohm'], 'x_ohm': res['xk_ohm'],
+                           'z_ohm': np.hypot(res['rk_ohm'], res['xk_ohm'])}, index=res.index)
+        if 'rk0_ohm' in res:
+            df['z0_ohm'] = np.hypot(res['rk0_ohm'], res['xk0_ohm'])
+        return df
+
     def res_bus_sc(self):
         '''
         Возвращает словарь ключами которого являются индексы шин а значением кортеж из имени шины, тока КЗ в А,
         полного сопротивления в Ом и, если есть, полное сопротивление нулевой последовательности
         '''
-        res = {}
-        for i, value in self.net.res_bus_sc.sort_index().iterrows():
-            if i in self.net.bus_geodata.index:
-                res_row = [self.net.bus.loc[i, 'name'], float(value['ikss_ka']) * 1000,
-                           math.sqrt(value['rk_ohm']**2 + value['xk_ohm']**2)]
-                if 'rk0_ohm' in value:
-                    z0 = math.sqrt(value['rk0_ohm'] ** 2 + value['xk0_ohm'] ** 2)
-                    res_row.append(z0)
-                res[i] = res_row
-        return res
+        df = self.get_res_bus_sc()
+        df = df[df.index.isin(self.net.bus_geodata.index)]
+        columns = ['name', 'i_a', 'z_ohm'] + (['z0_ohm'] if 'z0_ohm' in df else [])
+        return dict(zip(df.index, map(list, zip(*(df[column].tolist() for column in columns)))))
 
     def res_line_sc(self, bus):
-        names = self.names_line
-        res = {i: [names[i], float(value['ikss_ka']) * 1000]
-               for i, value in self.net.res_line_sc.xs(bus, level=1).sort_index().iterrows()}
-        return res
+        res = self.net.res_line_sc.xs(bus, level=1).sort_index()
+        names = self.name_index.series('line', res.index)
+        return dict(zip(res.index, map(list, zip(names.tolist(), (res['ikss_ka'] * 1000).tolist()))))
 
     def res_line(self, line_index: int | list | None = None):
         if line_index is None:
             line_index = self.net.line.index
-        names = self.names_line
-        res = {names[index]: values['i_ka'] * 1000
-               for index, values in self.net.res_line.loc[line_index].sort_index().iterrows()}
-        return res
+        elif isinstance(line_index, int):
+            line_index = [line_index]
+        res = self.net.res_line.loc[line_index].sort_index()
+        return dict(zip(self.name_index.series('line', res.index), (res['i_ka'] * 1000).tolist()))
 
     def res_bus_sc_md(self):
-        s = 'Точка КЗ | Ток КЗ, кА | r, Ом | x, Ом | z, Ом\n-|-|-|-|-\n'
-        res = self.net.res_bus_sc
-        for index, row in res.sort_index().iterrows():
-            name = self.net.bus.loc[index, 'name'].ljust(28)
-            i = f'{row.loc["ikss_ka"] * 1000:.1f}'.ljust(7)
-            r = row.loc["rk_ohm"]
-            rstr = f'{r:.6f}'.ljust(10)
-            x = row.loc["xk_ohm"]
-            xstr = f'{x:.6f}'.ljust(10)
-            s += f'{name} | {i} | {rstr} | {xstr} | {math.sqrt(r**2 + x**2):.6f}\n'
-        return s
+        df = self.get_res_bus_sc()
+        return to_markdown(['Точка КЗ', 'Ток КЗ, кА', 'r, Ом', 'x, Ом', 'z, Ом'],
+                           [_str(df['name']).str.ljust(28), _fmt('%.1f', df['i_a']).str.ljust(7),
+                            _fmt('%.6f', df['r_ohm']).str.ljust(10), _fmt('%.6f', df['x_ohm']).str.ljust(10),
+                            _fmt('%.6f', df['z_ohm'])])
 
 
     def name_line(self, index):
-        name1 = ''
-        try:
-            name1 = self.net.bus.at[self.net.line.at[index, 'from_bus'], 'name']
-        except KeyError:
-            ...
-        name2 = ''
-        try:
-            name2 = self.net.bus.at[self.net.line.at[index, 'to_bus'], 'name']
-        except KeyError:
-            ...
-        name = name1 + ' - ' + name2
-        return name
+        return self.name_index.names('line').get(index, ' - ')
 
     @property
     def names_line(self):
-        names = {i: self.name_line(i) for i in self.net.line.index}
-        return names
+        return dict(self.name_index.names('line'))
 
     @property
     def names_trafo(self):
@@ -640,30 +1208,11 @@ class Net:
         return self.net.trafo3w['name'].tolist()
 
     def name_switch(self, index):
-        name1 = ''
-        try:
-            name1 = self.net.bus.at[self.net.switch.at[index, 'bus'], 'name']
-        except KeyError:
-            ...
-        name2 = ''
-        et = self.net.switch.at[index, 'et']
-        element = self.net.switch.at[index, 'element']
-        try:
-            if et == 't':
-                name2 = self.net.trafo.at[element, 'name']
-            if et == 'l':
-                name2 = self.name_line(element)
-            if et == 'b':
-                name2 = self.net.bus.at[element, 'name']
-        except KeyError:
-            ...
-        name = name1 + ' - ' + name2
-        return name
+        return self.name_index.names('switch').get(index, ' - ')
 
     @property
     def names_switch(self):
-        names = [self.name_switch(i) for i in self.net.switch.index]
-        return names
+        return self.name_index.series('switch').tolist()
 
     @property
     def names_bus(self):
@@ -678,6 +1227,7 @@ class Net:
 
     def clear_geodata(self):
         self.net.bus_geodata.drop(self.net.bus_geodata.index, inplace=True)
+        self.spatial_index.invalidate()
 
     def scale_geodata(self, nx, ny=None):
         '''
@@ -692,6 +1242,7 @@ class Net:
         self.net.bus_geodata.y *= ny
         self.net.bus_geodata.xt *= nx
         self.net.bus_geodata.yt *= ny
+        self.spatial_index.invalidate()
 
     def busxy(self, i, coords: tuple | None = None):
         if coords:
@@ -700,6 +1251,7 @@ class Net:
             self.net.bus_geodata.loc[i, 'y'] = y
             self.net.bus_geodata.loc[i, 'xt'] = x
             self.net.bus_geodata.loc[i, 'yt'] = y
+            self.spatial_index.update(i)
         else:
             x = self.net.bus_geodata.loc[i, 'x']
             y = self.net.bus_geodata.loc[i, 'y']
@@ -709,6 +1261,7 @@ class Net:
 
     def busbar(self, i, x1, y1, x2):
         self.net.bus_geodata.at[i, 'coords'] = [(x1, y1), (x2, y1)]
+        self.spatial_index.update(i)
 
     def place_buses(self, buses: int | list | tuple, bus_to: int | None=None, x=0, y=0, step=2):
         '''
@@ -735,6 +1288,7 @@ class Net:
             self.net.bus_geodata.loc[bus, 'yt'] = yt
             xel += step
             xt += step
+        self.spatial_index.update(buses)
 
     def move_bus(self, bus, bus_to, dx: float | None = None, dy: float | None = None): #TODO реализовать перемещение coords
         if dx is not None:
@@ -743,6 +1297,7 @@ class Net:
         if dy is not None:
             self.net.bus_geodata.loc[bus, 'y'] = self.net.bus_geodata.loc[bus_to, 'y'] + dy
             self.net.bus_geodata.loc[bus, 'yt'] = self.net.bus_geodata.loc[bus_to, 'yt'] + dy
+        self.spatial_index.update(bus)
 
     def shift_buses(self, buses, bus_to: int | None=None, dx=0, dy=0):
         '''
@@ -768,9 +1323,10 @@ class Net:
         self.net.bus_geodata.loc[buses, 'y'] += dy
         self.net.bus_geodata.loc[buses, 'yt'] += dyt
         for bus in buses:
-            if coords := self.net.bus_geodata.at[bus, 'coords']:
+            if isinstance(coords := self.net.bus_geodata.at[bus, 'coords'], (list, tuple)) and coords:
                 (x1, y1), (x2, y2) = coords
                 self.net.bus_geodata.at[bus, 'coords'] = [(x1 + dx, y1 + dy), (x2 + dx, y2 + dy)]
+        self.spatial_index.update(buses)
 
     def shift_bus_text(self, buses=None, dx=0, dy=0):
         '''
@@ -785,25 +1341,23 @@ class Net:
         self.net.bus_geodata.loc[buses, 'xt'] += dx
         self.net.bus_geodata.loc[buses, 'yt'] += dy
 
-    def select_rect(self, x1, y1, x2, y2):
-        if x1 > x2:
-            x1, x2 = x2, x1
-        if y1 > y2:
-            y1, y2 = y2, y1
-        buses = []
-        indexes = self.net.bus_geodata.index
-        for i, bus_geodata in self.net.bus_geodata.iterrows():
-            if i in indexes:
-                if x1 <= bus_geodata['x'] <= x2 and y1 <= bus_geodata['y'] <= y2:
-                    buses.append(i)
-        return buses
-
-    def select(self, func_coords):
-        buses = []
-        for i, bus_geodata in self.net.bus_geodata.iterrows():
-            if func_coords(bus_geodata['x'], bus_geodata['y']):
-                buses.append(i)
-        return buses
+    def select_rect(self, x1, y1, x2, y2, busbar: bool = False):
+        '''
+        Шины, координаты которых находятся внутри прямоугольника (по пространственному индексу spatial_index)
+        :param busbar: выбирать также шины, отрезок которых пересекает прямоугольник
+        :return: список шин в порядке bus_geodata
+        '''
+        return self.spatial_index.rect(x1, y1, x2, y2, busbar)
+
+    def select(self, func_coords, rect: tuple | None = None):
+        '''
+        Шины, для координат которых func_coords(x, y) истинно
+        :param rect: (x1, y1, x2, y2) - проверять только шины внутри прямоугольника
+        '''
+        geodata = self.net.bus_geodata
+        if rect is not None:
+            geodata = geodata.loc[self.select_rect(*rect)]
+        return [i for i, x, y in zip(geodata.index, geodata['x'], geodata['y']) if func_coords(x, y)]
 
     def coord_buses(self, buses, x: float | None = None, y: float | None = None):
         if isinstance(buses, int):
@@ -815,6 +1369,7 @@ class Net:
             if y is not None:
                 self.net.bus_geodata.loc[bus, 'y'] = y
                 self.net.bus_geodata.loc[bus, 'yt'] = y
+        self.spatial_index.update(buses)
 
     def turn_right(self): #TODO реализовать перемещение coords
         temp = self.net.bus_geodata.x
@@ -823,16 +1378,19 @@ class Net:
         self.net.bus_geodata.xt = self.net.bus_geodata.yt
         self.net.bus_geodata.y = temp
         self.net.bus_geodata.yt = tempt
+        self.spatial_index.invalidate()
 
     def mirror_x(self):
         # TODO реализовать перемещение coords
         self.net.bus_geodata.y *= -1
         self.net.bus_geodata.yt *= -1
+        self.spatial_index.invalidate()
 
     def mirror_y(self):
         # TODO реализовать перемещение coords
         self.net.bus_geodata.x *= -1
         self.net.bus_geodata.xt *= -1
+        self.spatial_index.invalidate()
 
     def get_coords(self):
         return self.net.bus_geodata.to_dict()
@@ -853,6 +1411,7 @@ class Net:
         if buses is None:
             buses = self.net.bus_geodata.index
         self.net.bus_geodata.drop(buses, inplace=True)
+        self.spatial_index.invalidate()
 
     def copy_coords_for_text(self):
         self.net.bus_geodata['xt'] = self.net.bus_geodata['x']
@@ -2,10 +2,15 @@ import math
 
 import pandapower as pp
 import numpy as np
+import pandas as pd
 from textengines.interfaces import *
 
 from pandapowertools.functions import define_c
 from pandapowertools.diagram import Diagram
+from pandapowertools.layout import layout
+from pandapowertools.drawlist import DrawList
+from pandapowertools.symbols import (r, node_draw, bus_draw, label_draw, ext_grid_draw, gen_draw, _switch_bus,
+                                     _switch_line, _reactor, _impedance, _trafo, _trafo3w, _capacitor, _ground)
 
 
 
@@ -66,222 +71,149 @@ def plot2(net: pp.pandapowerNet, te: TextEngine, isc: bool = True,
 def plot(net: pp.pandapowerNet, te: TextEngine, indexes: bool = True, ikz: bool = False,
          voltage: bool = False, impedance: bool = False, length_node: int = 8, length_trafo: int = 6, length: int = 20):
     '''
-    Plot pandapowerNet to TextEngine format
+    Plot pandapowerNet to TextEngine format. Coordinates of all elements are calculated by layout,
+    then symbols are drawn element by element to DrawList, which is flushed to te
     :param net:
     :param te:
     :param indexes: if True then plot inexes
     :param length_node: length of text row
     :param length_trafo: length of text row
-    :return:
+    :return: DrawList, can be flushed to other TextEngine
     '''
+    engine, te = te, DrawList()
+    geometry = layout(net, impedance)
     #plot buses
-    for bus, bus_coords in net.bus_geodata.iterrows():
-        text = [net.bus.loc[bus, 'name']]
+    bus = geometry['bus']
+    names = net.bus['name'].reindex(bus.index).to_numpy()
+    ikss = net.res_bus_sc['ikss_ka'].reindex(bus.index).to_numpy() if ikz else None
+    vm = net.res_bus['vm_pu'].reindex(bus.index).to_numpy() if voltage else None
+    for k, b in enumerate(bus.itertuples()):
+        text = [names[k]]
         if ikz:
-            text.append(f'Ik={net.res_bus_sc.loc[bus, "ikss_ka"]:.2f}кА')
+            text.append(f'Ik={ikss[k]:.2f}кА')
         if voltage:
-            text.append(f'V={net.res_bus.loc[bus, "vm_pu"]:.4f}')
+            text.append(f'V={vm[k]:.4f}')
         if indexes:
-            text.append(f'({bus})')
-        if bus_coords['coords']:
-            _bus(bus_coords['coords'], text, te, xt=bus_coords['xt'],
-                 yt=bus_coords['yt'])
+            text.append(f'({b.Index})')
+        if b.busbar:
+            bus_draw([(b.bx1, b.by1), (b.bx2, b.by2)], te)
         else:
-            _node(bus_coords['x'], bus_coords['y'], text, te, length_node, bus_coords['xt'],
-          bus_coords['yt'])
+            node_draw(b.x, b.y, te)
+        label_draw(b.xt, b.yt, text, te, length=length_node)
     #plot lines
-    for i, line in net.line.iterrows():
-        if line['in_service']:
-            from_bus = line['from_bus']
-            to_bus = line['to_bus']
-            if (from_bus in net.bus_geodata.index and to_bus in net.bus_geodata.index) or i in net.line_geodata.index:
-                parallel = net.line.loc[i, "parallel"]
-                x1, y1 = net.bus_geodata.loc[from_bus, ['x', 'y']]
-                x2, y2 = net.bus_geodata.loc[to_bus, ['x', 'y']]
-                if impedance:
-                    l = line['length_km']
-                    text = f'{line["r_ohm_per_km"] * l / parallel:.3f}+j{line["x_ohm_per_km"] * l / parallel:.3f} Ом'
-                    _impedance((x1, y1), (x2, y2), te, text, length)
-                else:
-                    from_coords = net.bus_geodata.at[from_bus, 'coords']
-                    to_coords = net.bus_geodata.at[to_bus, 'coords']
-                    if from_coords and not to_coords:
-                        x1 = x2
-                        y1 = from_coords[0][1]
-                    elif not from_coords and to_coords:
-                        x2 = x1
-                        y2 = to_coords[0][1]
-                    elif from_coords and to_coords:
-                        xb1 = net.bus_geodata.at[from_bus, 'coords'][0][0]
-                        xe1 = net.bus_geodata.at[from_bus, 'coords'][1][0]
-                        xb2 = net.bus_geodata.at[to_bus, 'coords'][0][0]
-                        xe2 = net.bus_geodata.at[to_bus, 'coords'][1][0]
-                        coords_sorted = sorted([xb1, xb2, xe1, xe2])
-                        x1 = x2 = (coords_sorted[1] + coords_sorted[2]) / 2.0
-                        y1 = from_coords[0][1]
-                        y2 = to_coords[0][1]
-                    else:
-                        x1 = net.bus_geodata.at[from_bus, 'x']
-                        x2 = net.bus_geodata.at[to_bus, 'x']
-                        y1 = net.bus_geodata.at[from_bus, 'y']
-                        y2 = net.bus_geodata.at[to_bus, 'y']
-                    if line['std_type']:
-                        text = f'{net.line.loc[i, "std_type"]} {net.line.loc[i, "length_km"]} км'
-                        if parallel > 1:
-                            text = f'{parallel}*{text}'
-                        if i in net.line_geodata.index:
-                            _line(*net.line_geodata.loc[i, 'coords'], te=te, text=text)
-                        else:
-                            _line_straight((x1, y1), (x2, y2), te=te, text=text)
-                    else:
-                        l = line['length_km']
-                        text = f'{line["r_ohm_per_km"] * l / parallel:.3f}+j{line["x_ohm_per_km"] * l / parallel:.3f} Ом'
-                        _reactor(x1, y1, x2, y2, te=te, text=text, length=length_trafo)
-    #plot ext_grid
-    for _, ext_grid in net.ext_grid.iterrows():
-        if ext_grid['in_service'] and ext_grid['bus'] in net.bus_geodata.index:
-            x, y = net.bus_geodata.loc[ext_grid['bus'], ['x', 'y']]
-            if impedance:
-                name = ext_grid['name']
-                if name is None:
-                    name = ''
-                text = [name]
-                u_bus = net.bus.at[ext_grid['bus'], 'vn_kv']
-                i_kz_max = ext_grid['s_sc_max_mva'] / u_bus / math.sqrt(3)
-                zs = define_c(u_bus, "max", 10) * u_bus / i_kz_max / math.sqrt(3)
-                rx = ext_grid['rx_max']
-                xs = math.sqrt(zs ** 2 / (1 + rx))
-                rs = rx * xs
-                text.append(f'Zmax={rs:.3f}+j{xs:.3f} = {zs:.3f} Ом')
-                i_kz_min = ext_grid['s_sc_min_mva'] / u_bus / math.sqrt(3)
-                zs = define_c(u_bus, "min", 10) * u_bus / i_kz_min / math.sqrt(3)
-                rx = ext_grid['rx_min']
-                xs = math.sqrt(zs ** 2 / (1 + rx))
-                rs = rx * xs
-                text.append(f'Zmin={rs:.3f}+j{xs:.3f} = {zs:.3f} Ом')
-                _impedance((x, y), (x, y + 2), te, text, length=length)
-                _ext_grid(x, y + 2 - r -r, te=te)
+    line = geometry['line']
+    params = net.line.loc[line.index]
+    polylines = net.line_geodata['coords'] if 'line_geodata' in net and 'coords' in net.line_geodata \
+        else pd.Series(dtype=object)
+    parallel = params['parallel'].to_numpy()
+    length_km = params['length_km'].to_numpy()
+    r_ohm = params['r_ohm_per_km'].to_numpy() * length_km / parallel
+    x_ohm = params['x_ohm_per_km'].to_numpy() * length_km / parallel
+    for k, (l, std_type) in enumerate(zip(line.itertuples(), params['std_type'])):
+        if impedance:
+            text = f'{r_ohm[k]:.3f}+j{x_ohm[k]:.3f} Ом'
+            _impedance((l.x1, l.y1), (l.x2, l.y2), te, text, length)
+        elif std_type:
+            text = f'{std_type} {length_km[k]} км'
+            if parallel[k] > 1:
+                text = f'{parallel[k]}*{text}'
+            if l.Index in polylines.index:
+                te.lines(*polylines[l.Index])
             else:
-                _ext_grid(x, y, te=te)
+                te.lines((l.x1, l.y1), (l.x2, l.y2))
+            label_draw(l.xt, l.yt, text, te, angle=l.angle, length=length)
+        else:
+            text = f'{r_ohm[k]:.3f}+j{x_ohm[k]:.3f} Ом'
+            _reactor(l.x1, l.y1, l.x2, l.y2, te=te, text=text, length=length_trafo)
+    #plot ext_grid
+    ext_grid = geometry['ext_grid']
+    for (i, e), (x, y) in zip(net.ext_grid.loc[ext_grid.index].iterrows(), ext_grid.to_numpy()):
+        if impedance:
+            name = e['name']
+            if name is None:
+                name = ''
+            text = [name]
+            u_bus = net.bus.at[e['bus'], 'vn_kv']
+            i_kz_max = e['s_sc_max_mva'] / u_bus / math.sqrt(3)
+            zs = define_c(u_bus, "max", 10) * u_bus / i_kz_max / math.sqrt(3)
+            rx = e['rx_max']
+            xs = math.sqrt(zs ** 2 / (1 + rx))
+            rs = rx * xs
+            text.append(f'Zmax={rs:.3f}+j{xs:.3f} = {zs:.3f} Ом')
+            i_kz_min = e['s_sc_min_mva'] / u_bus / math.sqrt(3)
+            zs = define_c(u_bus, "min", 10) * u_bus / i_kz_min / math.sqrt(3)
+            rx = e['rx_min']
+            xs = math.sqrt(zs ** 2 / (1 + rx))
+            rs = rx * xs
+            text.append(f'Zmin={rs:.3f}+j{xs:.3f} = {zs:.3f} Ом')
+            _impedance((x, y), (x, y + 2), te, text, length=length)
+            ext_grid_draw(x, y + 2 - r -r, te=te)
+        else:
+            ext_grid_draw(x, y, te=te)
     #plot trafo
-    for _, trafo in net.trafo.iterrows():
-        hv_bus = trafo['hv_bus']
-        lv_bus = trafo['lv_bus']
-        if hv_bus in net.bus_geodata.index and lv_bus in net.bus_geodata.index:
-            x1, y1 = net.bus_geodata.loc[hv_bus, ['x', 'y']]
-            x2, y2 = net.bus_geodata.loc[lv_bus, ['x', 'y']]
-            if impedance:
-                ukx = math.sqrt(trafo['vk_percent'] ** 2 - trafo['vkr_percent'] ** 2)
-                kt = 0.95 * 1.1 / (1 + 0.6 * ukx / 100)
-                zt = trafo['vk_percent'] * trafo['vn_hv_kv'] ** 2 / 100 / trafo['sn_mva'] / kt
-                rt = kt * trafo['vkr_percent'] * trafo['vn_hv_kv'] ** 2 / 100 / trafo['sn_mva']
-                xt = math.sqrt(zt ** 2 - rt ** 2)
-                text = f'{rt:.3f}+j{xt:.3f} Ом'
-                _impedance((x1, y1), (x2, y2), te=te, text=text, length=length_trafo)
-            else:
-                text = [trafo['name']]
-                text.append(trafo['std_type'])
-                vector_group = ''
-                if 'vector_group' in trafo:
-                    vector_group = trafo['vector_group']
-                _trafo(x1, y1, x2, y2, text, te=te, length=length_trafo, vector_group=vector_group)
+    trafo = geometry['trafo']
+    params = net.trafo.loc[trafo.index]
+    if impedance:
+        vk = params['vk_percent'].to_numpy(dtype=float)
+        vkr = params['vkr_percent'].to_numpy(dtype=float)
+        z_base = params['vn_hv_kv'].to_numpy(dtype=float) ** 2 / 100 / params['sn_mva'].to_numpy(dtype=float)
+        kt = 0.95 * 1.1 / (1 + 0.6 * np.sqrt(vk ** 2 - vkr ** 2) / 100)
+        zt = vk * z_base / kt
+        rt = kt * vkr * z_base
+        xt = np.sqrt(zt ** 2 - rt ** 2)
+        for t, rt_k, xt_k in zip(trafo.itertuples(), rt, xt):
+            _impedance((t.x1, t.y1), (t.x2, t.y2), te=te, text=f'{rt_k:.3f}+j{xt_k:.3f} Ом', length=length_trafo)
+    else:
+        vector_groups = params['vector_group'] if 'vector_group' in params else [''] * len(params)
+        for t, name, std_type, vector_group in zip(trafo.itertuples(), params['name'], params['std_type'],
+                                                   vector_groups):
+            _trafo(t.x1, t.y1, t.x2, t.y2, [name, std_type], te=te, length=length_trafo, vector_group=vector_group)
     #plot trafo3w
-    for _, trafo in net.trafo3w.iterrows():
-        hv_bus = trafo['hv_bus']
-        mv_bus = trafo['mv_bus']
-        lv_bus = trafo['lv_bus']
-        if all(bus in net.bus_geodata.index for bus in [hv_bus, mv_bus, lv_bus]):
-            x1, y1 = net.bus_geodata.loc[hv_bus, ['x', 'y']]
-            x2, y2 = net.bus_geodata.loc[mv_bus, ['x', 'y']]
-            x3, y3 = net.bus_geodata.loc[lv_bus, ['x', 'y']]
-            text = [trafo['name']]
-            text.append(trafo['std_type'])
-            vector_group = ''
-            if 'vector_group' in trafo:
-                vector_group = trafo['vector_group']
-            _trafo3w(x1, y1, x2, y2, x3, y3, text, te=te, vector_group=vector_group)
+    trafo = geometry['trafo3w']
+    params = net.trafo3w.loc[trafo.index]
+    vector_groups = params['vector_group'] if 'vector_group' in params else [''] * len(params)
+    for t, name, std_type, vector_group in zip(trafo.itertuples(), params['name'], params['std_type'], vector_groups):
+        _trafo3w(t.x1, t.y1, t.x2, t.y2, t.x3, t.y3, [name, std_type], te=te, vector_group=vector_group)
     #plot gen
-    for _, gen in net.gen.iterrows():
-        bus = gen['bus']
-        if bus in net.bus_geodata.index:
-            x, y = net.bus_geodata.loc[bus, ['x', 'y']]
-            text = [gen['name']]
-            text.append(f'{gen['p_mw']}МВт')
-            _gen(x, y, text, te=te)
+    gen = geometry['gen']
+    params = net.gen.loc[gen.index]
+    for (x, y), name, p_mw in zip(gen.to_numpy(), params['name'], params['p_mw']):
+        gen_draw(x, y, [name, f'{p_mw}МВт'], te=te)
     #plot impedance
-    for i, impedance in net.impedance.iterrows():
-        from_bus = impedance['from_bus']
-        to_bus = impedance['to_bus']
-        if from_bus in net.bus_geodata.index and to_bus in net.bus_geodata.index:
-            _reactor(*net.bus_geodata.at[from_bus, ['x', 'y']], *net.bus_geodata.at[to_bus, ['x', 'y']], te=te)
+    for x1, y1, x2, y2 in geometry['impedance'].to_numpy():
+        _reactor(x1, y1, x2, y2, te=te)
     #plot switch
-    for i, switch in net.switch.iterrows():
-        diagram.add_switch(i, Switch_sym(bus_index, et, element_index, text))
-        bus = switch['bus']
-        if bus in net.bus_geodata.index:
-            element = switch['element']
-            et = switch['et']
-            x1 = net.bus_geodata.at[bus, 'x']
-            y1 = net.bus_geodata.at[bus, 'y']
-            match et:
-                case 'b':
-                    if element in net.bus_geodata.index:
-                        bus_coords1 = [(x1, y1)]
-                        if net.bus_geodata.at[bus, 'coords']:
-                            bus_coords1.extend(net.bus_geodata.at[bus, 'coords'])
-                        x2 = net.bus_geodata.at[element, 'x']
-                        y2 = net.bus_geodata.at[element, 'y']
-                        bus_coords2 = [(x2, y2)]
-                        if net.bus_geodata.at[element, 'coords']:
-                            bus_coords2.extend(net.bus_geodata.at[element, 'coords'])
-                        nearby_coords = None
-                        length_min = None
-                        for c1 in bus_coords1:
-                            for c2 in bus_coords2:
-                                length = math.sqrt((c1[0] - c2[0]) ** 2 + (c1[1] - c2[1]) ** 2)
-                                if length_min:
-                                    if length < length_min:
-                                        length_min = length
-                                        nearby_coords = c1, c2
-                                else:
-                                    length_min = length
-                        (x1, y1), (x2, y2) = nearby_coords
-                        _switch_bus(x1, y1, x2, y2, te=te, closed=switch['closed'])
-                case 'l':
-                    bus2 = net.line.at[element, 'from_bus'] if bus == net.line.at[element, 'to_bus'] else net.line.at[element, 'to_bus']
-                    if bus2 in net.bus_geodata.index:
-                        x2 = net.bus_geodata.at[bus2, 'x']
-                        y2 = net.bus_geodata.at[bus2, 'y']
-                        _switch_line(x1, y1, x2, y2, te=te, closed=switch['closed'])
-
+    for s in geometry['switch'].itertuples():
+        if s.et == 'b':
+            _switch_bus(s.x1, s.y1, s.x2, s.y2, te=te, closed=s.closed)
+        else:
+            _switch_line(s.x1, s.y1, s.x2, s.y2, te=te, closed=s.closed)
     #plot shunt
-    for _, shunt in net.shunt.iterrows():
-        bus = shunt['bus']
-        if shunt['in_service'] and bus in net.bus_geodata.index:
-            x, y = net.bus_geodata.loc[bus, ['x', 'y']]
-            v = net.bus.at[shunt['bus'], 'vn_kv']
-            p_mw = shunt['p_mw']
-            if np.isnan(p_mw):
-                rc = 0
-            else:
-                rc = v ** 2 / shunt['p_mw']
-            xc = v ** 2 / shunt['q_mvar']
-            sign = '+'
-            capacitor = False
-            if xc < 0:
-                xc = -xc
-                sign = '-'
-                capacitor = True
-            rc_str = f'{rc:.1f}' if rc < 9999 else f'{rc:.4e}'
-            xc_str = f'{xc:.1f}' if xc < 9999 else f'{xc:.4e}'
-            name = shunt['name']
-            if name is None:
-                name = ''
-            else:
-                name += ' '
-            text = [f'{name}{rc_str}{sign}j{xc_str}']
-            if capacitor:
-                _capacitor(x, y, text, te=te)
-            else:
-                _impedance((x, y), (x, y - r * 11), te=te, text=text, length=length)
-                _ground(x, y - r * 10, te=te)
+    shunt = geometry['shunt']
+    params = net.shunt.loc[shunt.index]
+    v2 = net.bus['vn_kv'].loc[params['bus']].to_numpy(dtype=float) ** 2
+    p_mw = params['p_mw'].to_numpy(dtype=float)
+    with np.errstate(divide='ignore'):
+        rc = np.where(np.isnan(p_mw), 0, v2 / p_mw)
+        xc = v2 / params['q_mvar'].to_numpy(dtype=float)
+    for (x, y), name, rc_k, xc_k in zip(shunt.to_numpy(), params['name'], rc, xc):
+        sign = '+'
+        capacitor = False
+        if xc_k < 0:
+            xc_k = -xc_k
+            sign = '-'
+            capacitor = True
+        rc_str = f'{rc_k:.1f}' if rc_k < 9999 else f'{rc_k:.4e}'
+        xc_str = f'{xc_k:.1f}' if xc_k < 9999 else f'{xc_k:.4e}'
+        if name is None:
+            name = ''
+        else:
+            name += ' '
+        text = [f'{name}{rc_str}{sign}j{xc_str}']
+        if capacitor:
+            _capacitor(x, y, text, te=te)
+        else:
+            _impedance((x, y), (x, y - r * 11), te=te, text=text, length=length)
+            _ground(x, y - r * 10, te=te)
+    te.flush(engine)
+    return te
@@ -0,0 +1,127 @@
+import pickle
+import traceback
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+
+from pandapowertools.net import Net
+
+
+CALCS = {'pf': 'calc_pf', 'pf_pgm': 'calc_pf_pgm', 'sc': 'calc_sc'}
+
+_net: Net | None = None
+
+
+def _init_worker(data: bytes):
+    global _net
+    _net = pickle.loads(data)
+
+
+def _result_tables(net: Net, calc: str) -> dict:
+    res = {}
+    for key in net.net.keys():
+        if not key.startswith('res_') or key.endswith('_3ph') or (calc == 'sc') != key.endswith('_sc'):
+            continue
+        if not net.net[key].empty:
+            res[key] = net.net[key].copy()
+    return res
+
+
+def _calc_mode(net: Net, mode_name: str, calc: str, kwargs: dict) -> 'ModeResult':
+    try:
+        with net.mode(mode_name):
+            getattr(net, CALCS[calc])(**kwargs)
+            return ModeResult(mode_name, _result_tables(net, calc))
+    except Exception:
+        return ModeResult(mode_name, error=traceback.format_exc())
+
+
+def _run_mode(mode_name: str, calc: str, kwargs: dict) -> 'ModeResult':
+    return _calc_mode(_net, mode_name, calc, kwargs)
+
+
+class ModeResult:
+    '''
+    Result of calculation of one mode
+    :param mode: name of mode
+    :param tables: copies of result tables (res_bus, res_line, ... or res_bus_sc, res_line_sc, ...)
+    :param error: traceback if calculation raised exception
+    '''
+    def __init__(self, mode: str, tables: dict | None = None, error: str | None = None):
+        self.mode = mode
+        self.tables = tables if tables is not None else {}
+        self.error = error
+
+    def __repr__(self):
+        state = 'error' if self.error else ', '.join(self.tables)
+        return f'ModeResult({self.mode!r}: {state})'
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    def __getitem__(self, table):
+        return self.tables[table]
+
+
+class ModeRunner:
+    '''
+    Parallel calculation of modes of net in processes. Net with modes is pickled once and every process keeps
+    its own copy of net, applies mode, calculates and restores values of mode.
+    Use as context manager or call close() to stop processes.
+    '''
+    def __init__(self, net: Net, max_workers: int | None = None):
+        '''
+        :param net: pandapowertools Net with modes in net.net['modes']
+        :param max_workers: number of processes, if None than number of processors
+        '''
+        self.modes = list(net.net['modes'])
+        self.max_workers = max_workers
+        self._data = pickle.dumps(net)
+        self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers, initializer=_init_worker,
+                                                 initargs=(self._data,))
+        return self._executor
+
+    def iter_results(self, modes: list | tuple | None = None, calc: str = 'pf', **kwargs):
+        '''
+        Calculates modes and yields ModeResult in order of completion
+        :param modes: names of modes, if None than all modes of net
+        :param calc: 'pf', 'pf_pgm' or 'sc'
+        :param kwargs: arguments for Net.calc_pf, Net.calc_pf_pgm or Net.calc_sc
+        '''
+        if calc not in CALCS:
+            raise ValueError(f'calc must be one of {tuple(CALCS)}')
+        if modes is None:
+            modes = self.modes
+        futures = [self.executor.submit(_run_mode, mode_name, calc, kwargs) for mode_name in modes]
+        for future in as_completed(futures):
+            yield future.result()
+
+    def run(self, modes: list | tuple | None = None, calc: str = 'pf', **kwargs) -> dict:
+        '''
+        Calculates modes and returns dict of ModeResult in order of modes
+        :param modes: names of modes without duplicates (results are keyed by name), if None than all modes of net
+        '''
+        if modes is None:
+            modes = self.modes
+        duplicates = [mode_name for mode_name, count in Counter(modes).items() if count > 1]
+        if duplicates:
+            raise ValueError(f'modes {duplicates} are repeated')
+        results = {result.mode: result for result in self.iter_results(modes, calc, **kwargs)}
+        return {mode_name: results[mode_name] for mode_name in modes}
@@ -0,0 +1,138 @@
+import os
+import json
+from importlib.util import find_spec
+
+
+import numpy as np
+import pandas as pd
+import pandapower as pp
+from pandapower.io_utils import PPJSONEncoder, PPJSONDecoder
+
+
+HEADER = '__header__'
+
+
+def _split_net(net: pp.pandapowerNet) -> tuple[str, dict]:
+    '''
+    Splits net into json header and numeric arrays. Numeric and bool columns and indexes of every table are stored in
+    one structured array, object columns, modes, std_types and other items are stored in header like in pp.to_json
+    :return: header, {table: structured array}
+    '''
+    header = {'tables': {}, 'items': {}}
+    arrays = {}
+    for key, item in net.items():
+        if key.startswith('_'):
+            continue
+        if not isinstance(item, pd.DataFrame):
+            header['items'][key] = item
+            continue
+        table = {'rows': len(item), 'columns': list(item.columns), 'dtypes': item.dtypes.astype(str).to_dict(),
+                 'index': list(item.index.names), 'index_dtypes': [], 'objects': {}}
+        fields = {}
+        levels = [item.index.get_level_values(i) for i in range(item.index.nlevels)]
+        columns = [(f'__index_{i}', level) for i, level in enumerate(levels)]
+        columns += [(column, item[column]) for column in item.columns]
+        for column, values in columns:
+            if column.startswith('__index_'):
+                table['index_dtypes'].append(str(values.dtype))
+            if values.dtype == object:
+                table['objects'][column] = values.tolist()
+            else:
+                fields[column] = values.to_numpy()
+        header['tables'][key] = table
+        if fields and len(item):
+            record = np.empty(len(item), dtype=[(column, values.dtype) for column, values in fields.items()])
+            for column, values in fields.items():
+                record[column] = values
+            arrays[key] = record
+    return json.dumps(header, cls=PPJSONEncoder), arrays
+
+
+def _is_default_table(item, table: dict) -> bool:
+    '''
+    Checks if empty table from pp.create_empty_network has the same columns, dtypes and index as saved table
+    '''
+    if not isinstance(item, pd.DataFrame) or not item.empty:
+        return False
+    index_dtypes = [str(item.index.get_level_values(i).dtype) for i in range(item.index.nlevels)]
+    return (list(item.columns) == table['columns'] and item.dtypes.astype(str).to_dict() == table['dtypes'] and
+            list(item.index.names) == table['index'] and index_dtypes == table['index_dtypes'])
+
+
+def _join_net(header: str, arrays) -> pp.pandapowerNet:
+    '''
+    Creates net from header and arrays created by _split_net
+    :param arrays: function with argument table returning structured array or DataFrame of numeric columns
+    '''
+    header = json.loads(header, cls=PPJSONDecoder)
+    net = pp.create_empty_network()
+    net.update(header['items'])
+    for key, table in header['tables'].items():
+        if not table['rows'] and _is_default_table(net.get(key), table):
+            continue
+        objects = table['objects']
+        record = arrays(key) if table['rows'] and len(objects) < len(table['columns']) + len(table['index_dtypes']) \
+            else None
+
+        def values(column, dtype):
+            if column in objects:
+                return pd.Series(objects[column], dtype=object).to_numpy()
+            if record is None:
+                return np.empty(0, dtype=dtype)
+            return np.asarray(record[column])
+
+        levels = [pd.Index(values(f'__index_{i}', dtype), dtype=dtype, name=table['index'][i])
+                  for i, dtype in enumerate(table['index_dtypes'])]
+        index = levels[0] if len(levels) == 1 else pd.MultiIndex.from_arrays(levels)
+        data = {column: values(column, table['dtypes'][column]) for column in table['columns']}
+        frame = pd.DataFrame(data, columns=table['columns'], index=index, copy=False)
+        dtypes = {column: dtype for column, dtype in table['dtypes'].items() if str(frame[column].dtype) != dtype}
+        net[key] = frame.astype(dtypes) if dtypes else frame
+    pp.convert_format(net)
+    return net
+
+
+def to_npz(net: pp.pandapowerNet, path: str):
+    '''
+    Saves net to uncompressed npz file with one structured array for every table
+    '''
+    header, arrays = _split_net(net)
+    with open(path, 'wb') as f:
+        np.savez(f, **{HEADER: np.array(header)}, **arrays)
+
+
+def from_npz(path: str) -> pp.pandapowerNet:
+    '''
+    Loads net saved by to_npz. Arrays are read from file only for not empty tables
+    '''
+    with np.load(path, allow_pickle=False) as data:
+        return _join_net(str(data[HEADER]), data.__getitem__)
+
+
+def _require_pyarrow():
+    if find_spec('pyarrow') is None:
+        raise ImportError('parquet format requires pyarrow: pip install pandapowertools[parquet] or pyarrow')
+
+
+def to_parquet(net: pp.pandapowerNet, path: str):
+    '''
+    Saves net to directory with header.json and parquet file for every not empty table (requires pyarrow)
+    '''
+    _require_pyarrow()
+    header, arrays = _split_net(net)
+    os.makedirs(path, exist_ok=True)
+    with open(os.path.join(path, 'header.json'), 'w', encoding='utf-8') as f:
+        f.write(header)
+    for key, record in arrays.items():
+        pd.DataFrame(record).to_parquet(os.path.join(path, f'{key}.parquet'), engine='pyarrow', index=False)
+
+
+def from_parquet(path: str) -> pp.pandapowerNet:
+    '''
+    Loads net saved by to_parquet. Parquet files are memory mapped (requires pyarrow)
+    '''
+    _require_pyarrow()
+    with open(os.path.join(path, 'header.json'), encoding='utf-8') as f:
+        header = f.read()
+    return _join_net(header, lambda key: pd.read_parquet(os.path.join(path, f'{key}.parquet'), engine='pyarrow',
+                                                         memory_map=True))
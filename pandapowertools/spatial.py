@@ -0,0 +1,145 @@
+import math
+
+
+import numpy as np
+
+
+from pandapowertools.layout import _busbars
+
+
+class GridIndex:
+    '''
+    Grid spatial index of buses by coordinates of bus_geodata: point (x, y) and busbar (coords). Built on first query
+    and then updated incrementally by Net when coordinates of buses are changed. Call invalidate() after direct
+    changes of bus_geodata.
+    '''
+    def __init__(self, net, cell: float | None = None):
+        '''
+        :param net: pandapowertools Net
+        :param cell: size of grid cell, if None then extent of buses divided by sqrt of number of buses
+        '''
+        self._net = net
+        self.cell = cell
+        self._key = None
+        self._size = None
+        self._cells = {}
+        self._points = {}
+        self._busbars = {}
+        self._boxes = {}
+
+    def _table_key(self):
+        geodata = self._net.net.bus_geodata
+        return id(self._net.net), id(geodata), len(geodata)
+
+    def _geometry(self, buses) -> tuple:
+        '''
+        :return: points n x 2, busbars n x 4 (xmin, ymin, xmax, ymax) and boxes n x 4 of point and busbar,
+        nan for buses without coordinates
+        '''
+        geodata = self._net.net.bus_geodata
+        buses = np.asarray(buses)
+        points = np.full((len(buses), 2), np.nan)
+        if {'x', 'y'} <= set(geodata.columns):
+            points = geodata[['x', 'y']].reindex(buses).to_numpy(dtype=float)
+        busbar = _busbars(self._net.net, buses)
+        busbars = np.concatenate([busbar.min(axis=1), busbar.max(axis=1)], axis=1)
+        xs = np.concatenate([points[:, None, 0], busbar[:, :, 0]], axis=1)
+        ys = np.concatenate([points[:, None, 1], busbar[:, :, 1]], axis=1)
+        boxes = np.stack([np.fmin.reduce(xs, axis=1), np.fmin.reduce(ys, axis=1), np.fmax.reduce(xs, axis=1),
+                          np.fmax.reduce(ys, axis=1)], axis=1)
+        return points, busbars, boxes
+
+    def _cell_range(self, box) -> tuple:
+        xmin, ymin, xmax, ymax = box
+        size = self._size
+        return (range(math.floor(xmin / size), math.floor(xmax / size) + 1),
+                range(math.floor(ymin / size), math.floor(ymax / size) + 1))
+
+    def _insert(self, bus, point, busbar, box):
+        if np.isnan(box).any():
+            return
+        self._points[bus] = tuple(point)
+        if not np.isnan(busbar).any():
+            self._busbars[bus] = tuple(busbar)
+        self._boxes[bus] = tuple(box)
+        columns, rows = self._cell_range(box)
+        for i in columns:
+            for j in rows:
+                self._cells.setdefault((i, j), set()).add(bus)
+
+    def _remove(self, bus):
+        box = self._boxes.pop(bus, None)
+        self._points.pop(bus, None)
+        self._busbars.pop(bus, None)
+        if box is None:
+            return
+        columns, rows = self._cell_range(box)
+        for i in columns:
+            for j in rows:
+                self._cells[(i, j)].discard(bus)
+
+    def _build(self):
+        buses = self._net.net.bus_geodata.index
+        points, busbars, boxes = self._geometry(buses)
+        valid = ~np.isnan(boxes).any(axis=1)
+        self._size = self.cell
+        if self._size is None:
+            extent = np.ptp(boxes[valid], axis=0).max(initial=0) if valid.any() else 0
+            self._size = extent / math.sqrt(valid.sum()) if extent > 0 else 1.
+        self._cells, self._points, self._busbars, self._boxes = {}, {}, {}, {}
+        for bus, point, busbar, box in zip(buses, points, busbars, boxes):
+            self._insert(bus, point, busbar, box)
+        self._key = self._table_key()
+
+    def _check(self):
+        if self._key != self._table_key():
+            self._build()
+
+    def invalidate(self):
+        self._key = None
+
+    def update(self, buses):
+        '''
+        Updates buses after their coordinates are changed, added or removed
+        :param buses: index or list of indexes
+        '''
+        if self._key is None or self._key[:2] != self._table_key()[:2]:
+            self._key = None
+            return
+        buses = list(np.atleast_1d(buses))
+        points, busbars, boxes = self._geometry(buses)
+        for bus, point, busbar, box in zip(buses, points, busbars, boxes):
+            self._remove(bus)
+            self._insert(bus, point, busbar, box)
+        self._key = self._table_key()
+
+    def _candidates(self, x1, y1, x2, y2) -> set:
+        columns, rows = self._cell_range((x1, y1, x2, y2))
+        if len(columns) * len(rows) > len(self._boxes):
+            return set(self._boxes)
+        res = set()
+        for i in columns:
+            for j in rows:
+                res |= self._cells.get((i, j), set())
+        return res
+
+    def rect(self, x1, y1, x2, y2, busbar: bool = False) -> list:
+        '''
+        Buses with point inside rectangle
+        :param busbar: select also buses with busbar crossing rectangle
+        :return: list of buses in order of bus_geodata
+        '''
+        self._check()
+        x1, x2 = min(x1, x2), max(x1, x2)
+        y1, y2 = min(y1, y2), max(y1, y2)
+        res = []
+        for bus in self._candidates(x1, y1, x2, y2):
+            x, y = self._points[bus]
+            if x1 <= x <= x2 and y1 <= y <= y2:
+                res.append(bus)
+            elif busbar and bus in self._busbars:
+                xmin, ymin, xmax, ymax = self._busbars[bus]
+                if xmin <= x2 and x1 <= xmax and ymin <= y2 and y1 <= ymax:
+                    res.append(bus)
+        order = self._net.net.bus_geodata.index.get_indexer(res)
+        return [res[k] for k in np.argsort(order)]
@@ -1,17 +1,72 @@
 import math
 
+import numpy as np
 from textengines.interfaces import *
 
-from pandapowertools.functions import split_str, define_c
+from pandapowertools.functions import define_c, text_layout
+from pandapowertools.drawlist import DrawList
 
 
 dx = 2
 r = 0.1
 text_size = 0.2
 
+_templates = {}
+
+def instance(name: str, glyph, te: TextEngine, x, y, angle: float = 0.):
+    '''
+    Draw glyph as instance of template. Template is drawn by glyph(te) around (0, 0) once for every name
+    and is placed by reference with block and insert if te supports them (DrawList, DXF), otherwise
+    as transformed copy
+    :param glyph: function drawing template
+    :param angle: in radians
+    '''
+    template = _templates.get(name)
+    if template is None:
+        template = _templates[name] = DrawList()
+        glyph(template)
+    if hasattr(te, 'block') and hasattr(te, 'insert'):
+        te.block(name, template)
+        te.insert(name, x, y, math.degrees(angle))
+    else:
+        template.instances([(x, y)], [math.degrees(angle)]).flush(te)
+
 def node_draw(x, y, te: TextEngine):
     te.circle(x, y, r=r, black=True)
 
+def text_rows(text: str | list[str], length: int) -> tuple:
+    '''
+    Rows of multirows text in order of drawing from bottom to top (text_layout for every item)
+    :return: list of rows, array of bool - row is part of long item, width of text in chars
+    '''
+    if isinstance(text, str):
+        text = [text]
+    rows = []
+    counts = []
+    width = 0
+    for t in text:
+        layout, layout_width, n = text_layout(t, length)
+        rows.extend(layout[::-1])
+        counts.append(n)
+        width = max(width, layout_width)
+    long = np.repeat(np.array([len(t) > length for t in text], dtype=bool), counts)
+    return rows, long, width
+
+def row_anchors(x, y, n: int, dx: float = 0., dy: float = 0., angle=0., xcenter=None, ycenter=None) -> tuple:
+    '''
+    Anchors of n rows of text in one NumPy pass: row k is placed at (x + k * dx, y + k * dy) and turned
+    around (xcenter, ycenter), by default around (x, y)
+    :param angle: in radians, number or array for every row
+    :return: arrays x, y
+    '''
+    k = np.arange(n)
+    xcenter = x if xcenter is None else xcenter
+    ycenter = y if ycenter is None else ycenter
+    xs = x + k * dx - xcenter
+    ys = y + k * dy - ycenter
+    cos, sin = np.cos(angle), np.sin(angle)
+    return xcenter + xs * cos - ys * sin, ycenter + xs * sin + ys * cos
+
 def label_draw(x, y, text: str | list[str], te: TextEngine, angle: float = 0.,
                length: int = 8):
     '''
@@ -22,32 +77,15 @@ def label_draw(x, y, text: str | list[str], te: TextEngine, angle: float = 0.,
     :param te: TextEngine
     :param angle: in radians, 0 radian is horizontal
     :param length: max number chars in row
-    :return:
+    :return: extents of label before turn: width (text_size per char) and height of rows
     '''
-
-    if isinstance(text, str):
-        text = [text]
+    rows, _, width = text_rows(text, length)
     dy = text_size * 1.2
-    x_init, y_init = x, y
-    for t in text:
-        if len(t) > length:
-            txts = split_str(t, length)
-            for txt in txts[::-1]:
-                if angle:
-                    x_turned, y_turned = turn(x, y, x_init, y_init, angle)
-                else:
-                    x_turned, y_turned = x, y
-                te.label(x_turned, y_turned, text=txt, s=text_size, place='c',
-                         angle=math.degrees(angle))
-                y += dy
-        else:
-            if angle:
-                x_turned, y_turned = turn(x, y, x_init, y_init, angle)
-            else:
-                x_turned, y_turned = x, y
-            te.label(x_turned, y_turned, text=t, s=text_size, place='c',
-                     angle=math.degrees(angle))
-            y += dy
+    xs, ys = row_anchors(x, y, len(rows), dy=dy, angle=angle)
+    angle_degree = math.degrees(angle)
+    for row, x_row, y_row in zip(rows, xs.tolist(), ys.tolist()):
+        te.label(x_row, y_row, text=row, s=text_size, place='c', angle=angle_degree)
+    return width * text_size, len(rows) * dy
 
 
 def bus_draw(coords, te: TextEngine):
@@ -71,6 +109,25 @@ def turn(x, y, xcenter, ycenter, angle):
     y_res = ycenter + (x - xcenter) * math.sin(angle) + (y - ycenter) * math.cos(angle)
     return x_res, y_res
 
+def rotate(points, xcenter, ycenter, angle) -> np.ndarray:
+    '''
+    Vectorized turn for array of points
+    :param points: array n x 2
+    :param angle: in radians
+    :return: array n x 2
+    '''
+    cos, sin = math.cos(angle), math.sin(angle)
+    center = np.array([xcenter, ycenter])
+    return (np.asarray(points, dtype=float) - center) @ np.array([[cos, sin], [-sin, cos]]) + center
+
+def _switch_glyph(te: TextEngine, closed: bool = True):
+    size = r * 2
+    te.lines((-size, size), (size, size), (size, -size), (-size, -size), cycle=True)
+    if closed:
+        te.lines((-size, 0), (size, 0))
+    else:
+        te.lines((0, size), (0, -size))
+
 def switch_draw(x, y, angle, te: TextEngine, closed: bool = True, text: str = ''):
     '''
     Draw switch on text engine
@@ -83,29 +140,16 @@ def switch_draw(x, y, angle, te: TextEngine, closed: bool = True, text: str = ''
     :return: list of 2 tuples with coordinates to connect lines to switch on the left
     and right sides
     '''
-    size = r *2
-    xlt = xlb = x - size
-    xrt = xrb = x + size
-    ylt = yrt = y + size
-    ylb = yrb = y - size
-    coords = []
-    for xc, yc in ((xlt, ylt), (xrt, yrt), (xrb, yrb), (xlb, ylb),
-                   (x, y + size), (x, y - size),
-                   (x - size, y), (x + size, y)):
-        coords.append(turn(xc, yc, x, y, angle))
-    te.lines(*coords[:-4], cycle=True)
-    if closed:
-        te.lines(coords[-2], coords[-1])
-    else:
-        te.lines(coords[-4], coords[-3])
-    return coords[-2:]
+    instance('switch_closed' if closed else 'switch_open', lambda t: _switch_glyph(t, closed), te, x, y, angle)
+    size = r * 2
+    return list(map(tuple, rotate(((x - size, y), (x + size, y)), x, y, angle).tolist()))
 
 
 def _switch_bus(x1, y1, x2, y2, te: TextEngine, closed: bool = False):
     middle_x = (x1 + x2) / 2
     middle_y = (y1 + y2) / 2
     angle = math.atan2(y2-y1, x2-x1)
-    coords = _switch(middle_x, middle_y, angle, te, closed)
+    coords = switch_draw(middle_x, middle_y, angle, te, closed)
     te.lines((x1, y1), coords[0])
     te.lines((x2, y2), coords[1])
 
@@ -115,7 +159,7 @@ def _switch_line(x1, y1, x2, y2, te: TextEngine, closed: bool = False):
     x = x1 + (x2 - x1) / k
     y = y1 + (y2 - y1) / k
     angle = math.atan2(y2-y1, x2-x1)
-    _switch(x, y, angle, te, closed)
+    switch_draw(x, y, angle, te, closed)
 
 def _resistor(x, y, angle, te: TextEngine):
     size_x = r * 1.5
@@ -124,10 +168,8 @@ def _resistor(x, y, angle, te: TextEngine):
     xrt = xrb = x + size_x
     ylt = yrt = y + size_y
     ylb = yrb = y - size_y
-    coords = []
-    for xc, yc in ((xlt, ylt), (xrt, yrt), (xrb, yrb), (xlb, ylb),
-                   (x, y + size_y), (x, y - size_y)):
-        coords.append(_turn(xc, yc, x, y, angle))
+    coords = list(map(tuple, rotate(((xlt, ylt), (xrt, yrt), (xrb, yrb), (xlb, ylb),
+                                     (x, y + size_y), (x, y - size_y)), x, y, angle).tolist()))
     te.lines(*coords[:-2], cycle=True)
     return coords[-2:]
 
@@ -140,30 +182,20 @@ def _reactor(x1, y1, x2, y2, te: TextEngine, text: list[str] | str = '', length:
     te.circle(x1, y_midle, r=r_impedance, st_angle=180, en_angle=90, black=False)
     te.lines((x1, y1), (x2, y_midle+r_impedance))
     te.lines((x2, y2), (x1, y_midle), (x1-r_impedance, y_midle))
-    if isinstance(text, str):
-        text = [text]
-    dy = text_size * 1.2
-    for t in text:
-        if len(t) > length:
-            txts = split_str(t, length)
-            for txt in txts[::-1]:
-                te.label(x1 + r_impedance-r, y_midle, text=txt, place='e', s=text_size)
-                y_midle += dy
-        else:
-            te.label(x1 + r_impedance - r, y_midle, text=t, place='e', s=text_size)
-            y_midle += dy
+    rows, _, _ = text_rows(text, length)
+    xs, ys = row_anchors(x1 + r_impedance - r, y_midle, len(rows), dy=text_size * 1.2)
+    for row, x_row, y_row in zip(rows, xs.tolist(), ys.tolist()):
+        te.label(x_row, y_row, text=row, place='e', s=text_size)
 
 def _impedance(coord1, coord2, te: TextEngine, text: list[str] | str = '', length: int = 20):
-    if isinstance(text, str):
-        text = [text]
     x1, y1 = coord1
     x2, y2 = coord2
     middle_x = (x1 + x2) / 2
     middle_y = (y1 + y2) / 2
     angle = math.atan2(x1-x2, y2-y1)
     coords = _resistor(middle_x, middle_y, angle, te)
-    x1, y1 = _turn(x1, y1 + r, x1, y1, angle)
-    x2, y2 = _turn(x2, y2 - r, x2, y2, angle)
+    x1, y1 = turn(x1, y1 + r, x1, y1, angle)
+    x2, y2 = turn(x2, y2 - r, x2, y2, angle)
     te.lines((x1, y1), coords[1])
     te.lines((x2, y2), coords[0])
     y = (y1 + y2) / 2
@@ -172,31 +204,18 @@ def _impedance(coord1, coord2, te: TextEngine, text: list[str] | str = '', lengt
     angle_degree = math.degrees(angle) + 90
     if 180 <= angle_degree <= 360:
         angle_degree -= 180
-    for t in text:
-        if len(t) > length:
-            txts = split_str(t, length)
-            for txt in txts[::-1]:
-                x_turned, y_turned = _turn(x, y, middle_x, middle_y, angle)
-                te.label(x_turned, y_turned, text=txt, s=text_size, place='c', angle=angle_degree)
-                x -= dx
-        else:
-            te.label(x, y, text=t, s=text_size, place='c', angle=angle_degree)
-            x -= dx
+    rows, long, _ = text_rows(text, length)
+    xs, ys = row_anchors(x, y, len(rows), dx=-dx, angle=np.where(long, angle, 0.), xcenter=middle_x,
+                         ycenter=middle_y)
+    for row, x_row, y_row in zip(rows, xs.tolist(), ys.tolist()):
+        te.label(x_row, y_row, text=row, s=text_size, place='c', angle=angle_degree)
 
 
-def _trafo(x1, y1, x2, y2, text, te: TextEngine, length: int = 6, vector_group: str = ''):
-    if y2 > y1:
-        x1, y1, x2, y2 = x2, y2, x1, y1
-    x1 = x2
-    y2 += r
-    y1 -= r
-    y_midle = (y1 + y2) / 2
+def _trafo_glyph(te: TextEngine, vector_group: str = '', x1=0, y_midle=0):
     r_trafo = r * 4
     r2 = r * 2
     te.circle(x1, y_midle+r_trafo-r, r=r_trafo, black=False)
     te.circle(x1, y_midle-r_trafo+r, r=r_trafo, black=False)
-    te.lines((x1, y1), (x2, y_midle+r_trafo * 2 - r))
-    te.lines((x2, y2), (x1, y_midle-r_trafo * 2 + r))
     if vector_group:
         if 'D' in vector_group:
             y = y_midle + r_trafo - r
@@ -220,33 +239,29 @@ def _trafo(x1, y1, x2, y2, text, te: TextEngine, length: int = 6, vector_group:
         if 'n' in vector_group:
             y = y_midle - r_trafo + r
             te.lines((x1, y), (x1 + r2, y))
-    if isinstance(text, str):
-        text = [text]
-    dy = text_size * 1.2
-    for t in text:
-        if len(t) > length:
-            txts = split_str(t, length)
-            for txt in txts[::-1]:
-                te.label(x1 + r_trafo-r, y_midle, text=txt, place='e', s=text_size)
-                y_midle += dy
-        else:
-            te.label(x1 + r_trafo - r, y_midle, text=t, place='e', s=text_size)
-            y_midle += dy
 
-def _trafo3w(x1, y1, x2, y2, x3, y3, text, te: TextEngine, vector_group: str = ''):
-    y1 -= r
+def _trafo(x1, y1, x2, y2, text, te: TextEngine, length: int = 6, vector_group: str = ''):
+    if y2 > y1:
+        x1, y1, x2, y2 = x2, y2, x1, y1
+    x1 = x2
     y2 += r
-    y3 += r
-    y_midle = (y1 + max(y2, y3)) / 2
+    y1 -= r
+    y_midle = (y1 + y2) / 2
+    r_trafo = r * 4
+    instance(f'trafo_{vector_group}', lambda t: _trafo_glyph(t, vector_group), te, x1, y_midle)
+    te.lines((x1, y1), (x2, y_midle+r_trafo * 2 - r))
+    te.lines((x2, y2), (x1, y_midle-r_trafo * 2 + r))
+    rows, _, _ = text_rows(text, length)
+    xs, ys = row_anchors(x1 + r_trafo - r, y_midle, len(rows), dy=text_size * 1.2)
+    for row, x_row, y_row in zip(rows, xs.tolist(), ys.tolist()):
+        te.label(x_row, y_row, text=row, place='e', s=text_size)
+
+def _trafo3w_glyph(te: TextEngine, vector_group: str = '', x1=0, y_midle=0):
     r_trafo = r * 4
     r2 = r * 2
     te.circle(x1, y_midle+r_trafo-r, r=r_trafo, black=False)
     te.circle(x1-r2-r, y_midle-r_trafo+r, r=r_trafo, black=False)
     te.circle(x1+r2+r, y_midle-r_trafo+r, r=r_trafo, black=False)
-    te.lines((x1, y1), (x1, y_midle+r_trafo * 2 - r))
-    y = y_midle-r_trafo + r
-    te.lines((x2, y2), (x2, y), (x1-r2-r-r_trafo, y))
-    te.lines((x3, y3), (x3, y), (x1+r2+r+r_trafo, y))
     if vector_group:
         w = n = -r_trafo + r
         for letter in vector_group:
@@ -277,6 +292,19 @@ def _trafo3w(x1, y1, x2, y2, x3, y3, text, te: TextEngine, vector_group: str = '
             if letter == 'n':
                 te.lines((x1 + n, y), (x1 + r2 + n, y))
                 n = -n
+
+def _trafo3w(x1, y1, x2, y2, x3, y3, text, te: TextEngine, vector_group: str = ''):
+    y1 -= r
+    y2 += r
+    y3 += r
+    y_midle = (y1 + max(y2, y3)) / 2
+    r_trafo = r * 4
+    r2 = r * 2
+    instance(f'trafo3w_{vector_group}', lambda t: _trafo3w_glyph(t, vector_group), te, x1, y_midle)
+    te.lines((x1, y1), (x1, y_midle+r_trafo * 2 - r))
+    y = y_midle-r_trafo + r
+    te.lines((x2, y2), (x2, y), (x1-r2-r-r_trafo, y))
+    te.lines((x3, y3), (x3, y), (x1+r2+r+r_trafo, y))
     if isinstance(text, str):
         text = [text]
     dy = text_size * 1.2
@@ -285,7 +313,7 @@ def _trafo3w(x1, y1, x2, y2, x3, y3, text, te: TextEngine, vector_group: str = '
         te.label(x1 + r + r_trafo, y_midle, text=t, place='e', s=text_size)
         y_midle -= dy
 
-def ext_grid_draw(x, y, te: TextEngine):
+def _ext_grid_glyph(te: TextEngine, x=0, y=0):
     d = 0.5
     d2 = d * 2
     d3 = d * 3
@@ -300,37 +328,46 @@ def ext_grid_draw(x, y, te: TextEngine):
     te.lines((x+d, y+d3+dy), (x, y+d4+dy))
     te.lines((x, y+d2+dy), (x-d, y+d3+dy))
 
-def gen_draw(x, y, text, te: TextEngine):
-    d = 0.5
-    d2 = d * 2
+def ext_grid_draw(x, y, te: TextEngine):
+    instance('ext_grid', _ext_grid_glyph, te, x, y)
+
+def _gen_glyph(te: TextEngine, x=0, y=0):
     r_gen = r * 4
     y_midle = y - r_gen * 2
     te.lines((x, y-r), (x, y - r_gen))
     te.circle(x, y_midle, r_gen)
+    te.label(x, y_midle, 'G', 'c', s=text_size)
+    te.label(x, y_midle, '~', 's', s=text_size)
+
+def gen_draw(x, y, text, te: TextEngine):
+    r_gen = r * 4
+    y_midle = y - r_gen * 2
+    instance('gen', _gen_glyph, te, x, y)
     if isinstance(text, str):
         text = [text]
     dy = text_size * 1.2
-    te.label(x, y_midle, 'G', 'c', s=text_size)
-    te.label(x, y_midle, '~', 's', s=text_size)
     for t in text:
         te.label(x + r + r_gen, y_midle, text=t, place='e', s=text_size)
         y_midle -= dy
 
-def _capacitor(x, y, text, te: TextEngine):
+def _capacitor_glyph(te: TextEngine, x=0, y=0):
     d = r * 7
     w = r * 5
-    w2 = r * 2
     te.lines((x, y-r), (x, y-d))
     te.lines((x, y-d-r-d), (x, y-d-r))
     te.lines((x-w, y-d), (x+w, y-d))
     te.lines((x-w, y-d-r), (x+w, y-d-r))
+
+def _capacitor(x, y, text, te: TextEngine):
+    w2 = r * 2
+    instance('capacitor', _capacitor_glyph, te, x, y)
     # _ground(x, y - d - d, te)
     dy = text_size * 1.2
     for t in text:
         te.label(x + w2, y - r, text=t, place='e', s=text_size)
         y -= dy
 
-def _ground(x, y, te: TextEngine):
+def _ground_glyph(te: TextEngine, x=0, y=0):
     w1 = r * 3
     w2 = r * 2
     w3 = r
@@ -338,3 +375,5 @@ def _ground(x, y, te: TextEngine):
     te.lines((x-w2, y-r), (x+w2, y-r))
     te.lines((x-w3, y-r*2), (x+w3, y-r*2))
 
+def _ground(x, y, te: TextEngine):
+    instance('ground', _ground_glyph, te, x, y)
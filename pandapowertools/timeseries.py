@@ -0,0 +1,105 @@
+import numpy as np
+import pandas as pd
+import pandapower as pp
+
+
+from pandapowertools.convergence import run_pf, NOT_CONVERGED
+
+
+PROFILE_ELEMENTS = ('load', 'sgen', 'ext_grid')
+DEFAULT_OUTPUTS = (('res_bus', 'vm_pu'), ('res_line', 'loading_percent'))
+TOLERANCE = 1e-8
+
+
+def _profile_groups(net, profiles: pd.DataFrame) -> list:
+    '''
+    Столбцы графиков, сгруппированные по (element, param)
+    :return: список (element, param, index, values), values - массив шаги x элементы
+    '''
+    if profiles.columns.nlevels != 3:
+        raise ValueError('Columns of profiles must be (element, param, index)')
+    elements = profiles.columns.get_level_values(0)
+    params = profiles.columns.get_level_values(1)
+    unknown = set(elements) - set(PROFILE_ELEMENTS)
+    if unknown:
+        raise ValueError(f'Profiles of {unknown} are not supported, only {PROFILE_ELEMENTS}')
+    values = profiles.to_numpy(dtype=float)
+    groups = []
+    for element, param in dict.fromkeys(zip(elements, params)):
+        mask = (elements == element) & (params == param)
+        index = profiles.columns.get_level_values(2)[mask]
+        missing = index.difference(net.net[element].index)
+        if len(missing):
+            raise ValueError(f'Unknown {element} {list(missing)} in profiles')
+        groups.append((element, param, list(index), values[:, mask]))
+    return groups
+
+
+def _runpp(net, recycle: dict, backend: str, init: str = 'auto') -> bool:
+    '''
+    Расчёт потокораспределения pandapower с одинаковыми параметрами для всех шагов
+    :return: расчёт сошёлся
+    '''
+    try:
+        pp.runpp(net.net, algorithm='nr', init=init, tolerance_mva=TOLERANCE, calculate_voltage_angles=False,
+                 check_connectivity=True, distributed_slack=False, recycle=recycle,
+                 lightsim2grid=backend == 'lightsim2grid')
+    except NOT_CONVERGED:
+        return False
+    return bool(net.net._ppc['success'])
+
+
+def _full_pf(net, recycle: dict, backend: str) -> bool:
+    '''
+    Расчёт потокораспределения с построением схемы замещения и сохранением внутренних переменных pandapower
+    для следующих шагов. При отсутствии сходимости используются стратегии run_pf
+    '''
+    net.net['_ppc'] = None
+    if _runpp(net, recycle, backend):
+        return True
+    if not run_pf(net, backend=backend).converged:
+        return False
+    net.net['_ppc'] = None
+    return _runpp(net, recycle, backend, init='results')
+
+
+def run_timeseries(net, profiles: pd.DataFrame, outputs=DEFAULT_OUTPUTS, backend: str = 'pandapower') -> pd.DataFrame:
+    '''
+    Расчёт потокораспределения для каждого шага графиков. Значения графиков записываются в таблицы элементов
+    одним присваиванием для каждой пары (element, param). Схема замещения, матрица узловых проводимостей и структура
+    матрицы Якоби строятся на первом шаге, следующие шаги рассчитываются pandapower с recycle от решения
+    предыдущего шага. При отсутствии сходимости шаг рассчитывается заново стратегиями run_pf.
+    Изменённые значения восстанавливаются после расчёта, в таблицах res_* остаются результаты последнего шага
+    :param net: pandapowertools Net
+    :param profiles: DataFrame с индексом - шагами и столбцами (element, param, index), например ('load', 'p_mw', 0),
+    element из PROFILE_ELEMENTS
+    :param outputs: список (таблица результатов, столбец), например ('res_bus', 'vm_pu')
+    :param backend: 'pandapower' или 'lightsim2grid'
+    :return: DataFrame с индексом profiles и столбцами (таблица, столбец, index). В attrs['converged'] массив
+    сходимости шагов, результаты шагов без сходимости - nan
+    '''
+    groups = _profile_groups(net, profiles)
+    recycle = {'bus_pq': True, 'trafo': False, 'gen': any(element == 'ext_grid' for element, *_ in groups)}
+    n = len(profiles)
+    arrays = [np.full((n, len(net.net[table.removeprefix('res_')])), np.nan) for table, _ in outputs]
+    converged = np.zeros(n, dtype=bool)
+    with net.mode():
+        for element, param, index, values in groups:
+            net._set(element, param, index, values[0])
+        for step in range(n):
+            if step:
+                for element, param, index, values in groups:
+                    net.net[element].loc[index, param] = values[step]
+            if step and converged[step - 1]:
+                converged[step] = _runpp(net, recycle, backend)
+            if not converged[step]:
+                converged[step] = _full_pf(net, recycle, backend)
+            if converged[step]:
+                for array, (table, column) in zip(arrays, outputs):
+                    array[step] = net.net[table][column].to_numpy()
+    columns = [(table, column, index) for table, column in outputs
+               for index in net.net[table.removeprefix('res_')].index]
+    result = pd.DataFrame(np.hstack(arrays), index=profiles.index,
+                          columns=pd.MultiIndex.from_tuples(columns, names=['table', 'column', 'index']))
+    result.attrs['converged'] = converged
+    return result
@@ -0,0 +1,280 @@
+import math
+
+
+import numpy as np
+from scipy.sparse.linalg import splu
+from pandapower import pandapowerNet
+from pandapower.build_branch import _end_temperature_correction_factor
+from pandapower.pypower.idx_brch import F_BUS, T_BUS, BR_R, BR_X, BR_B, BR_STATUS
+from pandapower.pypower.makeYbus import branch_vectors
+
+
+from pandapowertools.fault_location import _sequence_networks
+
+
+def _admittances(row: np.ndarray) -> np.ndarray:
+    '''
+    Матрица проводимостей ветви 2x2 [[yff, yft], [ytf, ytt]]
+    '''
+    ytt, yff, yft, ytf = branch_vectors(row[None], 1)
+    return np.array([[yff[0], yft[0]], [ytf[0], ytt[0]]])
+
+
+def ikss(fault: str, cu, z1, z0, zf: complex = 0):
+    '''
+    Начальный ток КЗ, кА, по сопротивлениям Тевенина в Ом (как в pandapower)
+    :param cu: c * Un, кВ
+    '''
+    if fault == '3ph':
+        k, z = 1 / math.sqrt(3), z1 + zf
+    elif fault == '2ph':
+        k, z = 0.5, z1 + zf
+    elif fault == '1ph':
+        k, z = math.sqrt(3), 2 * z1 + z0 + 3 * zf
+    else:
+        raise ValueError("fault must be '3ph', '2ph' or '1ph'")
+    return k * cu / np.abs(z)
+
+
+DIAG_BLOCK = 256
+
+
+class ZMatrix:
+    '''
+    Матрица узловых сопротивлений Z = Y^-1 без построения плотной обратной матрицы. Хранятся разложение LU исходной
+    матрицы узловых проводимостей Y0, диагональ Z0 = Y0^-1 (рассчитывается блоками по DIAG_BLOCK столбцов) и
+    столбцы и строки Z0 только для узлов u, проводимости между которыми изменены на dy. Текущая матрица
+    Z = (Y0 + dy)^-1 = Z0 - Z0[:, u] (I + dy Z0[u, u])^-1 dy Z0[u, :] (формула Вудбери), память O(n * len(u)).
+    Новые узлы добавляются к Y0 изолированными с единичной проводимостью, удаляемые узлы отключаются через dy
+    '''
+    def __init__(self, y_bus):
+        self.lu = splu(y_bus.tocsc())
+        self.n0 = self.n = y_bus.shape[0]
+        self.u = []
+        self.dy = np.zeros((0, 0), dtype=complex)
+        self._columns = np.zeros((self.n, 0), dtype=complex)
+        self._rows = np.zeros((0, self.n), dtype=complex)
+        self._diag0 = None
+        self._k = None
+        self._diag = None
+
+    def _solve(self, nodes, trans: bool = False) -> np.ndarray:
+        '''
+        Столбцы Z0 для узлов nodes (строки Z0, транспонированные, если trans)
+        :return: массив n x len(nodes)
+        '''
+        nodes = np.asarray(nodes, dtype=np.int64)
+        res = np.zeros((self.n, len(nodes)), dtype=complex)
+        base = nodes < self.n0
+        if base.any():
+            rhs = np.zeros((self.n0, base.sum()), dtype=complex)
+            rhs[nodes[base], np.arange(base.sum())] = 1
+            res[:self.n0, base] = self.lu.solve(rhs, trans='T' if trans else 'N')
+        res[nodes[~base], np.flatnonzero(~base)] = 1
+        return res
+
+    def diag0(self) -> np.ndarray:
+        if self._diag0 is None:
+            diag = np.ones(self.n, dtype=complex)
+            for start in range(0, self.n0, DIAG_BLOCK):
+                nodes = np.arange(start, min(start + DIAG_BLOCK, self.n0))
+                diag[nodes] = self._solve(nodes)[nodes, np.arange(len(nodes))]
+            self._diag0 = diag
+        return self._diag0
+
+    def add_nodes(self, count: int = 1) -> int:
+        '''
+        Добавляет изолированные узлы с единичной проводимостью
+        :return: номер первого нового узла
+        '''
+        first = self.n
+        self.n += count
+        self._columns = np.vstack([self._columns, np.zeros((count, len(self.u)), dtype=complex)])
+        self._rows = np.hstack([self._rows, np.zeros((len(self.u), count), dtype=complex)])
+        if self._diag0 is not None:
+            self._diag0 = np.concatenate([self._diag0, np.ones(count, dtype=complex)])
+        self._k = self._diag = None
+        return first
+
+    def update(self, nodes: list, dy: np.ndarray):
+        '''
+        Изменение проводимостей между узлами nodes на dy
+        '''
+        new = [node for node in dict.fromkeys(nodes) if node not in self.u]
+        if new:
+            self._columns = np.hstack([self._columns, self._solve(new)])
+            self._rows = np.vstack([self._rows, self._solve(new, trans=True).T])
+            self.u += new
+            dy_u = np.zeros((len(self.u), len(self.u)), dtype=complex)
+            dy_u[:len(self.dy), :len(self.dy)] = self.dy
+            self.dy = dy_u
+        local = [self.u.index(node) for node in nodes]
+        self.dy[np.ix_(local, local)] += dy
+        self._k = self._diag = None
+
+    def _correction(self) -> np.ndarray:
+        '''
+        (I + dy Z0[u, u])^-1 dy
+        '''
+        if self._k is None:
+            self._k = np.linalg.solve(np.eye(len(self.u)) + self.dy @ self._columns[self.u], self.dy)
+        return self._k
+
+    def columns(self, nodes) -> np.ndarray:
+        '''
+        Столбцы Z для узлов nodes, массив n x len(nodes)
+        '''
+        res = self._solve(nodes)
+        if self.u:
+            res -= self._columns @ (self._correction() @ self._rows[:, nodes])
+        return res
+
+    def rows(self, nodes) -> np.ndarray:
+        '''
+        Строки Z для узлов nodes, массив len(nodes) x n
+        '''
+        res = self._solve(nodes, trans=True).T
+        if self.u:
+            res -= self._columns[nodes] @ self._correction() @ self._rows
+        return res
+
+    def diag(self) -> np.ndarray:
+        '''
+        Диагональ Z - собственные сопротивления узлов
+        '''
+        if self._diag is None:
+            self._diag = self.diag0()
+            if self.u:
+                self._diag = self._diag - np.einsum('iu,ui->i', self._columns, self._correction() @ self._rows)
+        return self._diag
+
+
+class ZBus:
+    '''
+    Матрицы узловых сопротивлений прямой и нулевой последовательностей схемы расчёта КЗ pandapower (как в calc_sc).
+    Матрицы не строятся плотными (см. ZMatrix): хранятся разложения матриц узловых проводимостей, диагонали и
+    столбцы узлов, проводимости которых изменены. После изменения параметров линии, разделения линии и объединения
+    последовательных линий матрицы пересчитываются малоранговыми поправками (формула Вудбери) без построения схемы
+    замещения заново
+    '''
+    def __init__(self, net: pandapowerNet, case: str = 'max', lv_tol_percent: int = 10, zero_sequence: bool = True):
+        '''
+        :param net: сеть pandapower
+        :param case: 'max' или 'min'
+        :param zero_sequence: рассчитывать нулевую последовательность
+        branch, branch_lookup - строки ветвей ppc и их расположение по элементам при построении (не изменяются
+        split_line и merge_lines)
+        '''
+        self.case = case
+        self.base_mva, networks = _sequence_networks(net, case, lv_tol_percent, zero_sequence)
+        n = networks[0][0].shape[0]
+        lookup = net._pd2ppc_lookups['bus']
+        buses = net._is_elements_final['bus_is_idx']
+        self.position = {bus: int(lookup[bus]) for bus in buses if lookup[bus] < n}
+        self.z = [ZMatrix(y_bus) for y_bus, _ in networks]
+        self.branch = [branch for _, branch in networks]
+        self.branch_lookup = dict(net._pd2ppc_lookups['branch'])
+        start, end = self.branch_lookup.get('line', (0, 0))
+        self.rows = {line: [branch[start + i].copy() for _, branch in networks]
+                     for i, line in enumerate(net.line.index[:end - start])}
+
+    def diag(self, buses) -> list:
+        '''
+        Собственные сопротивления шин в о.е. для каждой последовательности, nan для шин вне схемы
+        '''
+        position = np.array([self.position.get(bus, -1) for bus in buses], dtype=np.int64)
+        result = []
+        for z in self.z:
+            d = np.full(len(buses), np.nan, dtype=complex)
+            d[position >= 0] = z.diag()[position[position >= 0]]
+            result.append(d)
+        return result
+
+    def has_line(self, line: int) -> bool:
+        '''
+        Линия в работе и её концы в схеме
+        '''
+        if line not in self.rows:
+            return False
+        row = self.rows[line][0]
+        n = self.z[0].n
+        return bool(row[BR_STATUS].real) and int(row[F_BUS].real) < n and int(row[T_BUS].real) < n
+
+    def line_rows(self, net: pandapowerNet, line: int) -> list:
+        '''
+        Строки ветви линии в о.е. по параметрам из net.line, как в pandapower для расчёта КЗ
+        '''
+        params = net.line.loc[line]
+        base_r = net.bus.at[params['from_bus'], 'vn_kv'] ** 2 / self.base_mva
+        length = params['length_km'] / params['parallel']
+        kt = 1
+        if self.case == 'min':
+            kt = _end_temperature_correction_factor(net, short_circuit=True)
+            kt = kt[net.line.index.get_loc(line)] if np.ndim(kt) else kt
+        rows = []
+        for row, (r, x, c) in zip(self.rows[line], (('r_ohm_per_km', 'x_ohm_per_km', None),
+                                                    ('r0_ohm_per_km', 'x0_ohm_per_km', 'c0_nf_per_km'))):
+            row = row.copy()
+            row[BR_R] = params[r] * length / base_r * kt
+            row[BR_X] = params[x] * length / base_r
+            if c is not None:
+                row[BR_B] = 2 * net.f_hz * math.pi * params[c] * 1e-9 * base_r * params['length_km'] * \
+                    params['parallel']
+            rows.append(row)
+        return rows
+
+    def update_line(self, line: int, rows: list):
+        '''
+        Изменение параметров линии
+        :param rows: новые строки ветви (см. line_rows)
+        '''
+        for k, row in enumerate(rows):
+            old = self.rows[line][k]
+            self.z[k].update([int(old[F_BUS].real), int(old[T_BUS].real)], _admittances(row) - _admittances(old))
+            self.rows[line][k] = row
+
+    def split_line(self, line: int, fraction: float, bus: int, new_line: int):
+        '''
+        Разделение линии шиной bus: линия line становится участком до bus, new_line - участком от bus
+        :param fraction: расстояние до bus в долях длины линии
+        '''
+        for k, row in enumerate(self.rows[line]):
+            f = self.z[k].add_nodes()
+            a, b = int(row[F_BUS].real), int(row[T_BUS].real)
+            row1, row2 = row.copy(), row.copy()
+            for column in (BR_R, BR_X, BR_B):
+                row1[column] *= fraction
+                row2[column] *= 1 - fraction
+            row1[T_BUS] = f
+            row2[F_BUS] = f
+            dy = np.zeros((3, 3), dtype=complex)
+            dy[:2, :2] -= _admittances(row)
+            dy[np.ix_([0, 2], [0, 2])] += _admittances(row1)
+            dy[np.ix_([2, 1], [2, 1])] += _admittances(row2)
+            dy[2, 2] -= 1
+            self.z[k].update([a, b, f], dy)
+            self.rows[line][k] = row1
+            self.rows.setdefault(new_line, [None] * len(self.z))[k] = row2
+        self.position[bus] = f
+
+    def merge_lines(self, line1: int, line2: int, bus: int, rows: list):
+        '''
+        Объединение последовательных линий line1 и line2 с общей шиной bus, к которой больше ничего
+        не подключено, в линию line1. Узел шины bus остаётся в матрицах изолированным
+        :param rows: строки ветви объединённой линии (см. line_rows)
+        '''
+        m = self.position.pop(bus)
+        merged = []
+        for k, row in enumerate(rows):
+            u = []
+            for old in (self.rows[line1][k], self.rows[line2][k]):
+                ends = [int(old[F_BUS].real), int(old[T_BUS].real)]
+                self.z[k].update(ends, -_admittances(old))
+                u.append(ends[1] if ends[0] == m else ends[0])
+            row = row.copy()
+            row[F_BUS], row[T_BUS] = u
+            self.z[k].update(u, _admittances(row))
+            self.z[k].update([m], np.ones((1, 1)))
+            merged.append(row)
+        del self.rows[line2]
+        self.rows[line1] = merged
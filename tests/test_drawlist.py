@@ -0,0 +1,96 @@
+import math
+
+
+import numpy as np
+
+
+from pandapowertools.drawlist import DrawList
+from pandapowertools.functions import split_str, text_layout
+
+
+class Recorder:
+    def __init__(self):
+        self.calls = []
+
+    def lines(self, *points, cycle=False):
+        self.calls.append(('lines', points, cycle))
+
+    def circle(self, x, y, r, **kwargs):
+        self.calls.append(('circle', (x, y, r), kwargs))
+
+    def label(self, x, y, text, place='c', **kwargs):
+        self.calls.append(('label', (x, y, text, place), kwargs))
+
+
+def test_drawlist():
+    dl = DrawList()
+    dl.lines((0, 0), (1, 0), (1, 1), cycle=True)
+    dl.lines((0, 0, 0.2, 0.2), (0, 2, 0.2, 0.2))
+    dl.circle(1, 1, r=0.5, black=True)
+    dl.circle(2, 2, 0.4, st_angle=180, en_angle=90)
+    dl.label(3, 3, 'G', 'c', s=0.2)
+    dl.label(4, 4, text='T1', place='e', angle=30)
+    assert len(dl) == 6
+    te = Recorder()
+    dl.flush(te)
+    assert te.calls == [('lines', ((0, 0), (1, 0), (1, 1)), True),
+                        ('lines', ((0, 0, 0.2, 0.2), (0, 2, 0.2, 0.2)), False),
+                        ('circle', (1, 1, 0.5), {'black': True}),
+                        ('circle', (2, 2, 0.4), {'st_angle': 180, 'en_angle': 90}),
+                        ('label', (3, 3, 'G', 'c'), {'s': 0.2, 'angle': 0}),
+                        ('label', (4, 4, 'T1', 'e'), {'angle': 30})]
+    moved = dl.copy().transform(angle=math.pi / 2, dx=10, x=1, y=0)
+    dl.lines((5, 5), (6, 6))
+    assert len(moved) == 6 and len(dl) == 7
+    assert np.allclose(moved.vertices[:3, :2], [[11, -1], [11, 0], [10, 0]])
+    assert np.allclose(moved.circles[1], [9, 1, 0.4, 270, 180])
+    assert np.allclose(moved.labels[1], [7, 3, np.nan, 120], equal_nan=True)
+    dl.extend(moved)
+    assert len(dl) == 13 and dl.offsets.tolist() == [0, 3, 5, 7, 10, 12]
+    te = Recorder()
+    dl.flush(te)
+    assert [call[0] for call in te.calls] == ['lines'] * 5 + ['circle'] * 4 + ['label'] * 4
+
+
+class BlockRecorder(Recorder):
+    def block(self, name, template):
+        self.calls.append(('block', name, len(template)))
+
+    def insert(self, name, x, y, angle, scale=1.):
+        self.calls.append(('insert', name, (x, y, angle, scale)))
+
+
+def test_drawlist_templates():
+    glyph = DrawList()
+    glyph.lines((-1, 0), (1, 0))
+    glyph.circle(0, 1, r=0.5, st_angle=0, en_angle=90)
+    glyph.label(1, 1, 'G')
+    dl = DrawList()
+    for x, angle in ((0, 0), (10, 90), (20, 180)):
+        dl.block('glyph', glyph)
+        dl.insert('glyph', x, 0, angle)
+    dl.lines((0, 0), (20, 0))
+    te = BlockRecorder()
+    dl.copy().transform(dx=1, scale=2).flush(te)
+    assert te.calls[1:] == [('block', 'glyph', 3), ('insert', 'glyph', (1, 0, 0, 2)),
+                            ('insert', 'glyph', (21, 0, 90, 2)), ('insert', 'glyph', (41, 0, 180, 2))]
+    te = Recorder()
+    dl.flush(te)
+    assert len(te.calls) == 10
+    expanded = dl.expand()
+    assert len(expanded) == 10 and not len(expanded.inserts)
+    assert np.allclose(expanded.vertices[2:, :2], [[-1, 0], [1, 0], [10, -1], [10, 1], [21, 0], [19, 0]])
+    assert np.allclose(expanded.circles[:, [0, 1, 3, 4]], [[0, 1, 0, 90], [9, 0, 90, 180], [20, -1, 180, 270]])
+    assert np.allclose(expanded.labels[:, [0, 1, 3]], [[1, 1, 0], [9, 1, 90], [19, -1, 180]])
+    assert expanded.texts == ['G'] * 3
+
+
+def test_text_layout():
+    text = 'АС-120/19 длинное название 12.5 км'
+    rows, width, n = text_layout(text, 8)
+    assert rows == ('АС-', '120/19 ', 'длинное ', 'название', ' 12.5 км') and (width, n) == (8, 5)
+    assert text_layout(text, 8) is text_layout(text, 8)
+    assert text_layout('ПС 1', 8) == (('ПС 1',), 4, 1)
+    rows = split_str(text, 8)
+    rows.append('x')
+    assert split_str(text, 8) == list(text_layout(text, 8)[0])
@@ -0,0 +1,40 @@
+import math
+
+
+import numpy as np
+from pandapowertools.harmonics import i2lc
+from pandapowertools.filters import filter_candidates, pareto, FilterDesign, design_filters
+from tests.test_harmonic import harmonic_net
+
+
+def test_filter_design():
+    n = harmonic_net()
+    spectrum = {5: 0.04, 7: 0.03, 11: 0.02}
+    candidates = filter_candidates(n, [1, 3], [5, 7], [0.5, 1, 2])
+    assert len(candidates) == 12
+    c, l = i2lc(1e6 / 10e3 / math.sqrt(3), 10e3, 7)[:2]
+    row = candidates[(candidates['bus'] == 3) & (candidates['order'] == 7) & (candidates['q_mvar'] == 1)].iloc[0]
+    assert math.isclose(row['c_f'], c) and math.isclose(row['l_h'], l)
+    design = FilterDesign(n, spectrum, [2, 3], skin_effect=False)
+    res = design.evaluate(candidates)
+    sweep = design.sweep
+    z_base = 10 ** 2 / sweep.model.base_mva
+    w = 100 * math.pi
+    for i in (0, 7):
+        candidate = res.iloc[i]
+        bus = sweep._bus[candidate['bus']]
+        v2 = 0
+        for h, v_h in spectrum.items():
+            y = sweep.admittance(h).toarray()
+            z_f = candidate['order'] * w * candidate['l_h'] / 50 + \
+                1j * (h * w * candidate['l_h'] - 1 / (h * w * candidate['c_f']))
+            y[bus, bus] += z_base / z_f
+            v = np.zeros(len(y), dtype=complex)
+            v[sweep._s] = sweep._v_s * v_h
+            v[sweep._n] = np.linalg.solve(y[np.ix_(sweep._n, sweep._n)], -y[np.ix_(sweep._n, sweep._s)] @ v[sweep._s])
+            v2 += np.abs(v[sweep._bus[[2, 3]]]) ** 2
+        assert math.isclose(candidate['thd_percent'], np.sqrt(v2).max() * 100, rel_tol=1e-9)
+    assert res['thd_percent'].min() < design.thd().max()
+    front = design_filters(n, spectrum, [1, 3], [5, 7], [0.5, 1, 2], monitor=[2, 3])
+    assert front['kvar'].is_monotonic_increasing and front['thd_percent'].is_monotonic_decreasing
+    assert list(pareto(np.array([1, 1, 2, 3]), np.array([5., 4, 4, 1]))) == [False, True, False, True]
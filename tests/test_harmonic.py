@@ -1,10 +1,13 @@
 import math
+import copy
 
 
+import numpy as np
+import pandapower as pp
 from pandapowertools.harmonics import i2lc
 import matplotlib.pyplot as plt
 from pandapowertools.net import Net
-from pandapowertools.harmonics import recalc_imp_harm
+from pandapowertools.harmonics import recalc_imp_harm, get_u_by_i, HarmonicModel, HarmonicSweep, TransferImpedance
 
 
 def test_i2lc():
@@ -53,4 +56,91 @@ def test_nr():
         plt.title(f'{h} гармоника - мощность источника гармоник, МВА')
         plt.savefig(f'{h}.png')
         plt.cla()
-    print('\n'.join(res))
\ No newline at end of file
+    print('\n'.join(res))
+
+def harmonic_net():
+    n = Net('harmonic_test')
+    b = [n.add_bus(10, f'{i}с 10кВ') for i in range(4)]
+    n.add_ext_grid(b[0])
+    n.add_impedance(b[0], b[1], 1.2, 0.1)
+    n.add_impedance(b[1], b[2], 0.5, 0.05)
+    n.add_impedance(b[1], b[3], 0.8, 0.08)
+    n.add_c(b[2], 3e-6)
+    n.add_l(b[2], b[3], 0.02)
+    n.add_load_rx(b[3], 50, 30)
+    pp.create_shunt(n.net, b[1], 0.3)
+    n.add_switch(b[1], 2, 'l')
+    return n
+
+def test_harmonic_sweep():
+    n = harmonic_net()
+    sweep = HarmonicSweep(n, skin_effect=False)
+    res = sweep.run(range(2, 41))
+    assert list(res['vm_pu'].index) == list(range(2, 41))
+    for h in (3, 7):
+        m = copy.deepcopy(n)
+        recalc_imp_harm(m.net, h)
+        m.calc_pf()
+        assert np.allclose(res['vm_pu'].loc[h], m.net.res_bus['vm_pu'], atol=1e-8)
+        assert np.allclose(res['i_ka'].loc[h], m.net.res_line['i_ka'], atol=1e-8)
+        s = math.hypot(m.net.res_ext_grid.at[0, 'p_mw'], m.net.res_ext_grid.at[0, 'q_mvar'])
+        assert math.isclose(res['i_ext_grid_ka'].at[h, 0], s / 10 / math.sqrt(3), rel_tol=1e-8)
+    z = sweep.impedance([5], [0, 2])
+    assert z.at[5., 0] == 0
+    assert z.at[5., 2].imag > 0
+    resonances = sweep.resonances()
+    assert set(resonances['kind']) <= {'parallel', 'series'}
+    assert (resonances['element'] == 2).any()
+
+
+def test_harmonic_model():
+    n = harmonic_net()
+    b = n.add_bus(0.4, '1с 0,4кВ')
+    n.add_trafo(1, b, '0.4 MVA 20/0.4 kV', 'Т1')
+    n.add_gen(b, 0.4, 0.2, 0.15, cos_phi=0.8, rdss_ohm=0.001)
+    tables = {element: n.net[element].copy() for element in ('line', 'trafo', 'gen', 'shunt', 'load')}
+    model = HarmonicModel(n, skin_effect=False)
+    z1, y1 = model.branch_impedances(1)
+    z5, y5 = model.branch_impedances(5)
+    assert np.allclose(z1.real, model.r) and np.allclose(z1.imag, model.x)
+    trafo = model.skin == 2
+    assert trafo.sum() == 1
+    assert np.allclose(z5.imag, 5 * z1.imag)
+    assert np.allclose(y5[trafo], y1[trafo] / 5)
+    model = HarmonicModel(n)
+    z5 = model.branch_impedances(5)[0]
+    assert np.allclose(z5[trafo].real, model.r[trafo] * math.sqrt(5))
+    line = model.skin == 1
+    assert np.allclose(z5[line].real, model.r[line] * (1 + 0.646 * 25 / (192 + 0.518 * 25)))
+    z_base = 0.4 ** 2 / model.base_mva
+    y = model.bus_admittances(5)[n.net._pd2ppc_lookups['bus'][b]]
+    assert np.isclose(y, 1 / ((0.001 * math.sqrt(5) + 5j * 0.15 * 0.4 ** 2 / 0.25) / z_base))
+    for element, table in tables.items():
+        assert n.net[element].equals(table)
+    res = HarmonicSweep(n).run([5])
+    assert res['vm_pu'].loc[5., b] < res['vm_pu'].loc[5., 1]
+    mv, lv = n.add_bus(10, '1с 10кВ'), n.add_bus(0.4, '1с 0,4кВ Т2')
+    pp.create_transformer3w_from_parameters(n.net, 1, mv, lv, 20, 10, 0.4, 1, 1, 1, 10, 6, 17, 0.5, 0.5, 0.5, 10, 1)
+    pp.create_impedance(n.net, 1, mv, 0, -0.01, 10)
+    model = HarmonicModel(n, skin_effect=False)
+    z1 = model.branch_impedances(1)[0]
+    z5 = model.branch_impedances(5)[0]
+    trafo3w = slice(*n.net._pd2ppc_lookups['branch']['trafo3w'])
+    impedance = slice(*n.net._pd2ppc_lookups['branch']['impedance'])
+    assert (model.x[trafo3w] < 0).any()
+    assert np.allclose(z5[trafo3w].imag, 5 * z1[trafo3w].imag)
+    assert model.capacitive[impedance].all() and np.allclose(z5[impedance].imag, z1[impedance].imag / 5)
+
+def test_transfer_impedance():
+    n = harmonic_net()
+    n.net.load.drop(n.net.load.index, inplace=True)
+    transfer = TransferImpedance(n)
+    n.calc_pf()
+    s = math.hypot(n.net.res_ext_grid.at[0, 'p_mw'], n.net.res_ext_grid.at[0, 'q_mvar'])
+    for bus in (1, 2, 3):
+        v = n.net.res_bus.at[bus, 'vm_pu']
+        assert math.isclose(transfer.i_by_u(bus, 0.05), s / 10 / math.sqrt(3) * 0.05 / v, rel_tol=1e-6)
+        assert math.isclose(get_u_by_i(n, bus, 0.1), v * 0.1 * math.sqrt(3) * 10 / s, rel_tol=1e-6)
+    i = transfer.i_by_u([1, 2, 3], np.array([[0.01], [0.02]]))
+    assert i.shape == (2, 3)
+    assert np.allclose(transfer.u_by_i([1, 2, 3], i), [[0.01], [0.02]])
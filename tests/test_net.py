@@ -1,7 +1,16 @@
+import os
 import math
 
 
+import numpy as np
+import pytest
+import pandas as pd
+import pandapower as pp
+
+
+import pandapowertools
 from pandapowertools.net import Net
+from pandapowertools.layout import layout
 
 
 def test_save():
@@ -60,3 +69,549 @@ def test_calc_sc():
     n.calc_sc()
     print(n.res_bus_sc())
 
+
+def sc_net():
+    n = Net('sc_test')
+    n.add_std()
+    b0 = n.add_bus(110, 'ПС 1')
+    b1 = n.add_bus(110, 'ПС 2')
+    b2 = n.add_bus(110, 'ПС 3')
+    b3 = n.add_bus(10, '1с 10кВ')
+    n.add_ext_grid(b0, ikz_max=10, ikz_min=8, i1kz_max=9, x0x_min=1, r0x0_min=0.1)
+    l1 = n.add_line(b0, b1, 10, n.std.l_АС_120)
+    l2 = n.add_line(b1, b2, 5, n.std.l_АС_120)
+    n.add_line(b0, b2, 20, n.std.l_АС_120)
+    n.net.line['r0_ohm_per_km'] = n.net.line['r_ohm_per_km'] * 3
+    n.net.line['x0_ohm_per_km'] = n.net.line['x_ohm_per_km'] * 3
+    n.net.line['c0_nf_per_km'] = 0.
+    n.add_trafo(b2, b3, n.std.t_ТДН_10000_110_115, 'Т1')
+    n.net.trafo['vector_group'] = 'YNd'
+    n.net.trafo['vk0_percent'] = n.net.trafo['vk_percent']
+    n.net.trafo['vkr0_percent'] = n.net.trafo['vkr_percent']
+    n.net.trafo['mag0_percent'] = 100
+    n.net.trafo['mag0_rx'] = 0
+    n.net.trafo['si0_hv_partial'] = 0.5
+    n.create_mode('l1_off')
+    n.add2mode('l1_off', 'line', 'in_service', False, l1)
+    n.create_mode('l1_l2_off')
+    n.add2mode('l1_l2_off', 'line', 'in_service', False, [l1, l2])
+    return n
+
+def test_calc_sc_sweep():
+    n = sc_net()
+    res = n.calc_sc_sweep(['', 'l1_off', 'l1_l2_off'])
+    assert res.index.names == ['mode', 'fault', 'case', 'bus']
+    assert len(res) == 3 * 3 * 2 * 4
+    assert n.net.line['in_service'].all()
+    for mode_name in ('', 'l1_off'):
+        for fault in ('3ph', '2ph', '1ph'):
+            for case in ('max', 'min'):
+                with n.mode(mode_name):
+                    n.calc_sc(fault=fault, case=case)
+                expected = n.net.res_bus_sc['ikss_ka'].to_numpy()
+                assert abs(res.loc[(mode_name, fault, case), 'ikss_ka'].to_numpy() - expected).max() < 1e-9
+
+def test_thevenin():
+    n = sc_net()
+    thevenin = n.thevenin()
+    assert n.thevenin() is thevenin
+    assert n.net.res_bus_sc.empty
+    for fault in ('3ph', '2ph', '1ph'):
+        pp.shortcircuit.calc_sc(n.net, fault=fault, r_fault_ohm=2, x_fault_ohm=1)
+        i = n.fault_current(list(n.net.bus.index), fault, rf=2, xf=1)
+        assert np.allclose(i, n.net.res_bus_sc['ikss_ka'], rtol=1e-12)
+        assert math.isclose(n.fault_current(2, fault, rf=2, xf=1), n.net.res_bus_sc.at[2, 'ikss_ka'], rel_tol=1e-12)
+    assert list(n._thevenin) == [('max', 10, True)]
+    with n.mode('l1_off'):
+        assert n.thevenin().at[1, 'x1_ohm'] > thevenin.at[1, 'x1_ohm']
+    assert n.thevenin().equals(thevenin)
+    line = n.add_line(1, 2, 5, n.std.l_АС_120)
+    columns = ['r0_ohm_per_km', 'x0_ohm_per_km', 'c0_nf_per_km']
+    n.net.line.loc[line, columns] = n.net.line.loc[0, columns]
+    assert n.thevenin().at[1, 'x1_ohm'] < thevenin.at[1, 'x1_ohm']
+    i = n.fault_current(1)
+    n.line(line, False)
+    assert n.fault_current(1) < i
+    n.line(line)
+    assert math.isclose(n.fault_current(1), i, rel_tol=1e-12)
+    switch = n.add_switch(1, line, 'l')
+    n.switch(switch, False)
+    assert n.fault_current(1) < i
+    n.net.switch.loc[switch, 'closed'] = True
+    assert math.isclose(n.fault_current(1), i, rel_tol=1e-12)
+    i3, i1 = n.fault_current(1), n.fault_current(1, '1ph')
+    n.net.line.loc[line, ['x_ohm_per_km', 'x0_ohm_per_km']] *= 10
+    assert n.fault_current(1) == i3
+    n.thevenin(refresh=True)
+    assert n.fault_current(1) < i3 and n.fault_current(1, '1ph') < i1
+
+def test_thevenin_ext_grid():
+    n = sc_net()
+    i = n.fault_current(1)
+    n.change_ext_grid(0, 2, 1)
+    pp.shortcircuit.calc_sc(n.net)
+    assert n.fault_current(1) < i
+    assert math.isclose(n.fault_current(1), n.net.res_bus_sc.at[1, 'ikss_ka'], rel_tol=1e-12)
+    n.ext_grid(0, False)
+    assert np.isnan(n.fault_current(1))
+
+def test_topology_edits():
+    n = sc_net()
+    pp.create_std_type(n.net, {'r_ohm_per_km': 0.43, 'x_ohm_per_km': 0.36, 'c_nf_per_km': 4.5, 'max_i_ka': 0.265,
+                               'r0_ohm_per_km': 1.3, 'x0_ohm_per_km': 1.1, 'c0_nf_per_km': 2., 'type': 'ol'},
+                       'АС-95 test', 'line')
+    n.thevenin('max')
+    n.thevenin('min')
+    n.line_replace_std_type(1, 'АС-95 test')
+    assert n.net.line.at[1, 'r_ohm_per_km'] == 0.43 and n.net.line.at[1, 'std_type'] == 'АС-95 test'
+    patched = n.thevenin()
+    assert patched.equals(n.thevenin()) and len(n._thevenin) == 2
+    assert np.allclose(patched, n.thevenin(refresh=True), rtol=1e-12)
+    bus, line = n.split_line(2, 7.5)
+    assert list(n.net.line.index) == [0, 1, 2, line]
+    assert n.net.line.loc[[2, line], 'length_km'].tolist() == [7.5, 12.5]
+    assert n.net.line.at[2, 'to_bus'] == bus and n.net.line.at[line, 'from_bus'] == bus
+    for case in ('max', 'min'):
+        patched = n.thevenin(case)
+        assert np.allclose(patched, n.thevenin(case, refresh=True), rtol=1e-12)
+    closed = n.add_switch(bus, 2, 'l')
+    opened = n.add_switch(bus, line, 'l', closed=False)
+    with pytest.raises(ValueError):
+        n.merge_serial_lines(2, line)
+    assert list(n.net.line.index) == [0, 1, 2, line] and len(n.net.switch) == 2
+    n.switch(opened)
+    n.merge_serial_lines(2, line)
+    assert list(n.net.line.index) == [0, 1, 2]
+    assert n.net.switch.empty and n.change_log[-1]['removed_switches'] == [closed, opened]
+    assert math.isclose(n.line_impedance(2)[0], 20 * 0.27)
+    patched = n.thevenin()
+    assert np.isnan(patched.at[bus, 'x1_ohm'])
+    assert np.allclose(patched, n.thevenin(refresh=True), rtol=1e-12, equal_nan=True)
+    assert [change['operation'] for change in n.change_log] == ['line_replace_std_type', 'split_line',
+                                                                 'merge_serial_lines']
+
+def test_mode():
+    n = sc_net()
+    line = n.net.line.copy()
+    try:
+        with n.mode('l1_off'):
+            assert not n.net.line.at[0, 'in_service']
+            with n.mode('l1_l2_off'):
+                n._set('line', 'length_km', None, 1.)
+                assert not n.net.line.at[1, 'in_service']
+            assert n.net.line.at[1, 'in_service']
+            assert n.net.line.at[1, 'length_km'] == 5
+            raise RuntimeError
+    except RuntimeError:
+        ...
+    assert n.net.line.equals(line)
+
+def test_calc_c():
+    n = sc_net()
+    trafo = n.net.trafo.copy()
+    ext_grid = n.net.ext_grid.copy()
+    n.calc_c(1)
+    assert n.net.trafo.equals(trafo)
+    assert n.net.ext_grid.equals(ext_grid)
+    assert n.net.res_line['i_ka'].notna().all()
+
+def test_save_load_formats(tmp_path):
+    n = sc_net()
+    n.calc_sc(fault='1ph')
+    n.path = str(tmp_path)
+    for format in ('npz', 'parquet'):
+        if format == 'parquet':
+            pytest.importorskip('pyarrow')
+        n.save(format=format)
+        m = Net('sc_test', str(tmp_path))
+        m.load(format=format)
+        assert m.net['modes'] == n.net['modes']
+        assert m.net.std_types == n.net.std_types
+        for key in ('bus', 'line', 'trafo', 'ext_grid', 'bus_geodata', 'res_bus_sc'):
+            pd.testing.assert_frame_equal(m.net[key], n.net[key], check_exact=True)
+        assert dir(m.l) == dir(n.l)
+        assert dir(m.std) == dir(n.std)
+
+def test_save_parquet_without_pyarrow(tmp_path, monkeypatch):
+    n = sc_net()
+    n.path = str(tmp_path)
+    monkeypatch.setattr('pandapowertools.snapshot.find_spec', lambda name: None)
+    with pytest.raises(ImportError, match='pyarrow'):
+        n.save(format='parquet')
+    assert not os.listdir(tmp_path)
+
+def test_lazy_attrs():
+    n = sc_net()
+    assert n.b.bПС_1 == 0
+    assert n.l.lПС_1___ПС_2 == 0
+    assert n.t.tТ1 == 0
+    assert n.std.l_АС_120 == 'АС-120'
+    n.net.bus.at[0, 'name'] = 'ПС 4'
+    n._changed()
+    assert n.b.bПС_4 == 0
+    assert n.l.lПС_4___ПС_2 == 0
+    assert not hasattr(n.b, 'bПС_1')
+    index = n.add_bus(10, '2с 10кВ')
+    assert n.b.b2с_10кВ == index
+    n.net.bus.at[1, 'name'] = 'ПС 5'
+    n.net.trafo.at[0, 'name'] = 'Т2'
+    assert n.b.bПС_5 == 1 and n.l.lПС_4___ПС_5 == 0 and n.t.tТ2 == 0
+    assert not hasattr(n.l, 'lПС_4___ПС_2') and not hasattr(n.t, 'tТ1')
+
+def test_iter_scheme():
+    n = sc_net()
+    sections = list(n.iter_scheme())
+    assert n.get_scheme() == '\n'.join(sections)
+    assert sections[0] == 'name=sc_test'
+    assert [section.split('\n')[0] for section in sections[1:]] == ['bus', 'ext_grid', 'gen', 'line', 'trafo',
+                                                                       'trafo3w', 'impedance', 'switch', 'load',
+                                                                       'shunt']
+    found = n.get_scheme('ПС 2').split('\n')
+    assert found and all('ПС 2' in row for row in found)
+    assert len(found) == 3
+
+def test_res_sc():
+    n = sc_net()
+    n.calc_sc(fault='1ph')
+    n.busxy(0, (0, 0))
+    n.busxy(1, (1, 0))
+    df = n.get_res_bus_sc()
+    assert df.loc[1, 'i_a'] == n.net.res_bus_sc.at[1, 'ikss_ka'] * 1000
+    assert math.isclose(df.loc[1, 'z_ohm'],
+                        math.hypot(n.net.res_bus_sc.at[1, 'rk_ohm'], n.net.res_bus_sc.at[1, 'xk_ohm']))
+    res = n.res_bus_sc()
+    assert list(res) == [0, 1]
+    assert res[1] == df.loc[1, ['name', 'i_a', 'z_ohm', 'z0_ohm']].tolist()
+    md = n.res_bus_sc_md().split('\n')
+    assert md[0] == 'Точка КЗ | Ток КЗ, кА | r, Ом | x, Ом | z, Ом'
+    assert md[2].startswith('ПС 1'.ljust(28) + ' | ')
+    assert len(md) == 2 + len(n.net.res_bus_sc) + 1
+    n.calc_pf()
+    assert n.res_line(1) == {'ПС 2 - ПС 3': n.net.res_line.at[1, 'i_ka'] * 1000}
+
+def test_name_index():
+    n = sc_net()
+    names = n.name_index
+    assert names.name('line', 1) == 'ПС 2 - ПС 3'
+    assert names.index('line', 'ПС 1 - ПС 3') == 2
+    s = n.add_switch(1, 1, 'l')
+    assert names.name('switch', s) == 'ПС 2 - ПС 2 - ПС 3'
+    n.line_replace_std_type(1, n.std.l_АС_120)
+    assert names.index('line', 'ПС 2 - ПС 3') == 1
+    assert names.name('switch', s) == 'ПС 2 - ПС 2 - ПС 3'
+    n.merge_serial_lines(0, 1)
+    assert 1 not in names.names('line')
+    assert names.name('line', 0) == 'ПС 1 - ПС 3'
+    assert s not in n.net.switch.index
+    assert names.names('line') == {i: n.name_line(i) for i in n.net.line.index}
+    built = names.names('line')
+    names.invalidate()
+    assert names.names('line') == built
+    assert getattr(n.l, 'lПС_1___ПС_3') in (0, 2)
+    s = n.add_switch(0, 0, 'l')
+    n.net.bus.at[0, 'name'] = 'ПС 4'
+    assert names.name('line', 0) == 'ПС 4 - ПС 3' and names.name('switch', s) == 'ПС 4 - ПС 4 - ПС 3'
+    n.net.bus.at[2, 'name'] = 'ПС 6'
+    line = n.add_line(0, 1, 5, n.std.l_АС_120)
+    assert names.names('line') == {0: 'ПС 4 - ПС 6', 2: 'ПС 4 - ПС 6', line: 'ПС 4 - ПС 2'}
+    assert names.index('line', 'ПС 4 - ПС 2') == line
+
+def test_add_bulk():
+    n = Net('single')
+    n.add_std()
+    b = [n.add_bus(110, 'ПС 1'), n.add_bus(110, 'ПС 2'), n.add_bus(110, 'ПС 3'), n.add_bus(10, 'ПС 3 10')]
+    n.add_line(b[0], b[1], 10, n.std.l_АС_120)
+    n.add_line(b[1], b[2], 5, n.std.l_А_120)
+    n.add_trafo(b[2], b[3], n.std.t_ТДН_10000_110_115, 'Т1')
+    n.add_switch(b[0], 0, 'l')
+    m = Net('bulk')
+    m.add_std()
+    df = pd.DataFrame({'un': [110, 110, 110, 10], 'name': ['ПС 1', 'ПС 2', 'ПС 3', 'ПС 3 10']})
+    b = m.add_buses(**df)
+    m.add_lines(b[:2], b[1:3], [10, 5], [m.std.l_АС_120, m.std.l_А_120])
+    m.add_trafos(b[2], b[3], m.std.t_ТДН_10000_110_115, 'Т1')
+    m.add_switches([b[0]], [0], 'l')
+    for element in ('bus', 'line', 'trafo', 'switch'):
+        pd.testing.assert_frame_equal(m.net[element], n.net[element])
+    assert m.l.lПС_2___ПС_3 == 1
+    assert m.name_switch(0) == 'ПС 1 - ПС 1 - ПС 2'
+    assert m.add_buses(110, 'XYZ').tolist() == [4]
+    assert m.net.bus.at[4, 'name'] == 'XYZ'
+    t = m.add_trafos(2, 3, [m.std.t_ТДН_10000_110_115] * 2, 'T')
+    assert m.net.trafo.loc[t, ['hv_bus', 'lv_bus', 'name']].values.tolist() == [[2, 3, 'T'], [2, 3, 'T']]
+    assert (m.net.trafo.loc[t, 'std_type'] == m.std.t_ТДН_10000_110_115).all()
+
+def test_calc_pf_strategies():
+    n = sc_net()
+    pp.create_load(n.net, 3, 15, 3)
+    report = n.calc_pf()
+    assert report.converged and report.strategy == 'cold start' and report.tolerance == 1e-8
+    vm_pu = n.net.res_bus['vm_pu'].copy()
+    report = n.calc_pf()
+    assert report.strategy == 'warm start' and report.iterations <= 1
+    n.net.converged = False
+    report = n.calc_pf(max_iteration=3)
+    assert n.pf_report is report
+    assert report.strategy == 'load stepping' and report.tolerance == 1e-8
+    assert n.net.load['scaling'].tolist() == [1.]
+    assert (n.net.res_bus['vm_pu'] - vm_pu).abs().max() < 1e-6
+    report = n.calc_pf_pgm()
+    assert report.converged and report.strategy == 'cold start'
+
+def test_calc_pf_solver_errors(monkeypatch):
+    n = sc_net()
+    pp.create_load(n.net, 3, 15, 3)
+    runpp = pp.runpp
+
+    def singular_nr(net, algorithm='nr', **kwargs):
+        if algorithm == 'nr':
+            raise np.linalg.LinAlgError('Singular matrix')
+        runpp(net, algorithm=algorithm, **kwargs)
+
+    monkeypatch.setattr(pp, 'runpp', singular_nr)
+    report = n.calc_pf(init='flat')
+    assert report.converged and report.strategy == 'algorithm fallback' and report.algorithm == 'iwamoto_nr'
+    assert report.attempts[0] == ('cold start', 'nr', 1e-8, False, 'pandapower')
+    assert isinstance(report.error, np.linalg.LinAlgError)
+    report = n.calc_pf(init='flat', backend='lightsim2grid')
+    assert report.converged and report.algorithm == 'iwamoto_nr'
+    assert report.requested == 'lightsim2grid' and report.backend == 'pandapower'
+    assert [attempt[4] for attempt in report.attempts] == ['lightsim2grid', 'pandapower']
+    monkeypatch.setattr(pp, 'runpp', lambda net, **kwargs: singular_nr(net))
+    with pytest.raises(np.linalg.LinAlgError):
+        n.calc_pf(init='flat')
+
+def test_fault_location_table(tmp_path, monkeypatch):
+    n = Net('ОМП')
+    n.net = pp.from_json(os.path.join(os.path.dirname(pandapowertools.__file__), 'ОМП.json'))
+    table = n.fault_location_table(3, 2.5, ('3ph', '2ph', '1ph'), rf=1, file=str(tmp_path / 'омп.md'))
+    assert list(table.loc['1ph'].index) == [0, 2.5, 5, 7.5, 10, 12.5, 13.7]
+    distance = 5
+    m = n.net.deepcopy()
+    line = m.line.loc[3]
+    columns = ['r_ohm_per_km', 'x_ohm_per_km', 'c_nf_per_km', 'r0_ohm_per_km', 'x0_ohm_per_km', 'c0_nf_per_km',
+               'max_i_ka']
+    bus = pp.create_bus(m, 110)
+    pp.create_line_from_parameters(m, line['from_bus'], bus, distance, **line[columns])
+    pp.create_line_from_parameters(m, bus, line['to_bus'], line['length_km'] - distance, **line[columns])
+    m.line.drop(3, inplace=True)
+    for fault in ('2ph', '1ph', '3ph'):
+        pp.shortcircuit.calc_sc(m, fault=fault, bus=bus, r_fault_ohm=1, branch_results=fault == '3ph')
+        assert math.isclose(table.at[(fault, distance), 'ikss_ka'], m.res_bus_sc.at[bus, 'ikss_ka'], rel_tol=1e-9)
+    assert np.allclose(table.loc[('3ph', distance), ['i_from_ka', 'i_to_ka']], m.res_line_sc['ikss_ka'].iloc[-2:],
+                       rtol=1e-9)
+    assert (table.loc['3ph', 'i0_from_ka'] == 0).all()
+    assert 'Расстояние от ТЭЦ-3, км' in (tmp_path / 'омп.md').read_text(encoding='utf-8')
+    assert list(n.fault_location_table(3, 13.7).loc['3ph'].index) == [0, 13.7]
+    assert list(n.fault_location_table(3, 13.7 / 2 + 1e-5).loc['3ph'].index) == [0, 13.7 / 2 + 1e-5, 13.7]
+    assert list(n.fault_location_table(3, 13.7 / 2 - 1e-5).loc['3ph'].index) == [0, 13.7 / 2 - 1e-5, 13.7]
+    calls = []
+    monkeypatch.setattr('pandapowertools.net.fault_location_table', lambda *args: calls.append(args) or table)
+    n.fault_location_table(3, 5, lv_tol_percent=6)
+    assert calls[0][-1] == 6
+
+def test_zmatrix():
+    from scipy import sparse
+    from pandapowertools.zbus import ZMatrix, DIAG_BLOCK
+    rng = np.random.default_rng(0)
+    n = DIAG_BLOCK + 20
+    y = sparse.random(n, n, density=0.02, random_state=1) * (1 - 2j) + sparse.eye(n) * (n + 1j)
+    y = y.tocsc()
+    z = ZMatrix(y)
+    dense = y.toarray()
+    assert np.allclose(z.diag(), np.diag(np.linalg.inv(dense)))
+    first = z.add_nodes()
+    dense = np.pad(dense, ((0, 1), (0, 1)))
+    dense[first, first] = 1
+    for nodes in ([3, 7], [7, first, 100], [5]):
+        dy = rng.normal(size=(len(nodes), len(nodes))) + 1j * rng.normal(size=(len(nodes), len(nodes)))
+        z.update(nodes, dy)
+        dense[np.ix_(nodes, nodes)] += dy
+    inverse = np.linalg.inv(dense)
+    assert np.allclose(z.diag(), np.diag(inverse))
+    assert np.allclose(z.columns([first, 2]), inverse[:, [first, 2]])
+    assert np.allclose(z.rows([7, 100]), inverse[[7, 100]])
+
+def test_n_minus_1():
+    n = sc_net()
+    pp.create_load(n.net, 3, 6, 2)
+    pp.create_load(n.net, 1, 20, 5)
+    res = n.n_minus_1('all', 'sc', fault='1ph')
+    assert list(res.index) == [('line', 0), ('line', 1), ('line', 2), ('trafo', 0)]
+    assert res.attrs['full_solve'] == [('trafo', 0)] and not res.attrs['approximate']
+    for element, index in res.index:
+        with n.mode():
+            n._set(element, 'in_service', index, False)
+            pp.shortcircuit.calc_sc(n.net, fault='1ph')
+        assert np.allclose(res.loc[(element, index)], n.net.res_bus_sc['ikss_ka'].sort_index(), rtol=1e-12,
+                           equal_nan=True)
+    assert n.net.line['in_service'].all()
+    res = n.n_minus_1('line', 'pf')
+    assert res.attrs['full_solve'] == [] and res.attrs['approximate']
+    assert n.net.res_line['loading_percent'].notna().all()
+    for index in n.net.line.index:
+        assert res.at[('line', index), ('line', index)] == 0
+        with n.mode():
+            n._set('line', 'in_service', index, False)
+            pp.runpp(n.net)
+            expected = np.concatenate([n.net.res_line['loading_percent'], n.net.res_trafo['loading_percent']])
+        assert np.allclose(res.loc[('line', index)], expected, rtol=0.1)
+    n.add_bus(0.4, '0,4кВ')
+    n.add_trafo(3, 4, '0.4 MVA 10/0.4 kV', 'Т2')
+    res6 = n.n_minus_1('line', 'sc', lv_tol_percent=6)
+    res10 = n.n_minus_1('line', 'sc')
+    assert (res6[4] < res10[4]).all() and np.allclose(res6[[0, 1, 2, 3]], res10[[0, 1, 2, 3]])
+
+def test_pf_backends():
+    n = sc_net()
+    pp.create_load(n.net, 3, 6, 2)
+    report = n.calc_pf(backend='pgm')
+    assert report.converged and report.backend == 'pgm'
+    res = n.benchmark_pf(repeat=1)
+    assert list(res.index) == ['pandapower', 'pgm', 'lightsim2grid']
+    assert res.at['pandapower', 'dvm_pu'] == 0
+    assert res.loc[res['converged'], 'dvm_pu'].max() < 1e-2
+    vm_pu = n.net.res_bus['vm_pu'].copy()
+    assert n.calc_pf(backend='pandapower').backend == 'pandapower'
+    assert (n.net.res_bus['vm_pu'] - vm_pu).abs().max() < 1e-8
+    pp.create_gen(n.net, 1, 5, 1.0)
+    assert res.at['pgm', 'reason'] is None and n.benchmark_pf(repeat=1).at['pgm', 'reason'] is not None
+    with pytest.raises(UserWarning):
+        n.calc_pf(backend='pgm')
+    n.net.gen.drop(n.net.gen.index, inplace=True)
+    pp.create_ext_grid(n.net, 2)
+    n.create_mode('eg1_off')
+    n.add2mode('eg1_off', 'ext_grid', 'in_service', False, 1)
+    with pytest.raises(UserWarning):
+        n.calc_pf(backend='lightsim2grid')
+    assert n.calc_pf(mode_name='eg1_off', backend='lightsim2grid').converged
+    assert n.calc_pf(mode_name='eg1_off', backend='auto').backend == 'lightsim2grid'
+    profiles = pd.DataFrame({('load', 'p_mw', 0): [3., 6.]})
+    assert n.run_timeseries(profiles, mode_name='eg1_off', backend='lightsim2grid').attrs['converged'].all()
+
+def test_benchmark_pf_fallback(monkeypatch):
+    n = sc_net()
+    pp.create_load(n.net, 3, 6, 2)
+    runpp = pp.runpp
+
+    def failed_lightsim2grid(net, lightsim2grid=False, **kwargs):
+        if lightsim2grid:
+            raise RuntimeError('lightsim2grid failed')
+        runpp(net, **kwargs)
+
+    monkeypatch.setattr(pp, 'runpp', failed_lightsim2grid)
+    res = n.benchmark_pf(backends=('lightsim2grid',), repeat=1)
+    assert res.at['pandapower', 'converged'] and not res.at['lightsim2grid', 'converged']
+    assert np.isnan(res.at['lightsim2grid', 'time_s']) and 'pandapower' in res.at['lightsim2grid', 'reason']
+
+def test_run_timeseries():
+    n = sc_net()
+    pp.create_load(n.net, 3, 6, 2)
+    pp.create_load(n.net, 1, 20, 5)
+    profiles = pd.DataFrame({('load', 'p_mw', 0): [3., 6., 9.], ('load', 'p_mw', 1): [10., 20., 25.],
+                             ('ext_grid', 'vm_pu', 0): [1., 1.02, 1.04]})
+    res = n.run_timeseries(profiles, [('res_bus', 'vm_pu'), ('res_trafo', 'loading_percent')])
+    assert res.attrs['converged'].all()
+    assert list(res.columns.get_level_values(0).unique()) == ['res_bus', 'res_trafo']
+    assert n.net.load['p_mw'].tolist() == [6., 20.] and n.net.ext_grid.at[0, 'vm_pu'] == 1.
+    for step, values in profiles.iterrows():
+        with n.mode():
+            for (element, param, index), value in values.items():
+                n._set(element, param, index, value)
+            pp.runpp(n.net)
+            assert np.allclose(res.loc[step, ('res_bus', 'vm_pu')], n.net.res_bus['vm_pu'], atol=1e-9)
+            assert np.allclose(res.loc[step, ('res_trafo', 'loading_percent')], n.net.res_trafo['loading_percent'],
+                               rtol=1e-7)
+    with pytest.raises(ValueError):
+        n.run_timeseries(pd.DataFrame({('gen', 'p_mw', 0): [1.]}))
+
+def test_layout():
+    n = sc_net()
+    for bus, xy in zip(range(4), ((0, 10), (4, 6), (4, 0), (9, -1))):
+        n.busxy(bus, xy)
+    n.busbar(0, -2, 10, 2)
+    n.busbar(2, 2, 0, 8)
+    n.add_switch(3, 2, 'b')
+    n.add_switch(1, 1, 'l')
+    geometry = layout(n.net)
+    line = geometry['line']
+    assert line.loc[0, ['x1', 'y1', 'x2', 'y2']].tolist() == [4, 10, 4, 6]
+    assert line.loc[1, ['x1', 'y1', 'x2', 'y2']].tolist() == [4, 6, 4, 0]
+    assert line.loc[2, ['x1', 'y1', 'x2', 'y2']].tolist() == [2, 10, 2, 0]
+    assert np.allclose(line.loc[0, ['xt', 'yt', 'angle']].tolist(), [3.8, 8, math.pi / 2])
+    assert geometry['trafo'].loc[0].tolist() == [4, 0, 9, -1]
+    switch = geometry['switch']
+    assert switch.loc[0, ['x1', 'y1', 'x2', 'y2']].tolist() == [9, -1, 8, 0]
+    assert switch.loc[1, ['x1', 'y1', 'x2', 'y2']].tolist() == [4, 6, 4, 0]
+    assert geometry['bus']['busbar'].tolist() == [True, False, True, False]
+    assert layout(n.net, impedance=True)['line'].loc[2, ['x1', 'y1', 'x2', 'y2']].tolist() == [0, 10, 4, 0]
+    n.net.line.loc[1, 'in_service'] = False
+    n.net.bus_geodata.drop(3, inplace=True)
+    geometry = layout(n.net)
+    assert geometry['line'].index.tolist() == [0, 2] and geometry['trafo'].empty
+    assert geometry['switch'].index.tolist() == [1]
+
+def test_plot():
+    pytest.importorskip('textengines')
+    from pandapowertools.plot import plot
+    from pandapowertools.drawlist import DrawList
+    from tests.test_drawlist import Recorder, BlockRecorder
+    n = sc_net()
+    for bus, xy in zip(range(4), ((0, 10), (4, 6), (4, 0), (9, -1))):
+        n.busxy(bus, xy)
+    n.busbar(0, -2, 10, 2)
+    n.add_switch(3, 2, 'b')
+    n.add_switch(1, 1, 'l', closed=False)
+    pp.create_gen(n.net, 3, 1., name='G1')
+    pp.create_shunt(n.net, 3, q_mvar=-1., name='БСК')
+    te = Recorder()
+    dl = plot(n.net, te)
+    assert isinstance(dl, DrawList)
+    labels = [call[1][2] for call in te.calls if call[0] == 'label']
+    assert {'ПС 1', '(0)', 'G1', 'G'} <= set(labels)
+    line = layout(n.net)['line']
+    anchor = [call[1][:2] for call in te.calls if call[0] == 'label' and 'АС' in call[1][2]]
+    assert np.allclose(anchor[0], line.loc[0, ['xt', 'yt']].tolist())
+    te = BlockRecorder()
+    dl.flush(te)
+    assert {'ext_grid', 'gen'} <= {call[1] for call in te.calls if call[0] == 'block'}
+    plot(n.net, Recorder(), impedance=True)
+
+def test_select():
+    n = sc_net()
+    n.place_buses([0, 1, 2], x=0, y=0, step=2)
+    assert n.select_rect(-1, -1, 3, 1) == [0, 1]
+    n.busxy(1, (10, 10))
+    assert n.select_rect(3, 1, -1, -1) == [0]
+    n.shift_buses([0], dx=20, dy=20)
+    n.busxy(3, (21, 19))
+    assert n.select_rect(19, 19, 21, 21) == [0, 3]
+    n.busbar(2, 2, 0, 30)
+    assert n.select_rect(9, -1, 11, 1) == []
+    assert n.select_rect(9, -1, 11, 1, busbar=True) == [2]
+    assert n.select(lambda x, y: x > 5) == [0, 1, 3]
+    assert n.select(lambda x, y: x > 5, rect=(0, 0, 15, 15)) == [1]
+    n.mirror_y()
+    assert n.select_rect(-19, 19, -21, 21) == [0, 3]
+    rng = np.random.default_rng(0)
+    xy = rng.uniform(-50, 50, (200, 2))
+    n.clear_geodata()
+    for bus in range(4):
+        n.busxy(bus, tuple(xy[bus]))
+    for bus in range(4, 200):
+        n.busxy(n.add_bus(10), tuple(xy[bus]))
+    for rect in ((-10, -10, 10, 10), (0, -50, 50, 0), (-60, 40, 60, 60)):
+        inside = (xy[:, 0] >= rect[0]) & (xy[:, 0] <= rect[2]) & (xy[:, 1] >= rect[1]) & (xy[:, 1] <= rect[3])
+        assert n.select_rect(*rect) == np.flatnonzero(inside).tolist()
+
+def test_run_timeseries_not_converged():
+    n = sc_net()
+    pp.create_load(n.net, 3, 6, 2)
+    profiles = pd.DataFrame({('load', 'p_mw', 0): [3., 3000., 6.]})
+    res = n.run_timeseries(profiles)
+    assert res.attrs['converged'].tolist() == [True, False, True]
+    assert res.loc[1].isna().all() and res.loc[[0, 2]].notna().all().all()
+    with n.mode():
+        n._set('load', 'p_mw', 0, 6.)
+        pp.runpp(n.net)
+        assert np.allclose(res.loc[2, ('res_bus', 'vm_pu')], n.net.res_bus['vm_pu'], atol=1e-9)
@@ -5,6 +5,8 @@ from pandapowertools.net import Net
 from pandapowertools.plot import plot
 from textengines.dxfengine import DXF
 from pandapowertools.functions import split_str
+from pandapowertools.drawlist import DrawList
+from pandapowertools.symbols import label_draw, text_rows, text_size
 
 def test_plot():
     n = Net('../Полоцк')
@@ -20,6 +22,13 @@ def test_split_str():
     for s in strings:
         print(split_str(s, 8))
 
+def test_label_draw():
+    rows, long, width = text_rows(['ПС 1', 'АС-120/19 длинное'], 8)
+    assert rows == ['ПС 1', 'длинное', '120/19 ', 'АС-'] and long.tolist() == [False, True, True, True] and width == 7
+    te = DrawList()
+    assert label_draw(0, 0, ['ПС 1', 'АС-120/19 длинное'], te) == (width * text_size, 4 * text_size * 1.2)
+    assert te.expand().texts == rows
+
 def test_calc_sc():
     n = Net('../Полоцк')
     n.load()
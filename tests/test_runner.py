@@ -0,0 +1,20 @@
+import pytest
+
+
+from pandapowertools.runner import ModeRunner
+from tests.test_net import sc_net
+
+
+def test_mode_runner():
+    n = sc_net()
+    n.create_mode('wrong')
+    n.add2mode('wrong', 'line', 'no_param', 1, 100)
+    with ModeRunner(n, max_workers=2) as runner:
+        res = runner.run(calc='sc', fault='3ph')
+        with pytest.raises(ValueError):
+            runner.run(['l1_off', 'wrong', 'l1_off'], calc='sc', fault='3ph')
+    assert list(res) == ['l1_off', 'l1_l2_off', 'wrong']
+    assert not res['wrong'].ok
+    with n.mode('l1_off'):
+        n.calc_sc(fault='3ph')
+    assert (res['l1_off']['res_bus_sc']['ikss_ka'] - n.net.res_bus_sc['ikss_ka']).abs().max() < 1e-9